@@ -4,80 +4,130 @@ Análisis de proximidad entre granjas solares y comunidades energéticas.
 Identifica las 10 comunidades energéticas más cercanas a cada granja.
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from geopy.distance import geodesic
+from distancias import distancia_vincenty_km, bloques_distancias_km
+from indice_espacial import cargar_o_construir_indice
+from seleccion_topk import k_menores
+from proximidad_paralela import calcular_proximidades_paralelo
+from proximidad_incremental import detectar_cambios, parchear_salidas, guardar_manifiesto
+from proximidad_radio import analizar_radios
+from proximidad_inversa import granja_mas_cercana, RUTA_COMUNIDADES_ACTUALIZADA
+from matriz_distancias import guardar_matriz, DIRECTORIO_MATRIZ, K_MATRIZ
+from versiones_resultados import NuevaVersion, DIRECTORIO_RESULTADOS
+from config_original import DATA_FILES
+from capas_mapa import traza_mapa
 import warnings
 warnings.filterwarnings('ignore')
 
 def calcular_distancia_haversine(lat1, lon1, lat2, lon2):
     """
-    Calcula la distancia en kilómetros entre dos puntos usando la fórmula de Haversine.
+    Calcula la distancia geodésica en kilómetros entre dos puntos (WGS-84).
     """
-    return geodesic((lat1, lon1), (lat2, lon2)).kilometers
+    return float(distancia_vincenty_km(lat1, lon1, lat2, lon2))
 
-def encontrar_comunidades_cercanas(granjas_df, comunidades_df, n_cercanas=10):
+# Columnas de la comunidad que se copian a cada resultado
+COLUMNAS_METADATOS = {
+    'ID_Comunidad': 'ID',
+    'Nombre_Comunidad': 'Nombre de la comunidad',
+    'Departamento_Comunidad': 'Departamento',
+    'Municipio_Comunidad': 'Municipio',
+    'Potencia_kWp': 'Potencia Estimada kWp',
+    'Inversion_Estimada': 'Inversión Estimada'
+}
+
+def _extraer_metadatos(comunidades_df):
+    """Extrae una sola vez las columnas de metadatos como arreglos indexables por posición"""
+    return {clave: comunidades_df[columna].to_numpy() for clave, columna in COLUMNAS_METADATOS.items()}
+
+def _construir_resultado(granja, metadatos, indices, distancias):
     """
-    Encuentra las n comunidades energéticas más cercanas a cada granja.
+    Construye el registro de una granja a partir de las posiciones y distancias de
+    sus comunidades más cercanas, ya ordenadas. Solo se materializan esas k filas.
     """
-    resultados = []
+    n_mas_cercanas = []
+    for pos, distancia in zip(indices, distancias):
+        n_mas_cercanas.append({
+            'ID_Comunidad': metadatos['ID_Comunidad'][pos],
+            'Nombre_Comunidad': metadatos['Nombre_Comunidad'][pos],
+            'Departamento_Comunidad': metadatos['Departamento_Comunidad'][pos],
+            'Municipio_Comunidad': metadatos['Municipio_Comunidad'][pos],
+            'Distancia_km': float(distancia),
+            'Potencia_kWp': metadatos['Potencia_kWp'][pos],
+            'Inversion_Estimada': metadatos['Inversion_Estimada'][pos]
+        })
     
-    for idx_granja, granja in granjas_df.iterrows():
-        lat_granja = granja['Latitud']
-        lon_granja = granja['Longitud']
-        
-        # Calcular distancias a todas las comunidades
-        distancias = []
-        for idx_comunidad, comunidad in comunidades_df.iterrows():
-            lat_comunidad = comunidad['y']
-            lon_comunidad = comunidad['x']
-            
-            distancia = calcular_distancia_haversine(
-                lat_granja, lon_granja, 
-                lat_comunidad, lon_comunidad
-            )
-            
-            distancias.append({
-                'ID_Comunidad': comunidad['ID'],
-                'Nombre_Comunidad': comunidad['Nombre de la comunidad'],
-                'Departamento_Comunidad': comunidad['Departamento'],
-                'Municipio_Comunidad': comunidad['Municipio'],
-                'Distancia_km': distancia,
-                'Potencia_kWp': comunidad['Potencia Estimada kWp'],
-                'Inversion_Estimada': comunidad['Inversión Estimada']
-            })
-        
-        # Ordenar por distancia y tomar las n más cercanas
-        distancias_ordenadas = sorted(distancias, key=lambda x: x['Distancia_km'])
-        n_mas_cercanas = distancias_ordenadas[:n_cercanas]
-        
-        # Crear string con IDs de las comunidades más cercanas
-        ids_cercanas = [str(com['ID_Comunidad']) for com in n_mas_cercanas]
-        ids_string = ', '.join(ids_cercanas)
-        
-        resultado = {
-            'Item': granja['Item'],
-            'CEs_Relacionadas': ids_string,
-            'Granja_Departamento': granja['Departamento'],
-            'Granja_Municipio': granja['Municipio'],
-            'Granja_Latitud': lat_granja,
-            'Granja_Longitud': lon_granja,
-            'Comunidades_Cercanas': n_mas_cercanas
-        }
-        
+    # Crear string con IDs de las comunidades más cercanas
+    ids_cercanas = [str(com['ID_Comunidad']) for com in n_mas_cercanas]
+    ids_string = ', '.join(ids_cercanas)
+    
+    return {
+        'Item': granja['Item'],
+        'CEs_Relacionadas': ids_string,
+        'Granja_Departamento': granja['Departamento'],
+        'Granja_Municipio': granja['Municipio'],
+        'Granja_Latitud': granja['Latitud'],
+        'Granja_Longitud': granja['Longitud'],
+        'Comunidades_Cercanas': n_mas_cercanas
+    }
+
+def _imprimir_resultado(resultado):
+    """Muestra en consola las 5 comunidades más cercanas de una granja"""
+    print(f"Granja {resultado['Item']} ({resultado['Granja_Municipio']}, {resultado['Granja_Departamento']}):")
+    print(f"  Comunidades más cercanas:")
+    for i, com in enumerate(resultado['Comunidades_Cercanas'][:5], 1):
+        print(f"    {i}. ID {com['ID_Comunidad']}: {com['Nombre_Comunidad'][:50]}... "
+              f"({com['Distancia_km']:.2f} km)")
+    print()
+
+def construir_resultados(granjas_df, comunidades_df, posiciones, distancias):
+    """
+    Materializa los resultados por granja a partir de las posiciones (relativas a
+    `comunidades_df`) y distancias de sus comunidades más cercanas.
+    """
+    resultados = []
+    metadatos = _extraer_metadatos(comunidades_df)
+    granjas = granjas_df[['Item', 'Departamento', 'Municipio', 'Latitud', 'Longitud']].to_dict('records')
+    for granja, posiciones_granja, distancias_granja in zip(granjas, posiciones, distancias):
+        resultado = _construir_resultado(granja, metadatos, posiciones_granja, distancias_granja)
         resultados.append(resultado)
-        
-        print(f"Granja {granja['Item']} ({granja['Municipio']}, {granja['Departamento']}):")
-        print(f"  Comunidades más cercanas:")
-        for i, com in enumerate(n_mas_cercanas[:5], 1):
-            print(f"    {i}. ID {com['ID_Comunidad']}: {com['Nombre_Comunidad'][:50]}... "
-                  f"({com['Distancia_km']:.2f} km)")
-        print()
+        _imprimir_resultado(resultado)
     
     return resultados
 
+def encontrar_comunidades_cercanas(granjas_df, comunidades_df, n_cercanas=10, metodo='geodesico',
+                                   indice=None):
+    """
+    Encuentra las n comunidades energéticas más cercanas a cada granja.
+    
+    Con `indice` (IndiceEspacial construido sobre `comunidades_df`) la búsqueda es
+    sub-lineal; sin él, las distancias se calculan por bloques granjas × comunidades
+    con el motor vectorizado de `distancias` ('geodesico' = WGS-84, 'haversine' = esfera).
+    """
+    n = min(n_cercanas, len(comunidades_df))
+    
+    if indice is not None:
+        if len(indice) != len(comunidades_df):
+            raise ValueError("El índice espacial no corresponde a las comunidades recibidas")
+        posiciones, distancias = indice.k_vecinos(granjas_df['Latitud'], granjas_df['Longitud'], n)
+    else:
+        bloques_posiciones, bloques_distancias = [], []
+        for inicio, fin, bloque in bloques_distancias_km(
+            granjas_df['Latitud'], granjas_df['Longitud'],
+            comunidades_df['y'], comunidades_df['x'], metodo
+        ):
+            # Selección parcial; ante empates se conserva el orden original de las comunidades
+            orden = k_menores(bloque, n)
+            bloques_posiciones.append(orden)
+            bloques_distancias.append(np.take_along_axis(bloque, orden, axis=1))
+        posiciones = np.concatenate(bloques_posiciones) if bloques_posiciones else np.empty((0, n), dtype=np.int64)
+        distancias = np.concatenate(bloques_distancias) if bloques_distancias else np.empty((0, n))
+    
+    return construir_resultados(granjas_df, comunidades_df, posiciones, distancias)
+
 def crear_mapa_interactivo(granjas_df, comunidades_df, resultados):
     """
     Crea un mapa interactivo con Plotly mostrando granjas y comunidades.
@@ -85,27 +135,22 @@ def crear_mapa_interactivo(granjas_df, comunidades_df, resultados):
     fig = go.Figure()
     
     # Agregar granjas al mapa
-    fig.add_trace(go.Scattermapbox(
-        lat=granjas_df['Latitud'],
-        lon=granjas_df['Longitud'],
-        mode='markers',
+    fig.add_trace(traza_mapa(
+        granjas_df, 'Granjas Solares',
+        "<b>Granja {Item}<br>{Municipio}, {Departamento}<br>{Nombre del proyecto}...</b>",
+        lat='Latitud', lon='Longitud',
         marker=dict(size=15, color='red', symbol='circle'),
-        text=[f"Granja {row['Item']}<br>{row['Municipio']}, {row['Departamento']}<br>{row['Nombre del proyecto'][:100]}..." 
-              for _, row in granjas_df.iterrows()],
-        name='Granjas Solares',
-        hovertemplate='<b>%{text}</b><br>Lat: %{lat}<br>Lon: %{lon}<extra></extra>'
+        recortes={'Nombre del proyecto': 100},
+        sufijo='<br>Lat: %{lat}<br>Lon: %{lon}'
     ))
     
     # Agregar comunidades energéticas al mapa
-    fig.add_trace(go.Scattermapbox(
-        lat=comunidades_df['y'],
-        lon=comunidades_df['x'],
-        mode='markers',
+    fig.add_trace(traza_mapa(
+        comunidades_df, 'Comunidades Energéticas',
+        "<b>ID {ID}: {Nombre de la comunidad}<br>{Municipio}, {Departamento}"
+        "<br>Potencia: {Potencia Estimada kWp} kWp</b>",
         marker=dict(size=8, color='blue', symbol='circle'),
-        text=[f"ID {row['ID']}: {row['Nombre de la comunidad']}<br>{row['Municipio']}, {row['Departamento']}<br>Potencia: {row['Potencia Estimada kWp']} kWp" 
-              for _, row in comunidades_df.iterrows()],
-        name='Comunidades Energéticas',
-        hovertemplate='<b>%{text}</b><br>Lat: %{lat}<br>Lon: %{lon}<extra></extra>'
+        sufijo='<br>Lat: %{lat}<br>Lon: %{lon}'
     ))
     
     # Configurar el mapa
@@ -122,16 +167,14 @@ def crear_mapa_interactivo(granjas_df, comunidades_df, resultados):
     
     return fig
 
-def crear_analisis_distancias(resultados):
+def calcular_estadisticas(resultados):
     """
-    Crea análisis estadísticos de las distancias.
+    Calcula la distancia mínima, media y máxima de cada granja a sus comunidades cercanas.
     """
-    distancias_todas = []
     distancias_por_granja = []
     
     for resultado in resultados:
         distancias_granja = [com['Distancia_km'] for com in resultado['Comunidades_Cercanas']]
-        distancias_todas.extend(distancias_granja)
         distancias_por_granja.append({
             'Item': resultado['Item'],
             'Departamento': resultado['Granja_Departamento'],
@@ -141,8 +184,40 @@ def crear_analisis_distancias(resultados):
             'Distancia_Max': max(distancias_granja)
         })
     
+    return pd.DataFrame(distancias_por_granja)
+
+def crear_resumen_detallado(resultados):
+    """
+    Crea el detalle de todas las relaciones granja - comunidad (una fila por ranking).
+    """
+    resumen_detallado = []
+    for resultado in resultados:
+        for i, comunidad in enumerate(resultado['Comunidades_Cercanas'], 1):
+            resumen_detallado.append({
+                'Granja_Item': resultado['Item'],
+                'Granja_Departamento': resultado['Granja_Departamento'],
+                'Granja_Municipio': resultado['Granja_Municipio'],
+                'Ranking': i,
+                'Comunidad_ID': comunidad['ID_Comunidad'],
+                'Comunidad_Nombre': comunidad['Nombre_Comunidad'],
+                'Comunidad_Departamento': comunidad['Departamento_Comunidad'],
+                'Comunidad_Municipio': comunidad['Municipio_Comunidad'],
+                'Distancia_km': round(comunidad['Distancia_km'], 2),
+                'Potencia_kWp': comunidad['Potencia_kWp'],
+                'Inversion_Estimada': comunidad['Inversion_Estimada']
+            })
+    
+    return pd.DataFrame(resumen_detallado)
+
+def crear_analisis_distancias(resultados):
+    """
+    Crea análisis estadísticos de las distancias.
+    """
+    distancias_todas = [com['Distancia_km'] for resultado in resultados
+                        for com in resultado['Comunidades_Cercanas']]
+    
     # Crear DataFrame con estadísticas por granja
-    stats_df = pd.DataFrame(distancias_por_granja)
+    stats_df = calcular_estadisticas(resultados)
     
     # Crear gráfico de barras con distancias promedio
     fig_barras = px.bar(
@@ -167,9 +242,20 @@ def crear_analisis_distancias(resultados):
     
     return stats_df, fig_barras, fig_hist
 
-def main():
+def main(workers=1, chunk_size=256, chunk_comunidades=None, ruta_granjas='Base granjas.csv',
+         incremental=False, radios=None):
     """
     Función principal que ejecuta todo el análisis.
+    
+    Con `workers` > 1 las granjas se procesan en bloques de `chunk_size` en varios
+    procesos; `chunk_comunidades` activa además el barrido por bloques de comunidades
+    (sin índice espacial) para acotar la memoria de cada proceso.
+    Con `incremental` solo se recalculan las granjas afectadas desde la última
+    ejecución y se parchean los CSV de salida (ver `proximidad_incremental`).
+    Con `radios` (km) se escriben además todas las comunidades dentro de cada
+    radio y la cobertura por granja (ver `proximidad_radio`).
+    Los tres CSV principales se publican juntos como una versión nueva en
+    `resultados/` (ver `versiones_resultados`).
     """
     print("=== ANÁLISIS DE PROXIMIDAD GRANJAS SOLARES - COMUNIDADES ENERGÉTICAS ===")
     print()
@@ -178,7 +264,7 @@ def main():
     print("1. Cargando datos...")
     try:
         # Cargar granjas
-        granjas_df = pd.read_csv('Base granjas.csv')
+        granjas_df = pd.read_csv(ruta_granjas)
         print(f"   Granjas cargadas: {len(granjas_df)}")
         
         # Cargar comunidades energéticas
@@ -198,17 +284,99 @@ def main():
     
     # Encontrar comunidades cercanas
     print("\n3. Calculando proximidades...")
-    resultados = encontrar_comunidades_cercanas(granjas_validas, comunidades_validas, 10)
+    cambios = None
+    granjas_calculo = granjas_validas
+    if incremental:
+        cambios = detectar_cambios(granjas_validas, comunidades_validas, 10, 'geodesico')
+        if cambios is None:
+            print("   Sin manifiesto compatible de la ejecución anterior: se hace el análisis completo")
+        else:
+            granjas_calculo = granjas_validas[granjas_validas['Item'].astype(str).isin(cambios['afectadas'])]
+            print(f"   Modo incremental: {len(granjas_calculo)} de {len(granjas_validas)} granjas por recalcular")
+            print(f"   Granjas nuevas o modificadas: {cambios['granjas_nuevas_o_modificadas']}, "
+                  f"eliminadas: {len(cambios['granjas_eliminadas'])}")
+            print(f"   Comunidades agregadas: {cambios['comunidades_agregadas']}, "
+                  f"eliminadas: {cambios['comunidades_eliminadas']}, "
+                  f"movidas: {cambios['comunidades_movidas']}, "
+                  f"modificadas: {cambios['comunidades_modificadas']}")
+    
+    # Índice de comunidades, compartido por el cálculo y las salidas derivadas
+    indice_comunidades = cargar_o_construir_indice(comunidades_validas)
+    if workers > 1:
+        print(f"   Modo paralelo: {workers} procesos, bloques de {chunk_size} granjas")
+        posiciones, distancias = calcular_proximidades_paralelo(
+            granjas_calculo, comunidades_validas, 10,
+            workers=workers, chunk_size=chunk_size,
+            chunk_comunidades=chunk_comunidades, usar_indice=chunk_comunidades is None,
+            indice=indice_comunidades
+        )
+        resultados = construir_resultados(granjas_calculo, comunidades_validas, posiciones, distancias)
+    else:
+        resultados = encontrar_comunidades_cercanas(granjas_calculo, comunidades_validas, 10,
+                                                    indice=indice_comunidades)
+    
+    version = NuevaVersion(
+        parametros={'n_cercanas': 10, 'metodo': 'geodesico', 'ruta_granjas': ruta_granjas,
+                    'incremental': cambios is not None, 'radios': sorted(radios) if radios else None,
+                    'workers': workers, 'chunk_size': chunk_size, 'chunk_comunidades': chunk_comunidades},
+        entradas=[ruta_granjas, 'Base comunidades energéticas.csv']
+    )
+    
+    try:
+        # Asignación inversa: granja más cercana a cada comunidad (todas las granjas válidas)
+        comunidades_actualizadas = granja_mas_cercana(comunidades_df, granjas_validas)
+        version.escribir('comunidades_actualizadas', comunidades_actualizadas)
+        print(f"   Granja más cercana de cada comunidad: '{RUTA_COMUNIDADES_ACTUALIZADA}' "
+              f"(mediana {comunidades_actualizadas['Distancia_Granja_km'].median():.1f} km)")
+        
+        # Matriz dispersa de distancias para consultas top-k / radio sin recalcular (dashboard)
+        matriz = version.escribir_directorio('matriz_distancias', lambda ruta: guardar_matriz(
+            granjas_validas, comunidades_validas, K_MATRIZ, indice=indice_comunidades, directorio=ruta
+        ))
+        print(f"   Matriz de distancias ({K_MATRIZ} comunidades por granja, {matriz.nnz} valores): "
+              f"'{DIRECTORIO_MATRIZ}/'")
+        
+        if radios:
+            print(f"   Comunidades por radio ({', '.join(f'{radio:g}' for radio in sorted(radios))} km)...")
+            vecinos_radio, _ = analizar_radios(
+                granjas_validas, comunidades_validas, indice_comunidades, version, radios
+            )
+            print(f"   {len(vecinos_radio)} pares granja-comunidad en '{DATA_FILES['vecinos_radio']}', "
+                  f"cobertura en '{DATA_FILES['cobertura_radio']}' y CSR en '{DATA_FILES['vecinos_radio_csr']}'")
+    except Exception:
+        version.descartar()
+        raise
+    
+    if cambios is not None:
+        print("\n4. Parcheando salidas existentes...")
+        try:
+            granjas_df, stats_df = parchear_salidas(
+                granjas_df, granjas_validas, cambios, resultados,
+                calcular_estadisticas(resultados), crear_resumen_detallado(resultados), version_nueva=version
+            )
+            manifiesto = version.publicar()
+        except Exception:
+            version.descartar()
+            raise
+        guardar_manifiesto(granjas_validas, comunidades_validas, resultados, 10, 'geodesico',
+                           previo=cambios['manifiesto'])
+        print(f"   {len(resultados)} granjas recalculadas; versión '{manifiesto['version']}' publicada "
+              f"en '{DIRECTORIO_RESULTADOS}/' y manifiesto actualizado")
+        print("   (las visualizaciones HTML solo se regeneran en el análisis completo)")
+        return granjas_df, resultados, stats_df
     
     # Actualizar DataFrame de granjas con los resultados
     print("\n4. Actualizando base de datos de granjas...")
-    for resultado in resultados:
-        idx = granjas_df[granjas_df['Item'] == resultado['Item']].index[0]
-        granjas_df.at[idx, 'CEs Relacionadas'] = resultado['CEs_Relacionadas']
+    ces_por_item = {resultado['Item']: resultado['CEs_Relacionadas'] for resultado in resultados}
+    ces_actualizadas = granjas_df['Item'].map(ces_por_item)
+    # La columna llega vacía (float) desde el CSV original
+    granjas_df['CEs Relacionadas'] = ces_actualizadas.where(
+        ces_actualizadas.notna(), granjas_df['CEs Relacionadas'].astype(object)
+    )
     
-    # Guardar la base actualizada
-    granjas_df.to_csv('Base granjas_actualizada.csv', index=False)
-    print("   Base de granjas actualizada guardada como 'Base granjas_actualizada.csv'")
+    # Guardar la base actualizada (visible al publicar la versión)
+    version.escribir('granjas_actualizadas', granjas_df)
+    print("   Base de granjas actualizada: 'Base granjas_actualizada.csv'")
     
     # Crear visualizaciones
     print("\n5. Generando visualizaciones...")
@@ -224,31 +392,21 @@ def main():
     fig_hist.write_html('distribucion_distancias.html')
     
     # Guardar estadísticas
-    stats_df.to_csv('estadisticas_distancias.csv', index=False)
-    print("   Análisis estadístico guardado como 'estadisticas_distancias.csv'")
+    version.escribir('estadisticas', stats_df)
+    print("   Análisis estadístico: 'estadisticas_distancias.csv'")
     
     # Crear resumen detallado
     print("\n6. Generando resumen detallado...")
-    resumen_detallado = []
-    for resultado in resultados:
-        for i, comunidad in enumerate(resultado['Comunidades_Cercanas'], 1):
-            resumen_detallado.append({
-                'Granja_Item': resultado['Item'],
-                'Granja_Departamento': resultado['Granja_Departamento'],
-                'Granja_Municipio': resultado['Granja_Municipio'],
-                'Ranking': i,
-                'Comunidad_ID': comunidad['ID_Comunidad'],
-                'Comunidad_Nombre': comunidad['Nombre_Comunidad'],
-                'Comunidad_Departamento': comunidad['Departamento_Comunidad'],
-                'Comunidad_Municipio': comunidad['Municipio_Comunidad'],
-                'Distancia_km': round(comunidad['Distancia_km'], 2),
-                'Potencia_kWp': comunidad['Potencia_kWp'],
-                'Inversion_Estimada': comunidad['Inversion_Estimada']
-            })
+    resumen_df = crear_resumen_detallado(resultados)
+    version.escribir('resumen_detallado', resumen_df)
+    print("   Resumen detallado: 'resumen_detallado_proximidades.csv'")
     
-    resumen_df = pd.DataFrame(resumen_detallado)
-    resumen_df.to_csv('resumen_detallado_proximidades.csv', index=False)
-    print("   Resumen detallado guardado como 'resumen_detallado_proximidades.csv'")
+    # Los tres CSV quedan visibles a la vez al mover el puntero ACTUAL
+    manifiesto = version.publicar()
+    print(f"   Versión '{manifiesto['version']}' publicada en '{DIRECTORIO_RESULTADOS}/'")
+    
+    # Manifiesto para ejecuciones incrementales
+    guardar_manifiesto(granjas_validas, comunidades_validas, resultados, 10, 'geodesico')
     
     # Mostrar resultados summary
     print("\n=== RESUMEN DE RESULTADOS ===")
@@ -259,14 +417,49 @@ def main():
     print(f"Distancia máxima en top 10: {max([com['Distancia_km'] for resultado in resultados for com in resultado['Comunidades_Cercanas']]):.2f} km")
     
     print(f"\nArchivos generados:")
-    print("- Base granjas_actualizada.csv (base original con CEs relacionadas)")
+    print(f"- {DIRECTORIO_RESULTADOS}/{manifiesto['version']}/ (versión publicada con manifiesto.json):")
+    print("  - Base granjas_actualizada.csv (base original con CEs relacionadas)")
+    print("  - estadisticas_distancias.csv (estadísticas por granja)")
+    print("  - resumen_detallado_proximidades.csv (todas las relaciones)")
+    print(f"  - {RUTA_COMUNIDADES_ACTUALIZADA} (granja más cercana de cada comunidad)")
+    print(f"  - {DIRECTORIO_MATRIZ}/ (matriz dispersa de distancias para el dashboard)")
+    if radios:
+        print(f"  - {DATA_FILES['vecinos_radio']}, {DATA_FILES['cobertura_radio']} y "
+              f"{DATA_FILES['vecinos_radio_csr']} (comunidades por radio)")
     print("- mapa_granjas_comunidades.html (mapa interactivo)")
     print("- analisis_distancias_barras.html (gráfico de barras)")
     print("- distribucion_distancias.html (histograma)")
-    print("- estadisticas_distancias.csv (estadísticas por granja)")
-    print("- resumen_detallado_proximidades.csv (todas las relaciones)")
+
+    print("- manifiesto_proximidad.json (estado para ejecuciones incrementales)")
     
     return granjas_df, resultados, stats_df
 
+def parsear_argumentos(argv=None):
+    """Opciones de línea de comandos del análisis"""
+    parser = argparse.ArgumentParser(
+        description="Análisis de proximidad granjas solares - comunidades energéticas"
+    )
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Número de procesos para el cálculo de proximidades (por defecto 1)")
+    parser.add_argument('--chunk-size', type=int, default=256,
+                        help="Granjas por bloque en modo paralelo (por defecto 256)")
+    parser.add_argument('--chunk-comunidades', type=int, default=None,
+                        help="Comunidades por bloque; usa barrido por bloques en lugar del índice espacial")
+    parser.add_argument('--granjas', default='Base granjas.csv',
+                        help="CSV de granjas o sitios candidatos (por defecto 'Base granjas.csv')")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Recalcula solo las granjas afectadas desde la última ejecución")
+    parser.add_argument('--radios', type=float, nargs='+', default=None, metavar='KM',
+                        help="Radios en km para listar todas las comunidades cercanas (p. ej. --radios 5 10 25)")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    granjas_actualizadas, resultados, estadisticas = main()
+    args = parsear_argumentos()
+    granjas_actualizadas, resultados, estadisticas = main(
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        chunk_comunidades=args.chunk_comunidades,
+        ruta_granjas=args.granjas,
+        incremental=args.incremental,
+        radios=args.radios
+    )
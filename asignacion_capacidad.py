@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Asignación granjas → comunidades con restricciones de capacidad.
+
+El análisis principal toma las 10 comunidades más cercanas de cada granja por
+separado, así que una comunidad puede quedar en varias granjas y no se compara
+la demanda con la capacidad. Aquí la asignación se resuelve en conjunto como un
+problema de transporte entero (HiGHS vía `scipy.optimize.milp`):
+
+    x_ij ∈ {0, 1} por cada arista candidata (granja i, comunidad j)
+    s.a. Σ_i x_ij <= 1                        cada comunidad en a lo sumo una granja
+         Σ_j x_ij <= Numero de comunidades_i
+         Σ_j kWp_j · x_ij <= Potencia  KW_i
+
+Por defecto el objetivo es lexicográfico y se resuelve en dos etapas:
+primero max Σ x_ij (comunidades atendidas, N*), y luego min Σ d_ij · x_ij con
+Σ x_ij >= N*. Un único objetivo Σ (d_ij - premio) · x_ij con premio = mayor
+distancia + 1 no basta con la restricción de potencia: dos comunidades lejanas
+pueden "valer" más que tres cercanas si premio·(3 - 2) < la diferencia de
+distancias. Con `premio_km` explícito se usa ese objetivo ponderado (una
+sola etapa), que intercambia comunidades por kilómetros a esa tasa.
+Las aristas se podan a
+las `k` comunidades más cercanas de cada granja (y opcionalmente a `radio_km`)
+con el índice espacial, por lo que el tamaño del problema es granjas × k.
+
+La salida tiene las mismas columnas que `resumen_detallado_proximidades.csv`.
+
+Uso:
+    python asignacion_capacidad.py --k 30 --radio 50
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.optimize import LinearConstraint, milp
+from indice_espacial import cargar_o_construir_indice
+
+RUTA_ASIGNACION = 'resumen_asignacion_capacidad.csv'
+K_CANDIDATAS = 30
+LIMITE_TIEMPO_S = 300.0
+
+COLUMNAS_RESUMEN = [
+    'Granja_Item', 'Granja_Departamento', 'Granja_Municipio', 'Ranking', 'Comunidad_ID',
+    'Comunidad_Nombre', 'Comunidad_Departamento', 'Comunidad_Municipio', 'Distancia_km',
+    'Potencia_kWp', 'Inversion_Estimada'
+]
+
+
+def _numerico(serie, vacio):
+    """Columna numérica; los valores vacíos o no numéricos se reemplazan por `vacio`"""
+    return pd.to_numeric(serie, errors='coerce').fillna(vacio).to_numpy(dtype=np.float64)
+
+
+def aristas_candidatas(granjas_df, comunidades_df, k=K_CANDIDATAS, radio_km=None, indice=None):
+    """
+    Aristas (granja, comunidad, distancia_km) a las k comunidades más cercanas de
+    cada granja, opcionalmente dentro de `radio_km`. Las posiciones son relativas
+    a las filas de `granjas_df` y `comunidades_df`.
+    """
+    indice = cargar_o_construir_indice(comunidades_df) if indice is None else indice
+    posiciones, distancias = indice.k_vecinos(granjas_df['Latitud'], granjas_df['Longitud'], k)
+    granjas = np.repeat(np.arange(len(granjas_df)), posiciones.shape[1])
+    posiciones, distancias = posiciones.ravel(), distancias.ravel()
+    if radio_km is not None:
+        dentro = distancias <= radio_km
+        granjas, posiciones, distancias = granjas[dentro], posiciones[dentro], distancias[dentro]
+    return granjas, posiciones, distancias
+
+
+def resolver_asignacion(granjas_df, comunidades_df, granjas, comunidades, distancias,
+                        premio_km=None, limite_tiempo_s=LIMITE_TIEMPO_S):
+    """
+    Resuelve el programa entero sobre las aristas candidatas: con `premio_km`
+    None, en dos etapas (máximo de comunidades atendidas y, fijado ese número,
+    mínima distancia total); si no, con el objetivo ponderado Σ (d - premio) · x.
+    `limite_tiempo_s` es el total para ambas etapas; si se alcanza se usa la
+    mejor asignación factible encontrada.
+    Retorna (máscara de aristas asignadas, resultado del último `milp`).
+    """
+    n_aristas = len(distancias)
+    if n_aristas == 0:
+        return np.zeros(0, dtype=bool), None
+
+    aristas = np.arange(n_aristas)
+    unicas, fila_comunidad = np.unique(comunidades, return_inverse=True)
+    demanda = _numerico(comunidades_df['Potencia Estimada kWp'], 0.0)[comunidades]
+    max_comunidades = _numerico(granjas_df['Numero de comunidades'], np.inf)
+    potencia = _numerico(granjas_df['Potencia  KW'], np.inf)
+
+    forma_granjas = (len(granjas_df), n_aristas)
+    restricciones = [
+        LinearConstraint(sparse.csr_array((np.ones(n_aristas), (fila_comunidad, aristas)),
+                                          shape=(len(unicas), n_aristas)), -np.inf, 1),
+        LinearConstraint(sparse.csr_array((np.ones(n_aristas), (granjas, aristas)), shape=forma_granjas),
+                         -np.inf, max_comunidades),
+        LinearConstraint(sparse.csr_array((demanda, (granjas, aristas)), shape=forma_granjas),
+                         -np.inf, potencia),
+    ]
+    inicio = time.perf_counter()
+
+    def resolver(costos, restricciones):
+        restante = max(limite_tiempo_s - (time.perf_counter() - inicio), 1.0)
+        resultado = milp(
+            c=costos,
+            constraints=restricciones,
+            integrality=np.ones(n_aristas),
+            bounds=(0, 1),
+            options={'time_limit': restante, 'disp': False}
+        )
+        if resultado.x is None:
+            raise RuntimeError(f"No se encontró una asignación factible: {resultado.message}")
+        return resultado
+
+    if premio_km is not None:
+        resultado = resolver(distancias - premio_km, restricciones)
+        return resultado.x > 0.5, resultado
+
+    # Etapa 1: máximo de comunidades atendidas (la solución cumple la etapa 2)
+    atendidas = int(round(np.sum(resolver(-np.ones(n_aristas), restricciones).x)))
+    # Etapa 2: mínima distancia total sin atender menos comunidades
+    resultado = resolver(distancias, restricciones + [
+        LinearConstraint(np.ones((1, n_aristas)), atendidas, np.inf)
+    ])
+    return resultado.x > 0.5, resultado
+
+
+def crear_resumen_asignacion(granjas_df, comunidades_df, granjas, comunidades, distancias):
+    """Resumen con el formato de `resumen_detallado_proximidades.csv` (Ranking por distancia)"""
+    orden = np.lexsort((comunidades, distancias, granjas))
+    granjas, comunidades, distancias = granjas[orden], comunidades[orden], distancias[orden]
+    resumen = pd.DataFrame({
+        'Granja_Item': granjas_df['Item'].to_numpy()[granjas],
+        'Granja_Departamento': granjas_df['Departamento'].to_numpy()[granjas],
+        'Granja_Municipio': granjas_df['Municipio'].to_numpy()[granjas],
+        'Comunidad_ID': comunidades_df['ID'].to_numpy()[comunidades],
+        'Comunidad_Nombre': comunidades_df['Nombre de la comunidad'].to_numpy()[comunidades],
+        'Comunidad_Departamento': comunidades_df['Departamento'].to_numpy()[comunidades],
+        'Comunidad_Municipio': comunidades_df['Municipio'].to_numpy()[comunidades],
+        'Distancia_km': np.round(distancias, 2),
+        'Potencia_kWp': comunidades_df['Potencia Estimada kWp'].to_numpy()[comunidades],
+        'Inversion_Estimada': comunidades_df['Inversión Estimada'].to_numpy()[comunidades],
+    })
+    resumen['Ranking'] = resumen.groupby('Granja_Item', sort=False).cumcount() + 1
+    return resumen[COLUMNAS_RESUMEN]
+
+
+def asignar_con_capacidad(granjas_df, comunidades_df, k=K_CANDIDATAS, radio_km=None,
+                          premio_km=None, limite_tiempo_s=LIMITE_TIEMPO_S, indice=None):
+    """
+    Asignación completa: poda de aristas, programa entero y resumen.
+    Retorna (resumen_df, resultado de `milp`).
+    """
+    granjas_df = granjas_df.reset_index(drop=True)
+    comunidades_df = comunidades_df.reset_index(drop=True)
+    granjas, comunidades, distancias = aristas_candidatas(granjas_df, comunidades_df, k, radio_km, indice)
+    asignadas, resultado = resolver_asignacion(
+        granjas_df, comunidades_df, granjas, comunidades, distancias, premio_km, limite_tiempo_s
+    )
+    resumen = crear_resumen_asignacion(
+        granjas_df, comunidades_df, granjas[asignadas], comunidades[asignadas], distancias[asignadas]
+    )
+    return resumen, resultado
+
+
+def parsear_argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="Asignación granjas → comunidades con capacidad")
+    parser.add_argument('--granjas', default='Base granjas.csv')
+    parser.add_argument('--comunidades', default='Base comunidades energéticas.csv')
+    parser.add_argument('--k', type=int, default=K_CANDIDATAS,
+                        help=f"Comunidades candidatas por granja (por defecto {K_CANDIDATAS})")
+    parser.add_argument('--radio', type=float, default=None, help="Distancia máxima en km de una asignación")
+    parser.add_argument('--premio', type=float, default=None,
+                        help="Beneficio en km de atender una comunidad (objetivo ponderado); por defecto "
+                             "se maximizan las comunidades atendidas y luego se minimiza la distancia")
+    parser.add_argument('--limite-tiempo', type=float, default=LIMITE_TIEMPO_S,
+                        help="Tiempo máximo del solver en segundos")
+    parser.add_argument('--salida', default=RUTA_ASIGNACION)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parsear_argumentos(argv)
+    granjas_df = pd.read_csv(args.granjas).dropna(subset=['Latitud', 'Longitud'])
+    comunidades_df = pd.read_csv(args.comunidades).dropna(subset=['x', 'y'])
+
+    inicio = time.perf_counter()
+    resumen, resultado = asignar_con_capacidad(
+        granjas_df, comunidades_df, args.k, args.radio, args.premio, args.limite_tiempo
+    )
+    resumen.to_csv(args.salida, index=False)
+
+    print(f"Estado del solver: {resultado.message if resultado is not None else 'sin aristas candidatas'}")
+    print(f"{len(resumen)} comunidades asignadas a {resumen['Granja_Item'].nunique()} de {len(granjas_df)} granjas "
+          f"en {time.perf_counter() - inicio:.1f} s")
+    if len(resumen):
+        print(f"Distancia promedio: {resumen['Distancia_km'].mean():.2f} km")
+    print(f"Asignación guardada en '{args.salida}'")
+
+
+if __name__ == "__main__":
+    main()
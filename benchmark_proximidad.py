@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Benchmarks del pipeline de proximidad y de las rutas críticas del dashboard.
+
+Mide con datos sintéticos (ver `datos_sinteticos`):
+- encontrar_comunidades_cercanas: 15 / 1k / 10k granjas contra 17.5k / 200k / 1M
+  comunidades (índice espacial; barrido completo solo en los casos pequeños)
+- crear_tabla_principal
+- crear_mapa_estable / crear_mapa_plotly: tiempo de construcción y tamaño del payload
+- to_excel
+
+Cada caso reporta el mínimo y la mediana de varias repeticiones (estilo asv).
+Los resultados se comparan con la línea base guardada y el proceso termina con
+código 1 si algún caso es más lento que la base por encima de la tolerancia.
+
+Uso:
+    python benchmark_proximidad.py                  # compara con la línea base
+    python benchmark_proximidad.py --rapido         # solo los tamaños pequeños
+    python benchmark_proximidad.py --guardar        # actualiza la línea base
+    python benchmark_proximidad.py --filtro mapa    # solo los casos que contienen 'mapa'
+"""
+import argparse
+import contextlib
+import inspect
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from datos_sinteticos import generar_comunidades, generar_granjas
+
+RUTA_LINEA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_linea_base.json')
+TOLERANCIA = 0.5
+
+TAMANOS_GRANJAS = (15, 1_000, 10_000)
+TAMANOS_COMUNIDADES = (17_518, 200_000, 1_000_000)
+TAMANOS_RAPIDOS = {'granjas': (15, 1_000), 'comunidades': (17_518, 200_000)}
+
+# Por encima de este número de pares el barrido completo no se mide
+MAX_PARES_BARRIDO = 20_000_000
+
+
+def medir(funcion, repeticiones=3, calentamiento=1):
+    """
+    Ejecuta `funcion` y retorna (tiempos, último resultado). La salida por consola
+    del código medido se descarta (se sigue pagando el formateo, no la terminal).
+    """
+    resultado = None
+    tiempos = []
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        for _ in range(calentamiento):
+            resultado = funcion()
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            resultado = funcion()
+            tiempos.append(time.perf_counter() - inicio)
+    return tiempos, resultado
+
+
+def _registro(tiempos, **extra):
+    return {'min_s': min(tiempos), 'mediana_s': statistics.median(tiempos), 'repeticiones': len(tiempos), **extra}
+
+
+class Datos:
+    """Genera (una sola vez) los conjuntos sintéticos de cada tamaño"""
+
+    def __init__(self):
+        self._granjas = {}
+        self._comunidades = {}
+
+    def granjas(self, n):
+        if n not in self._granjas:
+            self._granjas[n] = generar_granjas(n)
+        return self._granjas[n]
+
+    def comunidades(self, n):
+        if n not in self._comunidades:
+            self._comunidades[n] = generar_comunidades(n)
+        return self._comunidades[n]
+
+
+def _tablas_resultado(granjas, resultados):
+    """granjas_actualizadas y estadísticas como las escribe el análisis"""
+    from analisis_proximidad_simple import calcular_estadisticas
+
+    granjas = granjas.copy()
+    granjas['CEs Relacionadas'] = [r['CEs_Relacionadas'] for r in resultados]
+    return granjas, calcular_estadisticas(resultados)
+
+
+def bench_proximidad(datos, tamanos_granjas, tamanos_comunidades, repeticiones, incluir):
+    from analisis_proximidad_simple import encontrar_comunidades_cercanas
+    from indice_espacial import IndiceEspacial
+    from proximidad_inversa import granja_mas_cercana
+
+    for n_comunidades in tamanos_comunidades:
+        comunidades = datos.comunidades(n_comunidades)
+        nombre = f"proximidad.inversa[g={TAMANOS_GRANJAS[0]},c={n_comunidades}]"
+        if incluir(nombre):
+            granjas = datos.granjas(TAMANOS_GRANJAS[0])
+            tiempos, _ = medir(lambda: granja_mas_cercana(comunidades, granjas), repeticiones)
+            yield nombre, _registro(tiempos)
+        nombre = f"indice_espacial.construir[c={n_comunidades}]"
+        if incluir(nombre):
+            tiempos, _ = medir(lambda: IndiceEspacial.desde_comunidades(comunidades), repeticiones)
+            yield nombre, _registro(tiempos)
+        indice = IndiceEspacial.desde_comunidades(comunidades)
+
+        for n_granjas in tamanos_granjas:
+            granjas = datos.granjas(n_granjas)
+            nombre = f"proximidad.indice[g={n_granjas},c={n_comunidades}]"
+            if incluir(nombre):
+                tiempos, _ = medir(
+                    lambda: encontrar_comunidades_cercanas(granjas, comunidades, indice=indice), repeticiones
+                )
+                yield nombre, _registro(tiempos)
+
+            nombre = f"proximidad.barrido[g={n_granjas},c={n_comunidades}]"
+            if n_granjas * n_comunidades <= MAX_PARES_BARRIDO and incluir(nombre):
+                tiempos, _ = medir(
+                    lambda: encontrar_comunidades_cercanas(granjas, comunidades), repeticiones, calentamiento=0
+                )
+                yield nombre, _registro(tiempos)
+
+
+def bench_tablas(datos, tamanos_granjas, repeticiones, incluir):
+    from analisis_proximidad_simple import encontrar_comunidades_cercanas
+    from data_loader import crear_tabla_principal, to_excel
+    from indice_espacial import IndiceEspacial
+
+    comunidades = datos.comunidades(TAMANOS_COMUNIDADES[0])
+    indice = IndiceEspacial.desde_comunidades(comunidades)
+    for n_granjas in tamanos_granjas:
+        granjas = datos.granjas(n_granjas)
+        _, resultados = medir(
+            lambda: encontrar_comunidades_cercanas(granjas, comunidades, indice=indice), 1, calentamiento=0
+        )
+        granjas_actualizadas, estadisticas = _tablas_resultado(granjas, resultados)
+        nombre = f"crear_tabla_principal[g={n_granjas}]"
+        if incluir(nombre):
+            tiempos, tabla = medir(lambda: crear_tabla_principal(granjas_actualizadas, estadisticas), repeticiones)
+            yield nombre, _registro(tiempos)
+        else:
+            tabla = crear_tabla_principal(granjas_actualizadas, estadisticas)
+
+        nombre = f"to_excel.tabla_principal[g={n_granjas}]"
+        if incluir(nombre):
+            tiempos, contenido = medir(lambda: to_excel(tabla), repeticiones)
+            yield nombre, _registro(tiempos, bytes=len(contenido))
+
+
+def bench_mapas(datos, tamanos_comunidades, repeticiones, incluir):
+    import dashboard_estable
+    from data_loader import cargar_piramide_comunidades
+
+    # Sin la caché de Streamlit ni el perfilado: se mide la construcción real
+    crear_mapa_estable = inspect.unwrap(dashboard_estable.crear_mapa_estable)
+    granjas = datos.granjas(TAMANOS_GRANJAS[0])
+
+    for n_comunidades in tamanos_comunidades:
+        comunidades = datos.comunidades(n_comunidades)
+        for modo in ('agregado', 'todas'):
+            nombre = f"crear_mapa_estable.{modo}[c={n_comunidades}]"
+            if incluir(nombre):
+                tiempos, html = medir(
+                    lambda: crear_mapa_estable(granjas, comunidades, modo=modo).get_root().render(), repeticiones
+                )
+                yield nombre, _registro(tiempos, bytes=len(html.encode('utf-8')))
+
+        piramide = cargar_piramide_comunidades(comunidades)
+        for zoom in (6, 10):
+            nombre = f"crear_mapa_plotly.zoom{zoom}[c={n_comunidades}]"
+            if incluir(nombre):
+                tiempos, contenido = medir(
+                    lambda: dashboard_estable.crear_mapa_plotly(
+                        granjas, comunidades, zoom=zoom, piramide=piramide
+                    ).to_json(), repeticiones
+                )
+                yield nombre, _registro(tiempos, bytes=len(contenido.encode('utf-8')))
+
+
+def ejecutar(rapido=False, filtro=None, repeticiones=3):
+    tamanos_granjas = TAMANOS_RAPIDOS['granjas'] if rapido else TAMANOS_GRANJAS
+    tamanos_comunidades = TAMANOS_RAPIDOS['comunidades'] if rapido else TAMANOS_COMUNIDADES
+    incluir = (lambda nombre: filtro in nombre) if filtro else (lambda nombre: True)
+    datos = Datos()
+
+    grupos = (
+        bench_proximidad(datos, tamanos_granjas, tamanos_comunidades, repeticiones, incluir),
+        bench_tablas(datos, tamanos_granjas, repeticiones, incluir),
+        bench_mapas(datos, tamanos_comunidades[:2], repeticiones, incluir),
+    )
+    resultados = {}
+    for grupo in grupos:
+        for nombre, registro in grupo:
+            resultados[nombre] = registro
+            extra = f"  {registro['bytes'] / 1e6:8.2f} MB" if 'bytes' in registro else ''
+            print(f"   {nombre:<55} {registro['min_s'] * 1000:10.1f} ms{extra}", flush=True)
+    return resultados
+
+
+def entorno():
+    return {
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'procesadores': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def comparar(resultados, linea_base, tolerancia=TOLERANCIA):
+    """
+    Retorna la lista de (caso, medida, valor_actual, valor_base) cuyo tiempo mínimo
+    o tamaño de payload supera al de la línea base más la tolerancia
+    """
+    regresiones = []
+    for nombre, registro in resultados.items():
+        base = linea_base.get('resultados', {}).get(nombre)
+        if not base:
+            continue
+        for medida in ('min_s', 'bytes'):
+            if medida in registro and medida in base and registro[medida] > base[medida] * (1 + tolerancia):
+                regresiones.append((nombre, medida, registro[medida], base[medida]))
+    return regresiones
+
+
+def parsear_argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks del análisis de proximidad y del dashboard")
+    parser.add_argument('--rapido', action='store_true', help='Solo los tamaños pequeños')
+    parser.add_argument('--filtro', help='Ejecutar solo los casos cuyo nombre contiene este texto')
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--guardar', action='store_true', help='Guardar los resultados como línea base')
+    parser.add_argument('--linea-base', default=RUTA_LINEA_BASE)
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA,
+                        help='Fracción de tiempo adicional permitida frente a la línea base')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parsear_argumentos(argv)
+    ruta_linea_base = os.path.abspath(args.linea_base)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    print("⏱️  Benchmarks de proximidad y dashboard")
+    # Los índices, pirámides y exportaciones que se persisten van a un directorio temporal
+    directorio_original = os.getcwd()
+    with tempfile.TemporaryDirectory() as temporal:
+        os.chdir(temporal)
+        try:
+            resultados = ejecutar(args.rapido, args.filtro, args.repeticiones)
+        finally:
+            os.chdir(directorio_original)
+
+    if args.guardar:
+        linea_base = {'entorno': entorno(), 'resultados': resultados}
+        if os.path.exists(ruta_linea_base):
+            # Se conservan los casos que no se ejecutaron (p. ej. con --rapido o --filtro)
+            with open(ruta_linea_base, encoding='utf-8') as archivo:
+                previa = json.load(archivo).get('resultados', {})
+            linea_base['resultados'] = {**previa, **resultados}
+        with open(ruta_linea_base, 'w', encoding='utf-8') as archivo:
+            json.dump(linea_base, archivo, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"💾 Línea base guardada en {ruta_linea_base}")
+        return 0
+
+    if not os.path.exists(ruta_linea_base):
+        print("⚠️  No hay línea base; ejecute con --guardar para crearla")
+        return 0
+
+    with open(ruta_linea_base, encoding='utf-8') as archivo:
+        linea_base = json.load(archivo)
+    if linea_base.get('entorno', {}).get('plataforma') != entorno()['plataforma']:
+        print("⚠️  La línea base se tomó en otra máquina; la comparación es orientativa")
+
+    regresiones = comparar(resultados, linea_base, args.tolerancia)
+    for nombre, medida, actual, base in regresiones:
+        if medida == 'bytes':
+            print(f"❌ {nombre}: {actual / 1e6:.2f} MB (base {base / 1e6:.2f} MB)")
+        else:
+            print(f"❌ {nombre}: {actual * 1000:.1f} ms (base {base * 1000:.1f} ms)")
+    if regresiones:
+        return 1
+    print(f"✅ Sin regresiones (tolerancia +{args.tolerancia:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Caché columnar (Feather) de los CSV de entrada.
+
+El primer acceso convierte el CSV a un archivo Feather sin comprimir con tipos
+ya resueltos y lo guarda junto con la huella del archivo fuente (SHA-256, mtime
+y tamaño). Los arranques siguientes leen el Feather con memory-map en lugar de
+volver a interpretar el texto. Si el CSV cambia, la caché se reconstruye
+automáticamente.
+
+Los tipos se definen con un esquema columna -> tipo (`ESQUEMA_COMUNIDADES`):
+categorías para columnas repetitivas, booleanos para SI/NO, enteros de 32 bits
+para los códigos DANE, float32 para conteos y kWp y cadenas Arrow para nombres.
+Con `columnas` solo se materializan las columnas pedidas y con `filas` solo las
+primeras filas.
+
+Uso como paso de construcción:
+    python cache_columnar.py [archivo.csv ...] [--memoria]
+"""
+import argparse
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from config_original import DATA_FILES, ESQUEMA_COMUNIDADES
+
+DIRECTORIO_CACHE = '.cache_datos'
+
+# Versión del formato; cambiarla invalida todas las cachés existentes
+VERSION_CACHE = 2
+
+VALORES_BOOLEANOS = {'SI': True, 'SÍ': True, 'NO': False}
+
+
+def huella_archivo(ruta, tamano_bloque=1 << 20):
+    """SHA-256 del contenido de un archivo"""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(tamano_bloque), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _rutas_cache(ruta_csv, directorio):
+    nombre = os.path.splitext(os.path.basename(ruta_csv))[0]
+    base = os.path.join(directorio, nombre)
+    return f"{base}.feather", f"{base}.json"
+
+
+def _escribir_atomico(ruta, escribir):
+    temporal = f"{ruta}.tmp{os.getpid()}"
+    escribir(temporal)
+    os.replace(temporal, ruta)
+
+
+def _convertir(serie, tipo):
+    if tipo == 'categoria':
+        return serie.astype('category')
+    if tipo == 'booleano':
+        if pd.api.types.is_bool_dtype(serie):
+            return serie.astype('boolean')
+        return serie.astype(str).str.strip().str.upper().map(VALORES_BOOLEANOS).astype('boolean')
+    if tipo == 'texto':
+        return serie.astype(pd.StringDtype('pyarrow'))
+    numerica = pd.to_numeric(serie, errors='coerce')
+    if tipo == 'int32':
+        # Entero con nulos: tipo anulable en lugar de volver a float
+        return numerica.astype('Int32' if numerica.hasnans else np.int32)
+    if tipo in ('float32', 'float64'):
+        return numerica.astype(tipo)
+    raise ValueError(f"Tipo de columna no soportado: {tipo}")
+
+
+def aplicar_esquema(df, esquema=None, categoricas=None):
+    """Convierte las columnas presentes en `df` a los tipos del esquema (o a categorías)"""
+    tipos = {columna: 'categoria' for columna in categoricas or []}
+    tipos.update(esquema or {})
+    for columna, tipo in tipos.items():
+        if columna in df.columns:
+            df[columna] = _convertir(df[columna], tipo)
+    return df
+
+
+def _tipos_arrow(tipo):
+    """Cadenas Arrow como `string[pyarrow]` (sin objetos Python por fila)"""
+    import pyarrow as pa
+    if tipo in (pa.string(), pa.large_string()):
+        return pd.StringDtype('pyarrow')
+    return None
+
+
+def construir_cache(ruta_csv, categoricas=None, directorio=DIRECTORIO_CACHE, esquema=None):
+    """Lee el CSV, aplica los tipos y escribe el Feather y sus metadatos. Retorna el DataFrame"""
+    estado = os.stat(ruta_csv)
+    df = aplicar_esquema(pd.read_csv(ruta_csv), esquema, categoricas)
+
+    os.makedirs(directorio, exist_ok=True)
+    ruta_feather, ruta_meta = _rutas_cache(ruta_csv, directorio)
+    metadatos = {
+        'version': VERSION_CACHE,
+        'fuente': os.path.abspath(ruta_csv),
+        'sha256': huella_archivo(ruta_csv),
+        'mtime_ns': estado.st_mtime_ns,
+        'tamano': estado.st_size,
+        'categoricas': list(categoricas or []),
+        'esquema': dict(esquema or {}),
+        'filas': len(df)
+    }
+    # Sin compresión para poder leerlo con memory-map
+    _escribir_atomico(ruta_feather, lambda r: df.to_feather(r, compression='uncompressed'))
+    _escribir_atomico(ruta_meta, lambda r: _guardar_json(metadatos, r))
+    return df
+
+
+def _guardar_json(datos, ruta):
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo, ensure_ascii=False, indent=2)
+
+
+def cache_vigente(ruta_csv, categoricas=None, directorio=DIRECTORIO_CACHE, esquema=None):
+    """
+    Indica si la caché corresponde al CSV actual. Si solo cambió el mtime
+    (p. ej. una copia) pero el contenido es el mismo, se actualizan los metadatos.
+    """
+    ruta_feather, ruta_meta = _rutas_cache(ruta_csv, directorio)
+    if not (os.path.exists(ruta_feather) and os.path.exists(ruta_meta)):
+        return False
+    try:
+        with open(ruta_meta, encoding='utf-8') as archivo:
+            metadatos = json.load(archivo)
+    except (OSError, ValueError):
+        return False
+
+    if (metadatos.get('version') != VERSION_CACHE or metadatos.get('categoricas') != list(categoricas or [])
+            or metadatos.get('esquema') != dict(esquema or {})):
+        return False
+
+    estado = os.stat(ruta_csv)
+    if metadatos.get('mtime_ns') == estado.st_mtime_ns and metadatos.get('tamano') == estado.st_size:
+        return True
+
+    if metadatos.get('tamano') != estado.st_size or metadatos.get('sha256') != huella_archivo(ruta_csv):
+        return False
+
+    metadatos['mtime_ns'] = estado.st_mtime_ns
+    try:
+        _escribir_atomico(ruta_meta, lambda r: _guardar_json(metadatos, r))
+    except OSError:
+        pass
+    return True
+
+
+def leer_csv_cacheado(ruta_csv, categoricas=None, directorio=DIRECTORIO_CACHE, esquema=None, columnas=None,
+                      filas=None):
+    """
+    Retorna el contenido del CSV usando la caché columnar cuando está vigente.
+    Con `columnas` solo se leen esas columnas (en ese orden) y con `filas` solo
+    las primeras `filas` filas (sobre el memory-map, sin leer el resto).
+    Sin pyarrow disponible (o si la caché no se puede escribir) se lee el CSV directamente.
+    """
+    columnas = list(columnas) if columnas is not None else None
+    try:
+        if cache_vigente(ruta_csv, categoricas, directorio, esquema):
+            from pyarrow import feather
+            ruta_feather, _ = _rutas_cache(ruta_csv, directorio)
+            tabla = feather.read_table(ruta_feather, columns=columnas, memory_map=True)
+            if filas is not None:
+                tabla = tabla.slice(0, filas)
+            return tabla.to_pandas(types_mapper=_tipos_arrow)
+        df = construir_cache(ruta_csv, categoricas, directorio, esquema)
+    except (ImportError, OSError):
+        df = pd.read_csv(ruta_csv, usecols=columnas, nrows=filas)
+        if esquema:
+            # Las cadenas Arrow requieren pyarrow: sin él los nombres quedan como objetos
+            esquema = {c: t for c, t in esquema.items() if t != 'texto'}
+        df = aplicar_esquema(df, esquema, categoricas)
+    df = df if columnas is None else df[columnas]
+    return df if filas is None else df.head(filas)
+
+
+def filas_csv_cacheado(ruta_csv, categoricas=None, directorio=DIRECTORIO_CACHE, esquema=None):
+    """
+    Número de filas del CSV tomado de los metadatos de la caché, sin leer los
+    datos. Si la caché no está vigente se construye (una vez por cambio del CSV).
+    """
+    try:
+        if cache_vigente(ruta_csv, categoricas, directorio, esquema):
+            _, ruta_meta = _rutas_cache(ruta_csv, directorio)
+            with open(ruta_meta, encoding='utf-8') as archivo:
+                return int(json.load(archivo)['filas'])
+        return len(construir_cache(ruta_csv, categoricas, directorio, esquema))
+    except (ImportError, OSError, KeyError, ValueError):
+        return len(pd.read_csv(ruta_csv, usecols=[0]))
+
+
+def reporte_memoria(original, compacto):
+    """Memoria por columna (MB) del DataFrame con tipos por defecto y con el esquema compacto"""
+    antes = original.memory_usage(deep=True, index=False)
+    despues = compacto.memory_usage(deep=True, index=False).reindex(antes.index)
+    reporte = pd.DataFrame({
+        'Tipo_Original': original.dtypes.astype(str),
+        'Tipo_Compacto': compacto.dtypes.reindex(antes.index).astype(str),
+        'MB_Original': antes / 1e6,
+        'MB_Compacto': despues / 1e6,
+    })
+    reporte.loc['TOTAL'] = ['', '', antes.sum() / 1e6, despues.sum() / 1e6]
+    reporte['Reduccion'] = reporte['MB_Original'] / reporte['MB_Compacto']
+    return reporte.round(3)
+
+
+def _esquema_de(ruta):
+    return ESQUEMA_COMUNIDADES if ruta == DATA_FILES['comunidades'] else None
+
+
+def parsear_argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="Caché columnar (Feather) de los CSV de entrada")
+    parser.add_argument('archivos', nargs='*', default=[DATA_FILES['comunidades']])
+    parser.add_argument('--memoria', action='store_true',
+                        help="Muestra la memoria por columna con tipos por defecto y compactos")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Construye (o refresca) la caché de los archivos indicados"""
+    args = parsear_argumentos(argv)
+    for ruta in args.archivos:
+        esquema = _esquema_de(ruta)
+        if cache_vigente(ruta, esquema=esquema):
+            print(f"✅ Caché vigente: {ruta}")
+        else:
+            df = construir_cache(ruta, esquema=esquema)
+            print(f"💾 Caché construida: {ruta} ({len(df)} filas)")
+        if args.memoria:
+            reporte = reporte_memoria(pd.read_csv(ruta), leer_csv_cacheado(ruta, esquema=esquema))
+            print(reporte.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Caché en disco, compartida entre procesos, para los artefactos derivados del dashboard.
+
+`st.cache_data` vive en la memoria de cada proceso: con varias réplicas de
+Streamlit cada una reconstruía los mismos mapas, figuras y exportaciones. Aquí
+los artefactos se guardan en `.cache_datos/artefactos/`:
+- `indice.sqlite` asocia cada clave (espacio + versión de los datos +
+  parámetros) con la huella SHA-256 del contenido y la fecha del último acceso
+- `blobs/<aa>/<huella>.<ext>` guarda cada contenido una sola vez (direccionado
+  por contenido): dos claves con el mismo resultado comparten el archivo
+- al superar `tamano_maximo` se eliminan las entradas menos usadas recientemente (LRU)
+
+SQLite en modo WAL coordina a los lectores y escritores de distintos procesos;
+los blobs se escriben en un temporal y se mueven con `os.replace`, así que un
+lector nunca ve un archivo a medio escribir. Si dos réplicas generan a la vez el
+mismo artefacto, ambas escriben el mismo contenido y queda uno solo. Las
+consultas retornan el archivo ya abierto: si otro proceso lo desaloja después,
+el contenido sigue disponible para quien lo abrió; si lo desalojó antes, la
+consulta cuenta como fallo y el artefacto se vuelve a generar.
+
+Formatos de serialización:
+- "plotly": figura como JSON (`fig.to_json` / `plotly.io.from_json`)
+- "folium": el objeto `folium.Map` con pickle, porque `st_folium` necesita el
+  mapa y no su HTML (el HTML renderizado se puede guardar con "html").
+  Deserializar un pickle ejecuta código, así que quien pueda escribir en la
+  caché podría ejecutar código en el dashboard: el directorio debe ser privado
+  del usuario del dashboard (se crea con permisos 0o700). Antes de leer un pickle
+  se comprueba que el directorio, `blobs/` y el archivo sean del usuario actual y
+  que nadie más pueda escribirlos; si no, ese formato no usa la caché.
+- "html" / "bytes": texto o bytes tal cual
+Las versiones instaladas de las bibliotecas de cada formato forman parte de la
+clave: un pickle de folium o un JSON de plotly solo se leen con las mismas
+versiones que los generaron, aunque la caché se comparta entre entornos.
+"""
+import functools
+import hashlib
+import importlib.metadata
+import inspect
+import json
+import os
+import pickle
+import sqlite3
+import time
+import uuid
+import pandas as pd
+from cache_columnar import DIRECTORIO_CACHE
+
+DIRECTORIO_ARTEFACTOS = os.path.join(DIRECTORIO_CACHE, 'artefactos')
+ARCHIVO_INDICE = 'indice.sqlite'
+VARIABLE_TAMANO = 'CACHE_ARTEFACTOS_MB'
+TAMANO_MAXIMO_MB = 1024
+FORMATO_CACHE = 3
+PERMISOS_DIRECTORIO = 0o700
+
+ESQUEMA_INDICE = """
+CREATE TABLE IF NOT EXISTS entradas (
+    clave TEXT PRIMARY KEY,
+    huella TEXT NOT NULL,
+    extension TEXT NOT NULL,
+    tamano INTEGER NOT NULL,
+    espacio TEXT NOT NULL,
+    creado REAL NOT NULL,
+    acceso REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entradas_acceso ON entradas (acceso);
+CREATE INDEX IF NOT EXISTS entradas_huella ON entradas (huella);
+"""
+
+_TIPOS_SIMPLES = (str, int, float, bool, type(None))
+
+
+def _valor_clave(valor):
+    """Representación estable de un parámetro para la clave"""
+    if isinstance(valor, _TIPOS_SIMPLES):
+        return valor
+    if isinstance(valor, (list, tuple)):
+        return [_valor_clave(elemento) for elemento in valor]
+    if isinstance(valor, dict):
+        return {str(k): _valor_clave(v) for k, v in sorted(valor.items())}
+    if isinstance(valor, pd.DataFrame):
+        from exportacion import version_dataframe
+        return version_dataframe(valor)
+    # Objetos derivados de los datos (pirámides, índices): los cubre la versión
+    return f"<{type(valor).__name__}>"
+
+
+@functools.lru_cache(maxsize=None)
+def versiones_bibliotecas(paquetes):
+    """Versión instalada de cada paquete (None si no está instalado)"""
+    versiones = {}
+    for paquete in paquetes:
+        try:
+            versiones[paquete] = importlib.metadata.version(paquete)
+        except importlib.metadata.PackageNotFoundError:
+            versiones[paquete] = None
+    return versiones
+
+
+def clave_artefacto(espacio, version, parametros=None, bibliotecas=()):
+    """
+    Clave de un artefacto: espacio + versión de los datos + parámetros + versiones
+    de las `bibliotecas` de las que depende su serialización
+    """
+    contenido = json.dumps(
+        [FORMATO_CACHE, espacio, _valor_clave(version), _valor_clave(parametros or {}),
+         versiones_bibliotecas(tuple(bibliotecas))],
+        sort_keys=True, default=repr
+    )
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def _es_privado(estado):
+    """Del usuario actual y sin escritura para el grupo ni para otros (siempre True fuera de POSIX)"""
+    if not hasattr(os, 'geteuid'):
+        return True
+    return estado.st_uid == os.geteuid() and not estado.st_mode & 0o022
+
+
+def _huella_archivo(ruta, tamano_bloque=1 << 20):
+    huella = hashlib.sha256()
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(tamano_bloque), b''):
+            huella.update(bloque)
+    return huella.hexdigest()
+
+
+class CacheArtefactos:
+    """Índice SQLite + blobs direccionados por contenido, con desalojo LRU por tamaño"""
+
+    def __init__(self, directorio=DIRECTORIO_ARTEFACTOS, tamano_maximo=None):
+        self.directorio = directorio
+        if tamano_maximo is None:
+            tamano_maximo = int(float(os.environ.get(VARIABLE_TAMANO, TAMANO_MAXIMO_MB)) * 1024 ** 2)
+        self.tamano_maximo = tamano_maximo
+
+    def _conectar(self):
+        self._crear_directorio()
+        conexion = sqlite3.connect(os.path.join(self.directorio, ARCHIVO_INDICE),
+                                   timeout=30, isolation_level=None)
+        conexion.execute('PRAGMA journal_mode=WAL')
+        conexion.executescript(ESQUEMA_INDICE)
+        return conexion
+
+    def _ruta_blob(self, huella, extension):
+        return os.path.join(self.directorio, 'blobs', huella[:2], f"{huella}.{extension}")
+
+    def _crear_directorio(self, *partes):
+        ruta = self.directorio
+        for parte in ('',) + partes:
+            ruta = os.path.join(ruta, parte) if parte else ruta
+            os.makedirs(ruta, mode=PERMISOS_DIRECTORIO, exist_ok=True)
+        return ruta
+
+    def es_privado(self):
+        """True si el directorio de la caché y `blobs/` son del usuario actual y solo él puede escribirlos"""
+        try:
+            blobs = self._crear_directorio('blobs')
+            return _es_privado(os.stat(self.directorio)) and _es_privado(os.stat(blobs))
+        except OSError:
+            return False
+
+    def abrir(self, clave, solo_privado=False):
+        """
+        Archivo del artefacto `clave` abierto en modo binario (None si no está);
+        registra el acceso. El llamador lo cierra. Con `solo_privado` un archivo
+        que otro usuario pudo escribir cuenta como fallo (p. ej. antes de un pickle).
+        """
+        conexion = self._conectar()
+        try:
+            fila = conexion.execute(
+                'SELECT huella, extension FROM entradas WHERE clave = ?', (clave,)
+            ).fetchone()
+            if fila is None:
+                return None
+            try:
+                archivo = open(self._ruta_blob(*fila), 'rb')
+            except FileNotFoundError:
+                # Desalojado por otro proceso (o borrado por fuera del índice): es un fallo
+                conexion.execute('DELETE FROM entradas WHERE clave = ? AND huella = ?', (clave, fila[0]))
+                return None
+            if solo_privado and not (_es_privado(os.fstat(archivo.fileno())) and _es_privado(
+                    os.stat(os.path.dirname(self._ruta_blob(*fila))))):
+                archivo.close()
+                return None
+            conexion.execute('UPDATE entradas SET acceso = ? WHERE clave = ?', (time.time(), clave))
+            return archivo
+        finally:
+            conexion.close()
+
+    def leer(self, clave, solo_privado=False):
+        """Contenido del artefacto `clave` (None si no está)"""
+        archivo = self.abrir(clave, solo_privado)
+        if archivo is None:
+            return None
+        with archivo:
+            return archivo.read()
+
+    def guardar_archivo(self, clave, escribir, extension, espacio=''):
+        """
+        Genera el artefacto con `escribir(ruta_temporal)`, lo guarda por su huella
+        y asocia `clave` a él. Retorna el archivo guardado abierto en modo binario
+        (abierto antes de publicarlo, así que un desalojo no lo afecta).
+        """
+        temporales = self._crear_directorio('tmp')
+        temporal = os.path.join(temporales, f"{uuid.uuid4().hex}.{extension}")
+        archivo = None
+        try:
+            escribir(temporal)
+            huella = _huella_archivo(temporal)
+            tamano = os.path.getsize(temporal)
+            archivo = open(temporal, 'rb')
+            ruta = self._ruta_blob(huella, extension)
+            self._crear_directorio('blobs', huella[:2])
+            os.replace(temporal, ruta)
+        except BaseException:
+            if archivo is not None:
+                archivo.close()
+            raise
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+
+        conexion = self._conectar()
+        try:
+            ahora = time.time()
+            conexion.execute(
+                'INSERT OR REPLACE INTO entradas (clave, huella, extension, tamano, espacio, creado, acceso) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (clave, huella, extension, tamano, espacio, ahora, ahora)
+            )
+            self._desalojar(conexion, conservar=clave)
+        finally:
+            conexion.close()
+        return archivo
+
+    def guardar_bytes(self, clave, datos, extension, espacio=''):
+        def escribir(ruta):
+            with open(ruta, 'wb') as archivo:
+                archivo.write(datos)
+
+        self.guardar_archivo(clave, escribir, extension, espacio).close()
+
+    def obtener_archivo(self, espacio, version, parametros, escribir, extension):
+        """
+        Archivo del artefacto abierto en modo binario, generándolo con
+        `escribir(ruta)` solo si no está en caché. El llamador lo cierra.
+        """
+        clave = clave_artefacto(espacio, version, parametros)
+        archivo = self.abrir(clave)
+        if archivo is None:
+            archivo = self.guardar_archivo(clave, escribir, extension, espacio)
+        return archivo
+
+    def obtener_bytes(self, espacio, version, parametros, crear, extension='bin'):
+        """Contenido del artefacto; `crear()` retorna los bytes si no está en caché"""
+        def escribir(ruta):
+            with open(ruta, 'wb') as archivo:
+                archivo.write(crear())
+
+        with self.obtener_archivo(espacio, version, parametros, escribir, extension) as archivo:
+            return archivo.read()
+
+    def _desalojar(self, conexion, conservar=None):
+        """Elimina las entradas menos usadas hasta que los blobs quepan en `tamano_maximo`"""
+        total = self._tamano_blobs(conexion)
+        if total <= self.tamano_maximo:
+            return
+        filas = conexion.execute(
+            'SELECT clave, huella, extension, tamano FROM entradas ORDER BY acceso'
+        ).fetchall()
+        for clave, huella, extension, tamano in filas:
+            if total <= self.tamano_maximo:
+                break
+            if clave == conservar:
+                continue
+            conexion.execute('DELETE FROM entradas WHERE clave = ?', (clave,))
+            compartido = conexion.execute(
+                'SELECT 1 FROM entradas WHERE huella = ? LIMIT 1', (huella,)
+            ).fetchone()
+            if compartido is None:
+                try:
+                    os.remove(self._ruta_blob(huella, extension))
+                except OSError:
+                    pass
+                total -= tamano
+
+    @staticmethod
+    def _tamano_blobs(conexion):
+        fila = conexion.execute(
+            'SELECT COALESCE(SUM(tamano), 0) FROM (SELECT DISTINCT huella, tamano FROM entradas)'
+        ).fetchone()
+        return int(fila[0])
+
+    def estadisticas(self):
+        """Entradas, blobs y bytes ocupados por espacio"""
+        conexion = self._conectar()
+        try:
+            filas = conexion.execute(
+                'SELECT espacio, COUNT(*), COUNT(DISTINCT huella), SUM(tamano) FROM entradas GROUP BY espacio'
+            ).fetchall()
+            return {
+                'espacios': {espacio: {'entradas': entradas, 'blobs': blobs, 'bytes': int(tamano)}
+                             for espacio, entradas, blobs, tamano in filas},
+                'bytes': self._tamano_blobs(conexion),
+                'tamano_maximo': self.tamano_maximo,
+            }
+        finally:
+            conexion.close()
+
+    def vaciar(self):
+        """Elimina todas las entradas y blobs"""
+        conexion = self._conectar()
+        try:
+            for huella, extension in conexion.execute('SELECT DISTINCT huella, extension FROM entradas').fetchall():
+                try:
+                    os.remove(self._ruta_blob(huella, extension))
+                except OSError:
+                    pass
+            conexion.execute('DELETE FROM entradas')
+        finally:
+            conexion.close()
+
+
+@functools.lru_cache(maxsize=None)
+def cache_artefactos(directorio=DIRECTORIO_ARTEFACTOS):
+    """Instancia compartida por el proceso (el índice coordina entre procesos)"""
+    return CacheArtefactos(directorio)
+
+
+def _serializar_plotly(figura):
+    return figura.to_json().encode('utf-8')
+
+
+def _deserializar_plotly(datos):
+    import plotly.io as pio
+    return pio.from_json(datos.decode('utf-8'))
+
+
+# formato -> (extensión, serializar, deserializar, bibliotecas que entran en la clave)
+# Los formatos de FORMATOS_PICKLE solo se leen de una caché privada (ver arriba)
+FORMATOS_PICKLE = {'folium'}
+SERIALIZADORES = {
+    'plotly': ('json', _serializar_plotly, _deserializar_plotly, ('plotly',)),
+    'folium': ('pkl', functools.partial(pickle.dumps, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads,
+               ('folium', 'branca', 'jinja2')),
+    'html': ('html', lambda texto: texto.encode('utf-8'), lambda datos: datos.decode('utf-8'), ()),
+    'bytes': ('bin', bytes, bytes, ()),
+}
+
+
+def artefacto_en_disco(espacio, formato):
+    """
+    Decorador: guarda el resultado de la función en la caché de artefactos.
+
+    La clave es `espacio` + el argumento `version` de la función (la versión de
+    los datos) + los demás argumentos. Los DataFrame se representan por una
+    huella de su contenido solo si no se pasa `version`; los demás objetos
+    derivados de los datos (p. ej. pirámides) quedan cubiertos por la versión.
+    Los formatos con pickle se calculan sin caché si el directorio no es privado.
+    """
+    extension, serializar, deserializar, bibliotecas = SERIALIZADORES[formato]
+    usa_pickle = formato in FORMATOS_PICKLE
+
+    def decorador(funcion):
+        firma = inspect.signature(funcion)
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            argumentos = firma.bind(*args, **kwargs)
+            argumentos.apply_defaults()
+            parametros = dict(argumentos.arguments)
+            version = parametros.pop('version', None)
+            if version is not None:
+                parametros = {nombre: valor for nombre, valor in parametros.items()
+                              if not isinstance(valor, pd.DataFrame)}
+            cache = cache_artefactos()
+            if usa_pickle and not cache.es_privado():
+                return funcion(*args, **kwargs)
+            clave = clave_artefacto(espacio, version, parametros, bibliotecas)
+            datos = cache.leer(clave, solo_privado=usa_pickle)
+            if datos is not None:
+                return deserializar(datos)
+
+            resultado = funcion(*args, **kwargs)
+            cache.guardar_bytes(clave, serializar(resultado), extension, espacio)
+            return resultado
+        return envoltura
+    return decorador
@@ -0,0 +1,244 @@
+"""
+Capas de mapa para el conjunto completo de comunidades energéticas.
+
+Los textos emergentes se arman por columnas completas (`formatear_filas`) o,
+en Plotly, en el navegador a partir de `customdata` + `hovertemplate`
+(`traza_mapa`), sin recorrer las filas con `iterrows()`.
+
+En lugar de crear un `folium.CircleMarker` por fila (HTML enorme), las
+comunidades se envían como un único arreglo a `FastMarkerCluster`, que crea los
+marcadores en el navegador. Opcionalmente solo se envían las comunidades
+dentro de la vista actual del mapa (límites devueltos por `st_folium`), o
+burbujas agregadas por zoom (ver `piramide_agregacion`): en ese modo el mapa
+solo lleva las celdas de la pirámide y los puntos individuales se envían por
+vista al acercarse.
+"""
+from string import Formatter
+import folium
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from branca.element import MacroElement
+from folium.plugins import FastMarkerCluster
+from jinja2 import Template
+
+# Rango de coordenadas válido para Colombia (lat_min, lat_max, lon_min, lon_max)
+LIMITES_COLOMBIA = (-5.0, 15.0, -85.0, -65.0)
+
+# Columnas de las comunidades que usan las capas, la pirámide y la evaluación de sitios
+COLUMNAS_COMUNIDADES_MAPA = ['ID', 'x', 'y', 'Nombre de la comunidad', 'Municipio', 'Departamento',
+                             'Potencia Estimada kWp', 'Inversión Estimada']
+
+OPCIONES_CLUSTER = {'maxClusterRadius': 40, 'spiderfyOnMaxZoom': True, 'chunkedLoading': True}
+
+# Se ejecuta en el navegador para cada fila [lat, lon, id, nombre, municipio, potencia]
+CALLBACK_COMUNIDAD = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: 4, color: '#00D9FF', fillColor: '#00D9FF', fillOpacity: 0.7, weight: 2
+    });
+    marker.bindTooltip('CE ' + row[2]);
+    marker.bindPopup(
+        '<div style="font-family: Arial; max-width: 180px; padding: 6px;">' +
+        '<b style="color: #00D9FF;">⚡ CE ' + row[2] + '</b><br>' +
+        row[3] + '...<br>📍 ' + row[4] + '<br>⚡ ' + row[5] + ' kWp</div>',
+        {maxWidth: 200}
+    );
+    return marker;
+}
+"""
+
+
+def mascara_colombia(lat, lon):
+    """Máscara vectorizada de coordenadas no nulas dentro de Colombia"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    lat_min, lat_max, lon_min, lon_max = LIMITES_COLOMBIA
+    return (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+
+
+def comunidades_en_colombia(comunidades_df):
+    """Comunidades con coordenadas válidas dentro de Colombia"""
+    return comunidades_df[mascara_colombia(comunidades_df['y'], comunidades_df['x'])]
+
+
+def _partes_plantilla(plantilla):
+    """Pares (texto_literal, columna) de una plantilla estilo str.format"""
+    return [(literal, campo) for literal, campo, _, _ in Formatter().parse(plantilla)]
+
+
+def _columna_texto(df, columna, recortes=None):
+    texto = df[columna].astype(str)
+    if recortes and columna in recortes:
+        texto = texto.str[:recortes[columna]]
+    return texto
+
+
+def formatear_filas(df, plantilla, recortes=None):
+    """
+    Equivale a `[plantilla.format(**fila) for _, fila in df.iterrows()]` pero
+    concatenando columnas completas. `recortes` limita el largo de algunas
+    columnas ({columna: caracteres}).
+    """
+    resultado = pd.Series('', index=df.index, dtype=object)
+    for literal, columna in _partes_plantilla(plantilla):
+        resultado = resultado + literal
+        if columna is not None:
+            resultado = resultado + _columna_texto(df, columna, recortes)
+    return resultado
+
+
+def traza_mapa(df, nombre, plantilla, lat='y', lon='x', marker=None, recortes=None, sufijo=''):
+    """
+    Scattermapbox (WebGL) con los puntos dentro de Colombia. El texto emergente
+    no se arma por fila: las columnas de la plantilla viajan como `customdata` y
+    el navegador las combina con un único `hovertemplate`. `sufijo` se agrega
+    tal cual al hovertemplate (p. ej. '<br>Lat: %{lat}').
+    """
+    validas = df[mascara_colombia(df[lat], df[lon])]
+    partes = _partes_plantilla(plantilla)
+    columnas = list(dict.fromkeys(columna for _, columna in partes if columna is not None))
+    hovertemplate = ''.join(
+        literal + (f"%{{customdata[{columnas.index(columna)}]}}" if columna is not None else '')
+        for literal, columna in partes
+    )
+    customdata = (
+        np.column_stack([_columna_texto(validas, columna, recortes).to_numpy() for columna in columnas])
+        if columnas else None
+    )
+    return go.Scattermapbox(
+        lat=validas[lat],
+        lon=validas[lon],
+        mode='markers',
+        marker=marker or {},
+        customdata=customdata,
+        name=nombre,
+        hovertemplate=f"{hovertemplate}{sufijo}<extra></extra>"
+    )
+
+
+def filtrar_por_limites(comunidades_df, limites, margen=0.1):
+    """
+    Comunidades dentro de los límites de la vista (formato `bounds` de st_folium),
+    ampliados en `margen` (fracción del alto/ancho) para que un desplazamiento
+    pequeño no deje zonas vacías. Sin límites se retorna el DataFrame completo.
+    """
+    if not limites or not limites.get('_southWest') or not limites.get('_northEast'):
+        return comunidades_df
+    sur, oeste = limites['_southWest']['lat'], limites['_southWest']['lng']
+    norte, este = limites['_northEast']['lat'], limites['_northEast']['lng']
+    if None in (sur, oeste, norte, este):
+        return comunidades_df
+
+    alto, ancho = (norte - sur) * margen, (este - oeste) * margen
+    lat = comunidades_df['y'].to_numpy(dtype=np.float64)
+    lon = comunidades_df['x'].to_numpy(dtype=np.float64)
+    dentro = ((lat >= sur - alto) & (lat <= norte + alto)
+              & (lon >= oeste - ancho) & (lon <= este + ancho))
+    return comunidades_df[dentro]
+
+
+def datos_comunidades(comunidades_df):
+    """Filas [lat, lon, id, nombre, municipio, potencia] construidas por columnas"""
+    return list(zip(
+        comunidades_df['y'].astype(float).tolist(),
+        comunidades_df['x'].astype(float).tolist(),
+        comunidades_df['ID'].astype(str).tolist(),
+        comunidades_df['Nombre de la comunidad'].astype(str).str[:30].tolist(),
+        comunidades_df['Municipio'].astype(str).tolist(),
+        comunidades_df['Potencia Estimada kWp'].astype(str).tolist()
+    ))
+
+
+def capa_comunidades(comunidades_df, nombre='⚡ Comunidades Energéticas'):
+    """Capa agrupada con todas las comunidades válidas del DataFrame"""
+    return FastMarkerCluster(
+        datos_comunidades(comunidades_en_colombia(comunidades_df)),
+        callback=CALLBACK_COMUNIDAD,
+        options=OPCIONES_CLUSTER,
+        name=nombre
+    )
+
+
+def grupo_comunidades_vista(comunidades_df, limites, nombre='⚡ Comunidades Energéticas'):
+    """
+    FeatureGroup con las comunidades de la vista actual, para `feature_group_to_add`
+    de st_folium: al desplazar el mapa solo se reemplaza esta capa.
+    Retorna (grupo, cantidad_de_comunidades).
+    """
+    visibles = filtrar_por_limites(comunidades_en_colombia(comunidades_df), limites)
+    grupo = folium.FeatureGroup(name=nombre)
+    capa_comunidades(visibles, nombre).add_to(grupo)
+    return grupo, len(visibles)
+
+
+class CapaPiramide(MacroElement):
+    """
+    Burbujas agregadas por celda mientras el zoom sea <= `zoom_puntos`; al acercarse
+    se ocultan (los puntos individuales de la vista llegan como capa dinámica, ver
+    `grupo_comunidades_vista`). Los niveles viajan una sola vez como JSON y el
+    cambio se hace en el navegador en cada 'zoomend'.
+    """
+    _template = Template("""
+    {% macro script(this, kwargs) %}
+    (function () {
+        var mapa = {{ this._parent.get_name() }};
+        var niveles = {{ this.niveles|tojson }};
+        var zoomMin = {{ this.zoom_min }}, zoomPuntos = {{ this.zoom_puntos }};
+        var burbujas = L.layerGroup().addTo(mapa);
+        function dibujar() {
+            var zoom = mapa.getZoom();
+            burbujas.clearLayers();
+            if (zoom > zoomPuntos) { return; }
+            var celdas = niveles[String(Math.max(zoom, zoomMin))];
+            for (var i = 0; i < celdas.length; i++) {
+                var c = celdas[i];
+                L.circleMarker([c[0], c[1]], {
+                    radius: Math.min(30, 4 + 2 * Math.sqrt(c[2])),
+                    color: '#00D9FF', fillColor: '#00D9FF', fillOpacity: 0.5, weight: 1
+                }).bindTooltip(
+                    c[2] + ' comunidades<br>⚡ ' + c[3].toLocaleString() + ' kWp<br>💰 $' +
+                    c[4].toLocaleString()
+                ).addTo(burbujas);
+            }
+        }
+        mapa.on('zoomend', dibujar);
+        dibujar();
+    })();
+    {% endmacro %}
+    """)
+
+    def __init__(self, piramide):
+        super().__init__()
+        self._name = 'CapaPiramide'
+        self.zoom_min = piramide.zooms[0]
+        self.zoom_puntos = piramide.zooms[-1]
+        self.niveles = {
+            str(zoom): [
+                [round(lat, 5), round(lon, 5), int(conteo), round(potencia, 1), round(inversion)]
+                for lat, lon, conteo, potencia, inversion in celdas.tolist()
+            ]
+            for zoom, celdas in piramide.niveles.items()
+        }
+
+
+def capa_comunidades_agregada(mapa, piramide):
+    """
+    Agrega al mapa las burbujas de la pirámide (zoom <= último nivel). El mapa no
+    lleva ningún punto individual: su tamaño depende del número de celdas y no
+    del de comunidades
+    """
+    CapaPiramide(piramide).add_to(mapa)
+    return mapa
+
+
+def grupo_comunidades_acercamiento(comunidades_df, limites, zoom, zoom_puntos,
+                                   nombre='⚡ Comunidades Energéticas'):
+    """
+    Capa dinámica del modo agregado: las comunidades de la vista si `zoom` supera
+    `zoom_puntos`; si no, un grupo vacío (que retira los puntos de una vista
+    anterior). Retorna (grupo, cantidad_de_comunidades).
+    """
+    if limites and zoom is not None and zoom > zoom_puntos:
+        return grupo_comunidades_vista(comunidades_df, limites, nombre)
+    return folium.FeatureGroup(name=nombre), 0
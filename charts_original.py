@@ -1,13 +1,19 @@
 """
 Módulo para crear gráficos y visualizaciones
+
+Las figuras y mapas se guardan en la caché de artefactos en disco (`cache_disco`),
+compartida entre procesos; `version` es la versión de los datos de entrada
+(sin ella la clave usa una huella del contenido de los DataFrame).
 """
 import plotly.express as px
 import plotly.graph_objects as go
 import folium
-import pandas as pd
 from config import MAP_CONFIG
+from capas_mapa import capa_comunidades, formatear_filas, traza_mapa
+from cache_disco import artefacto_en_disco
 
-def crear_grafico_distancias(estadisticas_df):
+@artefacto_en_disco("grafico_distancias", "plotly")
+def crear_grafico_distancias(estadisticas_df, version=None):
     """Crear gráfico de barras de distancias promedio"""
     fig = px.bar(
         estadisticas_df.sort_values('Distancia_Media'),
@@ -32,7 +38,8 @@ def crear_grafico_distancias(estadisticas_df):
     
     return fig
 
-def crear_histograma_distancias(resumen_detallado_df):
+@artefacto_en_disco("histograma_distancias", "plotly")
+def crear_histograma_distancias(resumen_detallado_df, version=None):
     """Crear histograma de distribución de distancias"""
     fig = px.histogram(
         resumen_detallado_df,
@@ -51,7 +58,8 @@ def crear_histograma_distancias(resumen_detallado_df):
     
     return fig
 
-def crear_mapa_principal(granjas_df, comunidades_df):
+@artefacto_en_disco("mapa_principal", "folium")
+def crear_mapa_principal(granjas_df, comunidades_df, version=None):
     """Crear mapa principal con granjas y comunidades"""
     center = MAP_CONFIG["center_colombia"]
     mapa = folium.Map(
@@ -60,71 +68,48 @@ def crear_mapa_principal(granjas_df, comunidades_df):
         tiles='OpenStreetMap'
     )
     
-    # Agregar granjas
-    for _, granja in granjas_df.iterrows():
+    # Agregar granjas (popups armados por columnas)
+    popups = formatear_filas(granjas_df, """
+            <b>Granja {Item}</b><br>
+            📍 {Municipio}, {Departamento}<br>
+            ⚡ {Potencia  KW} kW<br>
+            👥 {Beneficiarios} beneficiarios
+            """)
+    tooltips = formatear_filas(granjas_df, "Granja {Item} - {Municipio}")
+    
+    for lat, lon, popup, tooltip in zip(granjas_df['Latitud'], granjas_df['Longitud'], popups, tooltips):
         folium.Marker(
-            location=[granja['Latitud'], granja['Longitud']],
-            popup=f"""
-            <b>Granja {granja['Item']}</b><br>
-            📍 {granja['Municipio']}, {granja['Departamento']}<br>
-            ⚡ {granja['Potencia  KW']} kW<br>
-            👥 {granja['Beneficiarios']} beneficiarios
-            """,
-            tooltip=f"Granja {granja['Item']} - {granja['Municipio']}",
+            location=[lat, lon],
+            popup=popup,
+            tooltip=tooltip,
             icon=folium.Icon(color='red', icon='solar-panel', prefix='fa')
         ).add_to(mapa)
     
-    # Agregar muestra de comunidades
-    sample_size = min(MAP_CONFIG["folium_sample_size"], len(comunidades_df))
-    comunidades_muestra = comunidades_df.sample(n=sample_size)
-    
-    for _, comunidad in comunidades_muestra.iterrows():
-        if pd.notna(comunidad['x']) and pd.notna(comunidad['y']):
-            folium.CircleMarker(
-                location=[comunidad['y'], comunidad['x']],
-                popup=f"""
-                <b>ID {comunidad['ID']}</b><br>
-                {comunidad['Nombre de la comunidad'][:50]}...<br>
-                📍 {comunidad['Municipio']}, {comunidad['Departamento']}<br>
-                ⚡ {comunidad['Potencia Estimada kWp']} kWp
-                """,
-                tooltip=f"CE {comunidad['ID']}",
-                radius=3,
-                color='blue',
-                fillColor='lightblue',
-                fillOpacity=0.6
-            ).add_to(mapa)
+    # Agregar todas las comunidades en una capa agrupada
+    capa_comunidades(comunidades_df).add_to(mapa)
     
     return mapa
 
-def crear_mapa_scatter(granjas_df, comunidades_df):
+@artefacto_en_disco("mapa_scatter", "plotly")
+def crear_mapa_scatter(granjas_df, comunidades_df, version=None):
     """Crear mapa scatter con Plotly"""
     fig = go.Figure()
     
     # Agregar granjas
-    fig.add_trace(go.Scattermapbox(
-        lat=granjas_df['Latitud'],
-        lon=granjas_df['Longitud'],
-        mode='markers',
+    fig.add_trace(traza_mapa(
+        granjas_df, 'Granjas Solares',
+        "<b>Granja {Item}<br>{Municipio}, {Departamento}</b>",
+        lat='Latitud', lon='Longitud',
         marker=dict(size=15, color='red', symbol='circle'),
-        text=[f"Granja {row['Item']}<br>{row['Municipio']}, {row['Departamento']}" 
-              for _, row in granjas_df.iterrows()],
-        name='Granjas Solares',
-        hovertemplate='<b>%{text}</b><br>Lat: %{lat}<br>Lon: %{lon}<extra></extra>'
+        sufijo='<br>Lat: %{lat}<br>Lon: %{lon}'
     ))
     
-    # Agregar muestra de comunidades
-    sample_size = min(MAP_CONFIG["comunidades_sample_size"], len(comunidades_df))
-    comunidades_muestra = comunidades_df.sample(n=sample_size)
-    fig.add_trace(go.Scattermapbox(
-        lat=comunidades_muestra['y'],
-        lon=comunidades_muestra['x'],
-        mode='markers',
+    # Agregar todas las comunidades
+    fig.add_trace(traza_mapa(
+        comunidades_df, 'Comunidades Energéticas',
+        "<b>ID {ID}<br>{Municipio}, {Departamento}</b>",
         marker=dict(size=6, color='blue', symbol='circle', opacity=0.6),
-        text=[f"ID {row['ID']}<br>{row['Municipio']}, {row['Departamento']}" 
-              for _, row in comunidades_muestra.iterrows()],
-        name='Comunidades Energéticas',
-        hovertemplate='<b>%{text}</b><br>Lat: %{lat}<br>Lon: %{lon}<extra></extra>'
+        sufijo='<br>Lat: %{lat}<br>Lon: %{lon}'
     ))
     
     center = MAP_CONFIG["center_colombia"]
@@ -1,6 +1,7 @@
 """
 Componentes de la interfaz de usuario
 """
+import os
 import streamlit as st
 
 def render_header():
@@ -77,28 +78,102 @@ def render_granja_info(granja_info, stats_granja):
         - **📈 Distancia Máxima**: {stats_granja['Distancia_Max']:.2f} km
         """)
 
-def render_download_buttons(dataframe, filename_base, label_prefix="Descargar"):
-    """Renderizar botones de descarga para CSV y Excel"""
-    from data_loader import to_excel
+def render_download_buttons(dataframe, filename_base, label_prefix="Descargar", version=None):
+    """
+    Renderizar botones de descarga para CSV y Excel. Los archivos se generan solo
+    al pulsar "Preparar" y quedan en disco para la versión de datos indicada
+    (sin `version` se usa una huella del contenido).
+    """
+    from exportacion import obtener_exportacion
+    from perfilado import cronometro, registrar_bytes
     
     col1, col2 = st.columns(2)
     
-    with col1:
-        st.download_button(
-            label=f"📥 {label_prefix} CSV",
-            data=dataframe.to_csv(index=False),
-            file_name=f"{filename_base}.csv",
-            mime="text/csv"
-        )
+    for columna, formato, etiqueta, icono in ((col1, "csv", "CSV", "📥"), (col2, "xlsx", "Excel", "📊")):
+        clave = f"exportar_{filename_base}_{formato}"
+        with columna:
+            if not st.session_state.get(clave):
+                if st.button(f"⚙️ Preparar {etiqueta}", key=f"{clave}_preparar"):
+                    st.session_state[clave] = True
+                    st.rerun()
+                continue
+            
+            with st.spinner(f"Generando {etiqueta}..."), cronometro(f"exportar {filename_base}.{formato}"):
+                archivo, mime = obtener_exportacion(dataframe, filename_base, formato, version)
+            with archivo:
+                registrar_bytes(f"{filename_base}.{formato}", lambda: os.fstat(archivo.fileno()).st_size)
+                st.download_button(
+                    label=f"{icono} {label_prefix} {etiqueta}",
+                    data=archivo,
+                    file_name=f"{filename_base}.{formato}",
+                    mime=mime,
+                    key=f"{clave}_descargar"
+                )
+
+def render_estadisticas_regionales(cubo, n_barras=20):
+    """Desglose por región, departamento o municipio leído del cubo de agregación"""
+    import plotly.express as px
+    from cubo_agregacion import MEDIDAS_CUBO, NIVELES_CUBO
     
+    st.markdown("### 🗺️ Desglose Regional")
+    col1, col2 = st.columns(2)
+    with col1:
+        nivel = st.selectbox("Nivel:", list(NIVELES_CUBO), index=1, key="cubo_nivel")
     with col2:
-        excel_data = to_excel(dataframe)
-        st.download_button(
-            label=f"📊 {label_prefix} Excel",
-            data=excel_data,
-            file_name=f"{filename_base}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+        medida = st.selectbox("Medida:", list(MEDIDAS_CUBO), format_func=MEDIDAS_CUBO.get, key="cubo_medida")
+    
+    tabla = cubo.nivel(nivel)
+    etiqueta = cubo.etiqueta(nivel)
+    destacados = tabla.nlargest(n_barras, medida)
+    if nivel == 'Municipio':
+        destacados = destacados.assign(Municipio=destacados['Municipio'].astype(str) + ", "
+                                       + destacados['Departamento'].astype(str))
+    fig = px.bar(
+        destacados, x=etiqueta, y=medida,
+        title=f"{MEDIDAS_CUBO[medida]} - {len(destacados)} de {len(tabla)} ({nivel.lower()})",
+        labels={medida: MEDIDAS_CUBO[medida], etiqueta: nivel},
+        height=450
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(tabla, hide_index=True, use_container_width=True)
+
+def render_panel_recalculo(gestor):
+    """
+    Panel del sidebar para recalcular el análisis en segundo plano. Mientras hay
+    un trabajo en curso el panel se refresca cada 2 s; al terminar se recarga la app.
+    """
+    en_curso = gestor.en_curso()
+    
+    @st.fragment(run_every=2 if en_curso else None)
+    def panel():
+        if en_curso and not gestor.en_curso():
+            st.rerun()
+        
+        trabajo = gestor.actual()
+        if trabajo is not None and not trabajo.terminado:
+            st.progress(trabajo.progreso, text=trabajo.mensaje)
+            st.caption(f"Trabajo {trabajo.id} · {trabajo.duracion_s:.0f} s")
+            if st.button("⏹️ Cancelar", key="recalculo_cancelar"):
+                trabajo.cancelar()
+            return
+        
+        if trabajo is not None:
+            if trabajo.estado == 'completado':
+                st.success(f"{trabajo.mensaje} ({trabajo.duracion_s:.0f} s)")
+            elif trabajo.estado == 'cancelado':
+                st.warning(trabajo.mensaje)
+            else:
+                st.error(trabajo.mensaje)
+                st.code('\n'.join(list(trabajo.registro)[-15:]))
+        
+        incremental = st.checkbox("Solo granjas afectadas (incremental)", key="recalculo_incremental")
+        if st.button("🔄 Recalcular análisis", key="recalculo_iniciar"):
+            gestor.enviar(incremental=incremental)
+            st.rerun()
+    
+    with st.sidebar.expander("🔄 Recalcular análisis", expanded=en_curso):
+        st.caption("Se siguen mostrando los datos actuales hasta que termine el cálculo.")
+        panel()
 
 def render_footer():
     """Renderizar footer del dashboard"""
@@ -16,7 +16,36 @@ DATA_FILES = {
     "granjas_original": "Base granjas.csv", 
     "comunidades": "Base comunidades energéticas.csv",
     "estadisticas": "estadisticas_distancias.csv",
-    "resumen_detallado": "resumen_detallado_proximidades.csv"
+    "resumen_detallado": "resumen_detallado_proximidades.csv",
+    "comunidades_actualizadas": "Base comunidades_actualizada.csv",
+    "matriz_distancias": "matriz_distancias",
+    "vecinos_radio": "vecinos_por_radio.csv",
+    "cobertura_radio": "cobertura_por_radio.csv",
+    "vecinos_radio_csr": "vecinos_por_radio.npz"
+}
+
+# Tipos compactos de la base de comunidades (ver cache_columnar.aplicar_esquema):
+# "categoria", "booleano" (SI/NO), "texto" (cadenas Arrow), "int32", "float32", "float64".
+# La inversión se mantiene en float64: se suma en pesos y float32 perdería precisión.
+# Las coordenadas también: con float32 (~1 m de error) el índice espacial del
+# dashboard tendría otra firma que el del análisis y habría que mantener dos.
+ESQUEMA_COMUNIDADES = {
+    "ID": "int32",
+    "Nombre de la comunidad": "texto",
+    "Priori_500": "booleano",
+    "Justifi_Prio_500": "categoria",
+    "Priori_1000": "booleano",
+    "Priorizadas": "booleano",
+    "Cod_DANE_Dep": "int32",
+    "Departamento": "categoria",
+    "Cod_DANE_Mun": "int32",
+    "Municipio": "categoria",
+    "Región geográfica": "categoria",
+    "18.¿Cúantas viviendas hay en su comunidad?": "float32",
+    "Inversión Estimada": "float64",
+    "Potencia Estimada kWp": "float32",
+    "x": "float64",
+    "y": "float64",
 }
 
 # Configuración de colores y tema
@@ -0,0 +1,145 @@
+"""
+Cubo de agregación por región para las vistas de estadísticas.
+
+Se construye una vez por versión de los datos y contiene:
+- por nivel (región, departamento, municipio): cantidad de comunidades y de
+  priorizadas, viviendas, kWp e inversión estimados, y estadísticas de la
+  distancia de cada comunidad a su granja más cercana (`proximidad_inversa`)
+- las granjas ordenadas por distancia promedio (top / bottom sin recalcular)
+- los indicadores globales del sidebar y de las métricas principales
+
+El ranking de granjas (`RankingGranjas`) solo usa las estadísticas por granja y
+se puede construir sin cargar las comunidades (vista "Explorar por Granja").
+
+Las vistas solo leen tablas ya agregadas, cuyo tamaño depende del número de
+regiones y no del número de comunidades.
+"""
+import numpy as np
+import pandas as pd
+from proximidad_inversa import granja_mas_cercana
+
+COLUMNA_VIVIENDAS = '18.¿Cúantas viviendas hay en su comunidad?'
+
+# Nivel -> columnas de agrupación (la última es la etiqueta que se muestra)
+NIVELES_CUBO = {
+    'Región': ['Región geográfica'],
+    'Departamento': ['Cod_DANE_Dep', 'Departamento'],
+    'Municipio': ['Cod_DANE_Mun', 'Departamento', 'Municipio'],
+}
+
+# Columnas de las comunidades que lee el cubo (proyección al cargar el CSV)
+COLUMNAS_CUBO = sorted(
+    {c for columnas in NIVELES_CUBO.values() for c in columnas}
+    | {'x', 'y', 'Priorizadas', COLUMNA_VIVIENDAS, 'Potencia Estimada kWp', 'Inversión Estimada'}
+)
+
+MEDIDAS_CUBO = {
+    'Comunidades': 'Comunidades',
+    'Priorizadas': 'Comunidades priorizadas',
+    'Viviendas': 'Viviendas',
+    'Potencia_kWp': 'Potencia estimada (kWp)',
+    'Inversion_Estimada': 'Inversión estimada ($)',
+    'Distancia_Granja_Media': 'Distancia media a la granja más cercana (km)',
+}
+
+
+def _columnas_base(comunidades_df, granjas_df):
+    """Columnas numéricas de las comunidades usadas por todas las agregaciones"""
+    cercana = granja_mas_cercana(comunidades_df, granjas_df)
+    base = comunidades_df[sorted({c for columnas in NIVELES_CUBO.values() for c in columnas})].copy()
+    priorizadas = comunidades_df['Priorizadas']
+    if pd.api.types.is_bool_dtype(priorizadas):
+        base['Priorizadas'] = priorizadas.fillna(False).astype(bool)
+    else:
+        base['Priorizadas'] = priorizadas.astype(str).str.strip().str.upper().eq('SI')
+    # Sumas en float64 aunque la base compacta guarde float32
+    base['Viviendas'] = pd.to_numeric(comunidades_df[COLUMNA_VIVIENDAS], errors='coerce').astype(np.float64)
+    base['Potencia_kWp'] = pd.to_numeric(comunidades_df['Potencia Estimada kWp'], errors='coerce').astype(np.float64)
+    base['Inversion_Estimada'] = pd.to_numeric(comunidades_df['Inversión Estimada'], errors='coerce').astype(np.float64)
+    base['Distancia_Granja_km'] = cercana['Distancia_Granja_km']
+    return base
+
+
+def agregar_nivel(base, columnas):
+    """Agregados de un nivel (una fila por grupo), ordenados por potencia total"""
+    tabla = base.groupby(columnas, observed=True, sort=False, dropna=False).agg(
+        Comunidades=('Priorizadas', 'size'),
+        Priorizadas=('Priorizadas', 'sum'),
+        Viviendas=('Viviendas', 'sum'),
+        Potencia_kWp=('Potencia_kWp', 'sum'),
+        Inversion_Estimada=('Inversion_Estimada', 'sum'),
+        Distancia_Granja_Min=('Distancia_Granja_km', 'min'),
+        Distancia_Granja_Media=('Distancia_Granja_km', 'mean'),
+        Distancia_Granja_Max=('Distancia_Granja_km', 'max'),
+    ).reset_index()
+    return tabla.sort_values('Potencia_kWp', ascending=False, kind='stable', ignore_index=True)
+
+
+class RankingGranjas:
+    """Granjas ordenadas por distancia promedio e indicadores de distancia globales"""
+
+    def __init__(self, estadisticas_df):
+        # Orden estable: ante empates se conserva el orden original (igual que nsmallest)
+        ordenadas = estadisticas_df.assign(_orden=np.arange(len(estadisticas_df))).sort_values(
+            'Distancia_Media', kind='stable', ignore_index=True
+        )
+        # Orden estable descendente: ante empates gana la primera fila, como nlargest
+        self._granjas_descendentes = ordenadas.sort_values(
+            ['Distancia_Media', '_orden'], ascending=[False, True], ignore_index=True
+        ).drop(columns='_orden')
+        self.granjas_ordenadas = ordenadas.drop(columns='_orden')
+
+        distancias = estadisticas_df['Distancia_Media']
+        self.indicadores = {
+            'distancia_media': float(distancias.mean()),
+            'distancia_std': float(distancias.std()),
+            'distancia_minima': float(estadisticas_df['Distancia_Min'].min()),
+        }
+
+    def mejores_granjas(self, n=5):
+        """Las n granjas con menor distancia promedio"""
+        return self.granjas_ordenadas.head(n)
+
+    def peores_granjas(self, n=5):
+        """Las n granjas con mayor distancia promedio (la mayor primero)"""
+        return self._granjas_descendentes.head(n)
+
+
+class CuboAgregacion:
+    """Agregados por región, ranking de granjas e indicadores globales"""
+
+    def __init__(self, niveles, ranking, indicadores):
+        self.niveles = niveles
+        self.ranking = ranking
+        self.indicadores = indicadores
+
+    @classmethod
+    def desde_datos(cls, granjas_df, comunidades_df, estadisticas_df):
+        base = _columnas_base(comunidades_df, granjas_df)
+        niveles = {nombre: agregar_nivel(base, columnas) for nombre, columnas in NIVELES_CUBO.items()}
+        ranking = RankingGranjas(estadisticas_df)
+        indicadores = {
+            'granjas': len(granjas_df),
+            'comunidades': len(comunidades_df),
+            **ranking.indicadores,
+            'potencia_kwp': float(np.nansum(base['Potencia_kWp'])),
+            'inversion': float(np.nansum(base['Inversion_Estimada'])),
+        }
+        return cls(niveles, ranking, indicadores)
+
+    @property
+    def granjas_ordenadas(self):
+        return self.ranking.granjas_ordenadas
+
+    def nivel(self, nombre):
+        return self.niveles[nombre]
+
+    def mejores_granjas(self, n=5):
+        return self.ranking.mejores_granjas(n)
+
+    def peores_granjas(self, n=5):
+        return self.ranking.peores_granjas(n)
+
+    def etiqueta(self, nombre):
+        """Columna con el nombre visible de cada grupo del nivel"""
+        return NIVELES_CUBO[nombre][-1]
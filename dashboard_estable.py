@@ -9,9 +9,20 @@ import plotly.express as px
 import plotly.graph_objects as go
 import folium
 from streamlit_folium import st_folium
-from folium.plugins import MarkerCluster
-from io import BytesIO
-from data_loader import to_excel
+from data_loader import (VERSION_CUBO, VERSION_RANKING, VERSION_TABLA_PRINCIPAL, DatosVista, cargar_cubo_agregacion,
+                         cargar_evaluador_sitios, cargar_gestor_trabajos, cargar_indice_granjas,
+                         cargar_matriz_distancias, cargar_piramide_comunidades, cargar_ranking_granjas,
+                         cargar_tabla_principal, version_datos, version_matriz_distancias)
+from evaluacion_sitio import K_SITIO, RADIO_SITIO_KM, coordenadas_clic
+from versiones_resultados import ruta_resultado, version_actual
+from cache_disco import artefacto_en_disco
+from cubo_agregacion import COLUMNAS_CUBO
+from components import render_download_buttons, render_estadisticas_regionales, render_panel_recalculo
+from capas_mapa import (COLUMNAS_COMUNIDADES_MAPA, capa_comunidades, capa_comunidades_agregada, formatear_filas,
+                        grupo_comunidades_acercamiento, grupo_comunidades_vista, mascara_colombia, traza_mapa)
+from piramide_agregacion import ZOOM_PUNTOS_INDIVIDUALES
+from perfilado import (cronometrar, cronometro, iniciar_rerun, marcar_ejecucion,
+                       registrar_bytes, render_panel_perfilado)
 
 
 # Configuración de la página
@@ -77,23 +88,26 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
-def cargar_datos():
-    """Cargar todos los datasets necesarios"""
-    try:
-        granjas_actualizadas = pd.read_csv('Base granjas_actualizada.csv')
-        comunidades = pd.read_csv('Base comunidades energéticas.csv')
-        estadisticas = pd.read_csv('estadisticas_distancias.csv')
-        resumen_detallado = pd.read_csv('resumen_detallado_proximidades.csv')
-        
-        return granjas_actualizadas, comunidades, estadisticas, resumen_detallado
-    except Exception as e:
-        st.error(f"Error cargando datos: {e}")
-        return None, None, None, None
+# Datasets que lee cada vista (columnas; None = todas). Se cargan al primer acceso,
+# así la vista inicial no depende del tamaño de la base de comunidades
+DATOS_COMUNES = {"granjas_actualizadas": None, "estadisticas": None}
+DATOS_VISTAS = {
+    "🔍 Explorar por Granja": {
+        **DATOS_COMUNES, "resumen_detallado": None,
+        # Solo para la tabla de la matriz de distancias
+        "comunidades": ['ID', 'Nombre de la comunidad', 'Municipio', 'Potencia Estimada kWp'],
+    },
+    "🗺️ Mapas": {**DATOS_COMUNES, "comunidades": COLUMNAS_COMUNIDADES_MAPA},
+    "📈 Estadísticas": {**DATOS_COMUNES, "comunidades": COLUMNAS_CUBO},
+    "📋 Datos": {**DATOS_COMUNES, "comunidades": None},
+}
 
+@cronometrar("crear_mapa_estable")
 @st.cache_data(ttl=3600)
-def crear_mapa_estable(_granjas_df, _comunidades_df):
-    """Crear mapa Folium ESTABLE y optimizado"""
+@marcar_ejecucion("crear_mapa_estable")
+@artefacto_en_disco("mapa_folium", "folium")
+def crear_mapa_estable(_granjas_df, _comunidades_df, modo="agregado", version=None):
+    """Crear mapa Folium ESTABLE y optimizado (`version`: clave de caché de los datos)"""
     
     # Mapa base optimizado
     mapa = folium.Map(
@@ -105,116 +119,80 @@ def crear_mapa_estable(_granjas_df, _comunidades_df):
         min_zoom=4
     )
     
-    # Agregar granjas con marcadores estables
-    for _, granja in _granjas_df.iterrows():
-        if pd.notna(granja['Latitud']) and pd.notna(granja['Longitud']):
-            lat, lon = float(granja['Latitud']), float(granja['Longitud'])
-            if -5 <= lat <= 15 and -85 <= lon <= -65:  # Validar coordenadas Colombia
-                
-                popup_html = f"""
+    # Agregar granjas con marcadores estables (popups armados por columnas)
+    granjas = _granjas_df[mascara_colombia(_granjas_df['Latitud'], _granjas_df['Longitud'])]
+    popups = formatear_filas(granjas, """
                 <div style="font-family: Arial; max-width: 200px; padding: 8px;">
-                    <b style="color: #FF6B35;">🏗️ Granja {granja['Item']}</b><br>
-                    📍 {granja['Municipio']}, {granja['Departamento']}<br>
-                    ⚡ {granja['Potencia  KW']} kW<br>
-                    👥 {granja['Beneficiarios']} beneficiarios
+                    <b style="color: #FF6B35;">🏗️ Granja {Item}</b><br>
+                    📍 {Municipio}, {Departamento}<br>
+                    ⚡ {Potencia  KW} kW<br>
+                    👥 {Beneficiarios} beneficiarios
                 </div>
-                """
-                
-                folium.Marker(
-                    location=[lat, lon],
-                    popup=folium.Popup(popup_html, max_width=220),
-                    tooltip=f"Granja {granja['Item']}",
-                    icon=folium.Icon(color='red', icon='bolt', prefix='fa')
-                ).add_to(mapa)
-    
-    # Agregar comunidades con clustering
-    cluster = MarkerCluster(
-        options={'maxClusterRadius': 40, 'spiderfyOnMaxZoom': True}
-    )
+                """)
+    tooltips = formatear_filas(granjas, "Granja {Item}")
+    
+    for lat, lon, popup_html, tooltip in zip(
+        granjas['Latitud'].astype(float), granjas['Longitud'].astype(float), popups, tooltips
+    ):
+        folium.Marker(
+            location=[lat, lon],
+            popup=folium.Popup(popup_html, max_width=220),
+            tooltip=tooltip,
+            icon=folium.Icon(color='red', icon='bolt', prefix='fa')
+        ).add_to(mapa)
     
-    # Muestra muy pequeña para máxima estabilidad
-    sample_size = min(25, len(_comunidades_df))
-    comunidades_muestra = _comunidades_df.sample(n=sample_size, random_state=42)
-    
-    for _, comunidad in comunidades_muestra.iterrows():
-        if pd.notna(comunidad['x']) and pd.notna(comunidad['y']):
-            try:
-                lat, lon = float(comunidad['y']), float(comunidad['x'])
-                if -5 <= lat <= 15 and -85 <= lon <= -65:
-                    
-                    popup_html = f"""
-                    <div style="font-family: Arial; max-width: 180px; padding: 6px;">
-                        <b style="color: #00D9FF;">⚡ CE {comunidad['ID']}</b><br>
-                        {str(comunidad['Nombre de la comunidad'])[:30]}...<br>
-                        📍 {comunidad['Municipio']}<br>
-                        ⚡ {comunidad['Potencia Estimada kWp']} kWp
-                    </div>
-                    """
-                    
-                    folium.CircleMarker(
-                        location=[lat, lon],
-                        popup=folium.Popup(popup_html, max_width=200),
-                        tooltip=f"CE {comunidad['ID']}",
-                        radius=4,
-                        color='#00D9FF',
-                        fillColor='#00D9FF',
-                        fillOpacity=0.7,
-                        weight=2
-                    ).add_to(cluster)
-            except:
-                continue
-    
-    cluster.add_to(mapa)
+    # Comunidades: solo burbujas agregadas por zoom ("agregado") o todas en una capa
+    # agrupada ("todas"); los puntos del modo "vista" y los del modo "agregado" al
+    # acercarse los agrega st_folium como capa dinámica
+    if modo == "agregado":
+        capa_comunidades_agregada(mapa, cargar_piramide_comunidades(_comunidades_df))
+    elif modo == "todas":
+        capa_comunidades(_comunidades_df).add_to(mapa)
     
     return mapa
 
-def crear_mapa_plotly(_granjas_df, _comunidades_df):
-    """Crear mapa Plotly más estable"""
+@cronometrar()
+@artefacto_en_disco("mapa_plotly", "plotly")
+def crear_mapa_plotly(_granjas_df, _comunidades_df, zoom=6, piramide=None, version=None):
+    """
+    Crear mapa Plotly más estable. Con `piramide` y zoom bajo las comunidades
+    se dibujan como burbujas agregadas por celda en lugar de puntos individuales.
+    La figura se comparte entre procesos por `version` de los datos y zoom.
+    """
     fig = go.Figure()
     
     # Granjas
-    fig.add_trace(go.Scattermapbox(
-        lat=_granjas_df['Latitud'],
-        lon=_granjas_df['Longitud'],
-        mode='markers',
-        marker=dict(size=15, color='#FF6B35'),
-        text=[f"Granja {row['Item']}<br>{row['Municipio']}, {row['Departamento']}" 
-              for _, row in _granjas_df.iterrows()],
-        name='🏗️ Granjas Solares',
-        hovertemplate='%{text}<extra></extra>'
+    fig.add_trace(traza_mapa(
+        _granjas_df, '🏗️ Granjas Solares', "Granja {Item}<br>{Municipio}, {Departamento}",
+        lat='Latitud', lon='Longitud', marker=dict(size=15, color='#FF6B35')
     ))
     
-    # Comunidades - muestra filtrada
-    sample_size = min(80, len(_comunidades_df))
-    comunidades_muestra = _comunidades_df.sample(n=sample_size, random_state=42)
-    
-    # Filtrar coordenadas válidas
-    comunidades_validas = comunidades_muestra[
-        (comunidades_muestra['y'].notna()) & 
-        (comunidades_muestra['x'].notna()) &
-        (comunidades_muestra['y'] >= -5) & 
-        (comunidades_muestra['y'] <= 15) &
-        (comunidades_muestra['x'] >= -85) & 
-        (comunidades_muestra['x'] <= -65)
-    ]
-    
-    if len(comunidades_validas) > 0:
+    # Comunidades - agregadas por celda en zoom bajo
+    if piramide is not None and zoom <= ZOOM_PUNTOS_INDIVIDUALES:
+        celdas = piramide.nivel(zoom)
         fig.add_trace(go.Scattermapbox(
-            lat=comunidades_validas['y'],
-            lon=comunidades_validas['x'],
+            lat=celdas['lat'],
+            lon=celdas['lon'],
             mode='markers',
-            marker=dict(size=8, color='#00D9FF', opacity=0.7),
-            text=[f"CE {row['ID']}<br>{row['Municipio']}" 
-                  for _, row in comunidades_validas.iterrows()],
-            name='⚡ Comunidades Energéticas',
-            hovertemplate='%{text}<extra></extra>'
+            marker=dict(size=(6 + 2 * celdas['conteo'] ** 0.5).clip(upper=40), color='#00D9FF', opacity=0.6),
+            customdata=celdas[['conteo', 'potencia_kwp', 'inversion']],
+            name='⚡ Comunidades Energéticas (agregadas)',
+            hovertemplate='%{customdata[0]:,} comunidades<br>⚡ %{customdata[1]:,.0f} kWp'
+                          '<br>💰 $%{customdata[2]:,.0f}<extra></extra>'
+        ))
+    
+    # Comunidades - todas las que tienen coordenadas válidas
+    if piramide is None or zoom > ZOOM_PUNTOS_INDIVIDUALES:
+        fig.add_trace(traza_mapa(
+            _comunidades_df, '⚡ Comunidades Energéticas', "CE {ID}<br>{Municipio}",
+            marker=dict(size=8, color='#00D9FF', opacity=0.7)
         ))
     
     fig.update_layout(
         mapbox=dict(
             style='open-street-map',
             center=dict(lat=4.5, lon=-74),
-            zoom=6
+            zoom=zoom
         ),
         height=600,
         margin=dict(l=0, r=0, t=40, b=0),
@@ -223,7 +201,69 @@ def crear_mapa_plotly(_granjas_df, _comunidades_df):
     
     return fig
 
+def evaluar_sitio_candidato(comunidades, salida_mapa):
+    """
+    Evalúa un sitio candidato (clic en el mapa o coordenadas escritas) sin editar
+    la base de granjas; los sitios agregados se comparan en una tabla de la sesión
+    """
+    st.markdown("### 🎯 Evaluar Sitio Candidato")
+    st.caption("Haz clic en el mapa o escribe las coordenadas de una posible granja.")
+    
+    # Los campos toman su valor solo de session_state (sin `value=`), así un clic
+    # nuevo en el mapa puede reemplazar las coordenadas sin conflicto con el widget
+    st.session_state.setdefault("sitio_lat", 4.5)
+    st.session_state.setdefault("sitio_lon", -74.0)
+    clic = coordenadas_clic(salida_mapa)
+    if clic and clic != st.session_state.get("sitio_ultimo_clic"):
+        st.session_state["sitio_ultimo_clic"] = clic
+        st.session_state["sitio_lat"], st.session_state["sitio_lon"] = clic
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        lat = st.number_input("Latitud", min_value=-90.0, max_value=90.0, format="%.5f", key="sitio_lat")
+    with col2:
+        lon = st.number_input("Longitud", min_value=-180.0, max_value=180.0, format="%.5f", key="sitio_lon")
+    with col3:
+        k = st.slider("Comunidades cercanas", min_value=1, max_value=50, value=K_SITIO, key="sitio_k")
+    with col4:
+        radio = st.number_input("Radio (km)", min_value=0.5, value=RADIO_SITIO_KM, step=5.0, key="sitio_radio")
+    
+    evaluador = cargar_evaluador_sitios(comunidades, version_datos(("comunidades",)))
+    with cronometro("evaluar_sitio"):
+        cercanas, resumen = evaluador.evaluar(lat, lon, k=k, radio_km=radio)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Dist. Mínima", f"{resumen['Distancia_Min']:.2f} km")
+    with col2:
+        st.metric(f"Dist. Promedio ({k})", f"{resumen['Distancia_Media']:.2f} km")
+    with col3:
+        st.metric(f"CEs a {radio:g} km", f"{resumen['Comunidades_En_Radio']:,}")
+    with col4:
+        st.metric(f"kWp a {radio:g} km", f"{resumen['Potencia_kWp_En_Radio']:,.0f}")
+    st.caption(f"💰 Inversión estimada dentro del radio: ${resumen['Inversion_En_Radio']:,.0f}")
+    st.dataframe(cercanas, hide_index=True, use_container_width=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("➕ Agregar a la comparación", key="sitio_agregar"):
+            st.session_state.setdefault("sitios_comparados", []).append(resumen)
+    with col2:
+        if st.button("🗑️ Limpiar comparación", key="sitio_limpiar"):
+            st.session_state["sitios_comparados"] = []
+    
+    if st.session_state.get("sitios_comparados"):
+        st.dataframe(pd.DataFrame(st.session_state["sitios_comparados"]).round(2),
+                     hide_index=True, use_container_width=True)
+
 def main():
+    iniciar_rerun()
+    
+    # Un recálculo en segundo plano reemplazó las salidas: se invalida la caché una sola vez
+    gestor_trabajos = cargar_gestor_trabajos()
+    if gestor_trabajos.consumir_actualizacion():
+        st.cache_data.clear()
+    
     # Header
     st.markdown("""
     <div class="main-header">
@@ -233,194 +273,276 @@ def main():
     </div>
     """, unsafe_allow_html=True)
     
-    # Cargar datos
-    with st.spinner('🔄 Cargando datos...'):
-        granjas_actualizadas, comunidades, estadisticas, resumen_detallado = cargar_datos()
-    
-    if granjas_actualizadas is None:
-        st.error("❌ No se pudieron cargar los datos.")
-        return
-    
     # Sidebar
     st.sidebar.markdown("### 🔧 Navegación")
     vista = st.sidebar.selectbox(
         "Selecciona la vista:",
-        ["🔍 Explorar por Granja", "🗺️ Mapas", "📈 Estadísticas", "📋 Datos"]
+        list(DATOS_VISTAS)
     )
     
+    # Cargar datos: solo los de la vista, cada uno al primer acceso
+    with st.spinner('🔄 Cargando datos...'):
+        # Versión fijada para todo el rerun: datos y claves de caché de la misma versión
+        version_resultados = version_actual()
+        datos = DatosVista(DATOS_VISTAS[vista], version_resultados)
+        try:
+            granjas_actualizadas = datos["granjas_actualizadas"]
+            estadisticas = datos["estadisticas"]
+        except Exception as e:
+            st.error(f"Error cargando datos: {e}")
+            st.error("❌ No se pudieron cargar los datos.")
+            return
+    
+    ranking = cargar_ranking_granjas(estadisticas, version_datos(VERSION_RANKING, version_resultados))
+    indicadores = ranking.indicadores
+    
     # Métricas sidebar
     st.sidebar.markdown("### 📈 Métricas")
     st.sidebar.metric("Granjas", len(granjas_actualizadas))
-    st.sidebar.metric("Comunidades", len(comunidades))
-    st.sidebar.metric("Dist. Promedio", f"{estadisticas['Distancia_Media'].mean():.1f} km")
+    st.sidebar.metric("Comunidades", datos.filas("comunidades"))
+    st.sidebar.metric("Dist. Promedio", f"{indicadores['distancia_media']:.1f} km")
+    
+    render_panel_recalculo(gestor_trabajos)
     
-    # Contenido principal
-    if vista == "🔍 Explorar por Granja":
-        st.markdown("## 🔍 Explorador por Granja")
+    # Contenido principal (cronometrado por vista)
+    with cronometro(f"vista {vista}"):
+        if vista == "🔍 Explorar por Granja":
+            st.markdown("## 🔍 Explorador por Granja")
         
-        st.info("🎯 Identificar las 10 comunidades energéticas más cercanas a cada granja solar.")
+            st.info("🎯 Identificar las 10 comunidades energéticas más cercanas a cada granja solar.")
         
-        # Métricas principales
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.metric("Granjas Analizadas", len(granjas_actualizadas))
-        with col2:
-            st.metric("Distancia Promedio", f"{estadisticas['Distancia_Media'].mean():.2f} km")
-        with col3:
-            mejor = estadisticas.loc[estadisticas['Distancia_Media'].idxmin()]
-            st.metric("Mejor Ubicación", f"Granja {mejor['Item']}")
-        with col4:
-            peor = estadisticas.loc[estadisticas['Distancia_Media'].idxmax()]
-            st.metric("Mayor Desafío", f"Granja {peor['Item']}")
+            # Métricas principales
+            col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("Granjas Analizadas", len(granjas_actualizadas))
+            with col2:
+                st.metric("Distancia Promedio", f"{indicadores['distancia_media']:.2f} km")
+            with col3:
+                mejor = ranking.mejores_granjas(1).iloc[0]
+                st.metric("Mejor Ubicación", f"Granja {mejor['Item']}")
+            with col4:
+                peor = ranking.peores_granjas(1).iloc[0]
+                st.metric("Mayor Desafío", f"Granja {peor['Item']}")
         
-        st.markdown("---")
+            st.markdown("---")
         
-        # Selector de granja
-        granja_seleccionada = st.selectbox(
-            "Selecciona una granja:",
-            options=granjas_actualizadas['Item'].tolist(),
-            format_func=lambda x: f"Granja {x} - {granjas_actualizadas[granjas_actualizadas['Item']==x]['Municipio'].iloc[0]}"
-        )
+            # Selector de granja
+            indice = cargar_indice_granjas(granjas_actualizadas, estadisticas, datos["resumen_detallado"],
+                                           version_datos(version=version_resultados))
+            granja_seleccionada = st.selectbox(
+                "Selecciona una granja:",
+                options=indice.items,
+                format_func=indice.etiquetas.__getitem__
+            )
         
-        if granja_seleccionada:
-            granja_info = granjas_actualizadas[granjas_actualizadas['Item'] == granja_seleccionada].iloc[0]
-            stats_granja = estadisticas[estadisticas['Item'] == granja_seleccionada].iloc[0]
+            if granja_seleccionada:
+                granja_info = indice.info[granja_seleccionada]
+                stats_granja = indice.estadisticas[granja_seleccionada]
             
-            col1, col2 = st.columns(2)
-            with col1:
-                st.markdown(f"""
-                **🏗️ Granja {granja_seleccionada}**
-                - **📍 Ubicación**: {granja_info['Municipio']}, {granja_info['Departamento']}
-                - **⚡ Potencia**: {granja_info['Potencia  KW']} kW
-                - **👥 Beneficiarios**: {granja_info['Beneficiarios']}
-                """)
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.markdown(f"""
+                    **🏗️ Granja {granja_seleccionada}**
+                    - **📍 Ubicación**: {granja_info['Municipio']}, {granja_info['Departamento']}
+                    - **⚡ Potencia**: {granja_info['Potencia  KW']} kW
+                    - **👥 Beneficiarios**: {granja_info['Beneficiarios']}
+                    """)
             
-            with col2:
-                st.markdown(f"""
-                **📊 Estadísticas**
-                - **📐 Dist. Mínima**: {stats_granja['Distancia_Min']:.2f} km
-                - **📏 Dist. Promedio**: {stats_granja['Distancia_Media']:.2f} km
-                - **📈 Dist. Máxima**: {stats_granja['Distancia_Max']:.2f} km
-                """)
+                with col2:
+                    st.markdown(f"""
+                    **📊 Estadísticas**
+                    - **📐 Dist. Mínima**: {stats_granja['Distancia_Min']:.2f} km
+                    - **📏 Dist. Promedio**: {stats_granja['Distancia_Media']:.2f} km
+                    - **📈 Dist. Máxima**: {stats_granja['Distancia_Max']:.2f} km
+                    """)
             
-            # Tabla de comunidades cercanas
-            st.markdown(f"#### 🎯 Las 10 Comunidades Más Cercanas a Granja {granja_seleccionada}")
+                # Tabla de comunidades cercanas
+                st.markdown(f"#### 🎯 Las 10 Comunidades Más Cercanas a Granja {granja_seleccionada}")
             
-            comunidades_detalle = resumen_detallado[
-                resumen_detallado['Granja_Item'] == granja_seleccionada
-            ].sort_values('Ranking')[['Ranking', 'Comunidad_ID', 'Comunidad_Nombre', 
-                                     'Comunidad_Municipio', 'Distancia_km']]
+                comunidades_detalle = indice.comunidades_cercanas(granja_seleccionada)[
+                    ['Ranking', 'Comunidad_ID', 'Comunidad_Nombre', 
+                     'Comunidad_Municipio', 'Distancia_km']]
             
-            st.dataframe(comunidades_detalle, hide_index=True, use_container_width=True)
+                st.dataframe(comunidades_detalle, hide_index=True, use_container_width=True)
 
-            col_csv, col_excel = st.columns(2)
-            with col_csv:
-                csv_com = comunidades_detalle.to_csv(index=False)
-                st.download_button("📥 Descargar CSV", csv_com, f"comunidades_cercanas_granja_{granja_seleccionada}.csv", "text/csv")
-            with col_excel:
-                excel_com = to_excel(comunidades_detalle)
-                st.download_button("📥 Descargar Excel", excel_com, f"comunidades_cercanas_granja_{granja_seleccionada}.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                render_download_buttons(
+                    comunidades_detalle, f"comunidades_cercanas_granja_{granja_seleccionada}",
+                    version=version_datos(("resumen_detallado",), version_resultados)
+                )
                 
-    elif vista == "🗺️ Mapas":
-        st.markdown("## 🗺️ Mapas")
+                # Más allá del top 10: consultas sobre la matriz de distancias precalculada.
+                # La matriz y las comunidades solo se leen con el interruptor activo
+                version_matriz = version_matriz_distancias(version_resultados)
+                if version_matriz is not None:
+                    with st.expander("🔎 Más comunidades cercanas (matriz de distancias)"):
+                        mostrar_matriz = st.toggle("Consultar la matriz de distancias", key="mostrar_matriz")
+                        matriz = cargar_matriz_distancias(
+                            version_matriz, ruta_resultado("matriz_distancias", version_resultados)
+                        ) if mostrar_matriz else None
+                        if matriz is not None:
+                            col_k, col_radio = st.columns(2)
+                            with col_k:
+                                k_matriz = st.slider("Número de comunidades", min_value=10,
+                                                     max_value=matriz.k or 100, value=min(25, matriz.k or 100))
+                            with col_radio:
+                                radio_matriz = st.number_input("Radio máximo en km (0 = sin límite)",
+                                                               min_value=0.0, value=0.0, step=5.0)
+                            try:
+                                ids_matriz, distancias_matriz = matriz.vecinos(
+                                    granja_seleccionada, k=k_matriz, radio_km=radio_matriz or None
+                                )
+                            except (KeyError, ValueError) as e:
+                                st.warning(f"⚠️ {e}")
+                            else:
+                                detalle_matriz = pd.DataFrame({
+                                    'Comunidad_ID': ids_matriz, 'Distancia_km': distancias_matriz.round(2)
+                                }).merge(
+                                    datos["comunidades"],
+                                    left_on='Comunidad_ID', right_on='ID', how='left'
+                                ).drop(columns='ID')
+                                st.dataframe(detalle_matriz, hide_index=True, use_container_width=True)
+                
+        elif vista == "🗺️ Mapas":
+            st.markdown("## 🗺️ Mapas")
         
-        tab1, tab2 = st.tabs(["🗺️ Mapa Estable (Folium)", "📍 Mapa Plotly"])
+            comunidades = datos["comunidades"]
+            tab1, tab2 = st.tabs(["🗺️ Mapa Estable (Folium)", "📍 Mapa Plotly"])
         
-        with tab1:
-            st.markdown("### 🗺️ Mapa Interactivo")
-            st.info("🔴 **Granjas Solares** | 🔵 **Comunidades Energéticas** (muestra reducida para estabilidad)")
+            with tab1:
+                st.markdown("### 🗺️ Mapa Interactivo")
+                st.info("🔴 **Granjas Solares** | 🔵 **Comunidades Energéticas** (todas, agrupadas por cercanía)")
+            
+                modo_comunidades = st.radio(
+                    "Comunidades en el mapa:",
+                    ["Densidad por zoom", "Todas (agrupadas)", "Solo vista actual"],
+                    horizontal=True,
+                    help="'Densidad por zoom' muestra burbujas agregadas y los puntos individuales al acercarse; "
+                         "'Solo vista actual' envía únicamente las comunidades visibles y las actualiza al mover el mapa"
+                )
             
-            with st.spinner("🔄 Generando mapa estable..."):
-                mapa = crear_mapa_estable(granjas_actualizadas, comunidades)
-                st_folium(mapa, width=700, height=500, returned_objects=["last_object_clicked"])
+                version_mapa = version_datos(("granjas_actualizadas", "comunidades"), version_resultados)
+                with st.spinner("🔄 Generando mapa estable..."):
+                    if modo_comunidades == "Todas (agrupadas)":
+                        mapa = crear_mapa_estable(granjas_actualizadas, comunidades, modo="todas", version=version_mapa)
+                        registrar_bytes("mapa_folium.todas", lambda: len(mapa.get_root().render().encode('utf-8')))
+                        salida = st_folium(mapa, width=700, height=500,
+                                           returned_objects=["last_object_clicked", "last_clicked"])
+                    elif modo_comunidades == "Densidad por zoom":
+                        # Burbujas de la pirámide en el mapa; los puntos de la vista solo al acercarse
+                        mapa = crear_mapa_estable(granjas_actualizadas, comunidades, modo="agregado",
+                                                  version=version_mapa)
+                        registrar_bytes("mapa_folium.agregado", lambda: len(mapa.get_root().render().encode('utf-8')))
+                        vista_agregada = st.session_state.get("vista_mapa_agregado") or {}
+                        grupo, visibles = grupo_comunidades_acercamiento(
+                            comunidades, vista_agregada.get("limites"), vista_agregada.get("zoom"),
+                            ZOOM_PUNTOS_INDIVIDUALES
+                        )
+                        salida = st_folium(
+                            mapa, width=700, height=500, key="mapa_estable_agregado",
+                            feature_group_to_add=grupo,
+                            returned_objects=["last_object_clicked", "last_clicked", "bounds", "zoom"]
+                        )
+                        if visibles:
+                            st.caption(f"⚡ {visibles:,} comunidades en la vista actual")
+                        # Con zoom bajo desplazar el mapa no cambia nada: solo se recalcula
+                        # al cruzar el umbral de zoom o al moverse ya acercado
+                        zoom = (salida or {}).get("zoom")
+                        acercado = zoom is not None and zoom > ZOOM_PUNTOS_INDIVIDUALES
+                        nueva_vista = {"limites": salida.get("bounds"), "zoom": zoom} if acercado else {}
+                        if nueva_vista != vista_agregada:
+                            st.session_state["vista_mapa_agregado"] = nueva_vista
+                            st.rerun()
+                    else:
+                        mapa = crear_mapa_estable(granjas_actualizadas, comunidades, modo="vista", version=version_mapa)
+                        grupo, visibles = grupo_comunidades_vista(
+                            comunidades, st.session_state.get("limites_mapa_estable")
+                        )
+                        salida = st_folium(
+                            mapa, width=700, height=500, key="mapa_estable_vista",
+                            feature_group_to_add=grupo,
+                            returned_objects=["last_object_clicked", "last_clicked", "bounds"]
+                        )
+                        st.caption(f"⚡ {visibles:,} comunidades en la vista actual")
+                        limites = (salida or {}).get("bounds")
+                        if limites and limites != st.session_state.get("limites_mapa_estable"):
+                            st.session_state["limites_mapa_estable"] = limites
+                            st.rerun()
+                
+                evaluar_sitio_candidato(comunidades, salida)
         
-        with tab2:
-            st.markdown("### 📍 Mapa de Dispersión")
-            fig_plotly = crear_mapa_plotly(granjas_actualizadas, comunidades)
-            st.plotly_chart(fig_plotly, use_container_width=True)
+            with tab2:
+                st.markdown("### 📍 Mapa de Dispersión")
+                zoom_plotly = st.slider(
+                    "Nivel de zoom", min_value=4, max_value=12, value=6,
+                    help=f"Hasta zoom {ZOOM_PUNTOS_INDIVIDUALES} las comunidades se muestran agregadas por celda"
+                )
+                fig_plotly = crear_mapa_plotly(
+                    granjas_actualizadas, comunidades, zoom=zoom_plotly,
+                    piramide=cargar_piramide_comunidades(comunidades),
+                    version=version_datos(("granjas_actualizadas", "comunidades"), version_resultados)
+                )
+                registrar_bytes(f"mapa_plotly.zoom{zoom_plotly}", lambda: len(fig_plotly.to_json().encode('utf-8')))
+                st.plotly_chart(fig_plotly, use_container_width=True)
     
-    elif vista == "📈 Estadísticas":
-        st.markdown("## 📈 Estadísticas Detalladas")
+        elif vista == "📈 Estadísticas":
+            st.markdown("## 📈 Estadísticas Detalladas")
         
-        # Top granjas
-        col1, col2 = st.columns(2)
-        with col1:
-            st.markdown("### 🏆 Top 5 Mejores Ubicaciones")
-            top_5 = estadisticas.nsmallest(5, 'Distancia_Media')[['Item', 'Municipio', 'Distancia_Media']]
-            st.dataframe(top_5, hide_index=True)
+            cubo = cargar_cubo_agregacion(granjas_actualizadas, datos["comunidades"], estadisticas,
+                                          version_datos(VERSION_CUBO, version_resultados))
         
-        with col2:
-            st.markdown("### ⚠️ Top 5 Mayores Desafíos") 
-            bottom_5 = estadisticas.nlargest(5, 'Distancia_Media')[['Item', 'Municipio', 'Distancia_Media']]
-            st.dataframe(bottom_5, hide_index=True)
+            # Top granjas
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("### 🏆 Top 5 Mejores Ubicaciones")
+                top_5 = cubo.mejores_granjas(5)[['Item', 'Municipio', 'Distancia_Media']]
+                st.dataframe(top_5, hide_index=True)
         
-        # Gráfico de distancias
-        fig = px.bar(
-            estadisticas.sort_values('Distancia_Media'),
-            x='Item', y='Distancia_Media',
-            color='Departamento',
-            title='📏 Distancia Promedio a las 10 Comunidades Más Cercanas',
-            height=500
-        )
-        st.plotly_chart(fig, use_container_width=True)
-    
-    elif vista == "📋 Datos":
-        st.markdown("## 📋 Datos y Tablas")
+            with col2:
+                st.markdown("### ⚠️ Top 5 Mayores Desafíos") 
+                bottom_5 = cubo.peores_granjas(5)[['Item', 'Municipio', 'Distancia_Media']]
+                st.dataframe(bottom_5, hide_index=True)
         
-        tab1, tab2 = st.tabs(["🎯 Tabla Principal", "📊 Todas las Bases"])
+            # Gráfico de distancias
+            fig = px.bar(
+                cubo.granjas_ordenadas,
+                x='Item', y='Distancia_Media',
+                color='Departamento',
+                title='📏 Distancia Promedio a las 10 Comunidades Más Cercanas',
+                height=500
+            )
+            st.plotly_chart(fig, use_container_width=True)
         
-        with tab1:
-            st.markdown("### 🎯 Tabla Principal del Análisis")
-            
-            # Crear tabla principal
-            tabla_principal = []
-            for _, granja in granjas_actualizadas.iterrows():
-                item = granja['Item']
-                ces_ids = granja['CEs Relacionadas'] 
-                stats = estadisticas[estadisticas['Item'] == item].iloc[0]
-                
-                tabla_principal.append({
-                    'Granja': f"Granja {item}",
-                    'Ubicación': f"{granja['Municipio']}, {granja['Departamento']}",
-                    'Potencia_kW': granja['Potencia  KW'],
-                    'IDs_10_CEs_Cercanas': ces_ids,
-                    'Distancia_Promedio_km': round(stats['Distancia_Media'], 2),
-                    'Beneficiarios': granja['Beneficiarios']
-                })
+            render_estadisticas_regionales(cubo)
+    
+        elif vista == "📋 Datos":
+            st.markdown("## 📋 Datos y Tablas")
+        
+            tab1, tab2 = st.tabs(["🎯 Tabla Principal", "📊 Todas las Bases"])
+        
+            with tab1:
+                st.markdown("### 🎯 Tabla Principal del Análisis")
             
-            df_principal = pd.DataFrame(tabla_principal)
-            st.dataframe(df_principal, hide_index=True, use_container_width=True)
-            col_csv, col_excel = st.columns(2)
-            with col_csv:
-                csv = df_principal.to_csv(index=False)
-                st.download_button("📥 Descargar CSV", csv, "tabla_principal.csv", "text/csv")
-            with col_excel:
-                excel = to_excel(df_principal)
-                st.download_button("📥 Descargar Excel", excel, "tabla_principal.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                # Tabla principal compartida con el dashboard modular (sin la distancia mínima)
+                df_principal = cargar_tabla_principal(
+                    granjas_actualizadas, estadisticas, version_datos(VERSION_TABLA_PRINCIPAL, version_resultados)
+                ).drop(columns='Distancia_Minima_km').rename(columns={'IDs_10_CEs_Mas_Cercanas': 'IDs_10_CEs_Cercanas'})
+                st.dataframe(df_principal, hide_index=True, use_container_width=True)
+                render_download_buttons(df_principal, "tabla_principal", version=version_datos(version=version_resultados))
                 
-        with tab2:
-            st.markdown("### 📊 Base de Granjas")
-            st.dataframe(granjas_actualizadas, hide_index=True)
-            col_csv, col_excel = st.columns(2)
-            with col_csv:
-                csv_granjas = granjas_actualizadas.to_csv(index=False)
-                st.download_button("📥 Descargar CSV", csv_granjas, "base_granjas.csv", "text/csv")
-            with col_excel:
-                excel_granjas = to_excel(granjas_actualizadas)
-                st.download_button("📥 Descargar Excel", excel_granjas, "base_granjas.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            with tab2:
+                st.markdown("### 📊 Base de Granjas")
+                st.dataframe(granjas_actualizadas, hide_index=True)
+                render_download_buttons(granjas_actualizadas, "base_granjas", version=version_datos(("granjas_actualizadas",), version_resultados))
 
 
-            st.markdown("### ⚡ Comunidades Energéticas (muestra)")
-            st.dataframe(comunidades.head(50), hide_index=True) 
-            st.info(f"Mostrando 50 de {len(comunidades)} comunidades")
+                st.markdown("### ⚡ Comunidades Energéticas (muestra)")
+                muestra_comunidades = datos.muestra("comunidades", 50)
+                st.dataframe(muestra_comunidades, hide_index=True) 
+                st.info(f"Mostrando {len(muestra_comunidades)} de {datos.filas('comunidades')} comunidades")
 
-            col_csv, col_excel = st.columns(2)
-            with col_csv:
-                csv_comunidades = comunidades.head(50).to_csv(index=False)
-                st.download_button("📥 Descargar CSV", csv_comunidades, "comunidades_muestra.csv", "text/csv")
-            with col_excel:
-                excel_comunidades = to_excel(comunidades.head(50))
-                st.download_button("📥 Descargar Excel", excel_comunidades, "comunidades_muestra.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                render_download_buttons(muestra_comunidades, "comunidades_muestra", version=version_datos(("comunidades",), version_resultados))
+    
+    render_panel_perfilado()
 
 
 if __name__ == "__main__":
@@ -1,54 +1,269 @@
 """
 Módulo para cargar y procesar datos
 """
+import os
 import pandas as pd
 import streamlit as st
 from io import BytesIO
-from config_original import DATA_FILES
+from config_original import DATA_FILES, ESQUEMA_COMUNIDADES
+from cache_columnar import filas_csv_cacheado, leer_csv_cacheado
+from piramide_agregacion import cargar_o_construir_piramide
+from exportacion import escribir_excel
+from matriz_distancias import MatrizDistancias, DIRECTORIO_MATRIZ
+from evaluacion_sitio import EvaluadorSitios
+from cubo_agregacion import CuboAgregacion, RankingGranjas
+from trabajos import GestorTrabajos
+from versiones_resultados import CLAVES_VERSIONADAS, ruta_resultado, version_actual
+from perfilado import cronometrar, marcar_ejecucion
 
-@st.cache_data
-def cargar_datos():
-    """Cargar todos los datasets necesarios"""
+@cronometrar("cargar_dataset")
+@st.cache_data(max_entries=16)
+@marcar_ejecucion("cargar_dataset")
+def cargar_dataset(clave, columnas=None, version=None, firma=None, filas=None):
+    """
+    Un dataset de DATA_FILES con solo `columnas` (None = todas) y, con `filas`,
+    solo sus primeras filas. Las salidas del análisis se leen de la versión
+    publicada `version`; `firma` (`version_datos((clave,), version)`) solo forma
+    parte de la clave de la caché.
+    """
+    columnas = list(columnas) if columnas is not None else None
+    if clave == "comunidades":
+        return leer_csv_cacheado(DATA_FILES[clave], esquema=ESQUEMA_COMUNIDADES, columnas=columnas, filas=filas)
+    df = pd.read_csv(ruta_resultado(clave, version), usecols=columnas, nrows=filas)
+    return df if columnas is None else df[columnas]
+
+def filas_dataset(clave, version=None):
+    """Número de filas de un dataset; el de comunidades sale de los metadatos de su caché"""
+    if clave == "comunidades":
+        return filas_csv_cacheado(DATA_FILES[clave], esquema=ESQUEMA_COMUNIDADES)
+    return len(cargar_dataset(clave, version=version, firma=version_datos((clave,), version)))
+
+class DatosVista:
+    """
+    Datasets que declara una vista ({clave: columnas, o None para todas}), leídos
+    con `cargar_dataset` la primera vez que se piden. Los que la vista no usa en
+    este rerun no se leen; pedir uno no declarado es un error, para que la
+    declaración siga siendo la lista completa de lo que lee la vista.
+    """
+
+    def __init__(self, declaracion, version=None):
+        self.declaracion = dict(declaracion)
+        self.version = version
+        self._cargados = {}
+
+    def _leer(self, clave, filas=None):
+        if clave not in self.declaracion:
+            raise KeyError(f"La vista no declaró el dataset '{clave}'")
+        columnas = self.declaracion[clave]
+        return cargar_dataset(
+            clave, tuple(columnas) if columnas is not None else None,
+            self.version, version_datos((clave,), self.version), filas
+        )
+
+    def __getitem__(self, clave):
+        if clave not in self._cargados:
+            self._cargados[clave] = self._leer(clave)
+        return self._cargados[clave]
+
+    def muestra(self, clave, filas):
+        """Primeras `filas` filas de un dataset, sin cargarlo completo (si aún no se cargó)"""
+        if clave in self._cargados:
+            return self._cargados[clave].head(filas)
+        return self._leer(clave, filas)
+
+    def filas(self, clave):
+        """Filas de un dataset sin cargarlo (si aún no se cargó)"""
+        if clave in self._cargados:
+            return len(self._cargados[clave])
+        return filas_dataset(clave, self.version)
+
+def cargar_datos(version=None):
+    """
+    Cargar todos los datasets completos. Las salidas del análisis se leen de la
+    versión publicada `version` (la vigente si es None). Las vistas usan
+    `DatosVista` para leer solo lo que necesitan.
+    """
     try:
-        datasets = {}
-        for key, filename in DATA_FILES.items():
-            datasets[key] = pd.read_csv(filename)
-        
+        datos = DatosVista(dict.fromkeys(DATA_FILES), version or version_actual())
         return (
-            datasets["granjas_actualizadas"],
-            datasets["granjas_original"], 
-            datasets["comunidades"],
-            datasets["estadisticas"],
-            datasets["resumen_detallado"]
+            datos["granjas_actualizadas"],
+            datos["granjas_original"], 
+            datos["comunidades"],
+            datos["estadisticas"],
+            datos["resumen_detallado"]
         )
     except Exception as e:
         st.error(f"Error cargando datos: {e}")
         return None, None, None, None, None
 
+@cronometrar("cargar_piramide_comunidades")
+@st.cache_resource
+@marcar_ejecucion("cargar_piramide_comunidades")
+def cargar_piramide_comunidades(comunidades):
+    """Pirámide de agregación por zoom de las comunidades (persistida en .cache_datos)"""
+    return cargar_o_construir_piramide(comunidades)
+
+@cronometrar("cargar_evaluador_sitios")
+@st.cache_resource(max_entries=2)
+@marcar_ejecucion("cargar_evaluador_sitios")
+def cargar_evaluador_sitios(_comunidades, version):
+    """
+    Evaluador de sitios candidatos (índice espacial en memoria), uno por versión
+    de las comunidades. El DataFrame no se hashea (prefijo _): la clave es `version`.
+    """
+    return EvaluadorSitios(_comunidades)
+
+def version_matriz_distancias(version=None):
+    """
+    Clave de la matriz de distancias de la versión publicada `version` (o la
+    vigente): el nombre de la versión, o el mtime de la matriz en la raíz si no
+    hay versiones publicadas. None si esa versión no tiene matriz.
+    """
+    version = version or version_actual()
+    try:
+        estado = os.stat(os.path.join(ruta_resultado("matriz_distancias", version), 'meta.json'))
+    except OSError:
+        return None
+    return version if version is not None else estado.st_mtime_ns
+
+@cronometrar("cargar_matriz_distancias")
+@st.cache_resource(max_entries=2)
+@marcar_ejecucion("cargar_matriz_distancias")
+def cargar_matriz_distancias(version, directorio=DIRECTORIO_MATRIZ):
+    """
+    Matriz dispersa de distancias en `directorio` (`ruta_resultado("matriz_distancias", ...)`),
+    abierta con memory-map una vez por versión. Retorna None si no existe (`version` None).
+    """
+    if version is None:
+        return None
+    return MatrizDistancias.cargar(directorio)
+
+@st.cache_resource
+def cargar_gestor_trabajos():
+    """Gestor de recálculos en segundo plano, único por proceso del servidor"""
+    return GestorTrabajos()
+
+def version_datos(claves=("granjas_actualizadas", "estadisticas", "resumen_detallado"), version=None):
+    """
+    Versión de los archivos de datos; cambia cuando se regeneran. Las salidas del
+    análisis se identifican por la versión publicada (`version`, o la vigente) y
+    los demás archivos por mtime y tamaño.
+    """
+    version = version or version_actual()
+    claves_version = []
+    for clave in claves:
+        if clave in CLAVES_VERSIONADAS and version is not None:
+            claves_version.append((clave, version))
+            continue
+        try:
+            estado = os.stat(DATA_FILES[clave])
+            claves_version.append((clave, estado.st_mtime_ns, estado.st_size))
+        except OSError:
+            claves_version.append((clave, None, None))
+    return tuple(claves_version)
+
+class IndiceGranjas:
+    """
+    Búsquedas por Item precalculadas: fila de la granja, sus estadísticas,
+    sus comunidades cercanas ya ordenadas por Ranking y las etiquetas del selector.
+    Cada consulta es un acceso a diccionario en lugar de filtrar los DataFrames.
+    """
+
+    def __init__(self, granjas_actualizadas, estadisticas, resumen_detallado):
+        granjas = granjas_actualizadas.drop_duplicates('Item')
+        self.items = granjas_actualizadas['Item'].tolist()
+        self.info = {fila['Item']: fila for _, fila in granjas.iterrows()}
+        self.estadisticas = {
+            fila['Item']: fila for _, fila in estadisticas.drop_duplicates('Item').iterrows()
+        }
+
+        ordenado = resumen_detallado.sort_values(['Granja_Item', 'Ranking'], kind='stable')
+        self.comunidades = {
+            item: grupo for item, grupo in ordenado.groupby('Granja_Item', sort=False)
+        }
+        self._sin_comunidades = resumen_detallado.iloc[0:0]
+
+        self.etiquetas = {
+            item: f"Granja {item} - {fila['Municipio']}" for item, fila in self.info.items()
+        }
+        self.etiquetas_con_departamento = {
+            item: f"{self.etiquetas[item]}, {fila['Departamento']}" for item, fila in self.info.items()
+        }
+
+    def comunidades_cercanas(self, item):
+        """Comunidades de la granja ordenadas por Ranking (vacío si no tiene)"""
+        return self.comunidades.get(item, self._sin_comunidades)
+
+@cronometrar("cargar_indice_granjas")
+@st.cache_resource(max_entries=2)
+@marcar_ejecucion("cargar_indice_granjas")
+def cargar_indice_granjas(_granjas_actualizadas, _estadisticas, _resumen_detallado, version):
+    """
+    Índice de búsqueda por granja, construido una vez por versión de los datos.
+    Los DataFrames no se hashean (prefijo _): la clave de la caché es `version`.
+    """
+    return IndiceGranjas(_granjas_actualizadas, _estadisticas, _resumen_detallado)
+
+VERSION_RANKING = ("estadisticas",)
+
+@cronometrar("cargar_ranking_granjas")
+@st.cache_resource(max_entries=2)
+@marcar_ejecucion("cargar_ranking_granjas")
+def cargar_ranking_granjas(_estadisticas, version):
+    """
+    Granjas ordenadas por distancia e indicadores de distancia, por versión de las
+    estadísticas (`version_datos(VERSION_RANKING)`); no requiere las comunidades.
+    """
+    return RankingGranjas(_estadisticas)
+
+VERSION_CUBO = ("granjas_actualizadas", "comunidades", "estadisticas")
+
+@cronometrar("cargar_cubo_agregacion")
+@st.cache_resource(max_entries=2)
+@marcar_ejecucion("cargar_cubo_agregacion")
+def cargar_cubo_agregacion(_granjas_actualizadas, _comunidades, _estadisticas, version):
+    """
+    Cubo de agregados por región e indicadores globales, construido una vez por
+    versión de los datos (`version_datos(VERSION_CUBO)`).
+    """
+    return CuboAgregacion.desde_datos(_granjas_actualizadas, _comunidades, _estadisticas)
+
+@cronometrar()
 def to_excel(df):
     output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Datos')
+    escribir_excel(df, output, hoja='Datos')
     processed_data = output.getvalue()
     return processed_data
 
+@cronometrar()
 def crear_tabla_principal(granjas_actualizadas, estadisticas):
-    """Crear tabla principal con todos los datos"""
-    tabla_principal = []
+    """
+    Crear tabla principal con todos los datos: una fila por granja (en su orden)
+    unida por Item con sus estadísticas; si un Item se repite se usa la primera fila
+    """
+    estadisticas_granja = estadisticas.drop_duplicates('Item')[['Item', 'Distancia_Media', 'Distancia_Min']]
+    unida = granjas_actualizadas[
+        ['Item', 'Municipio', 'Departamento', 'Potencia  KW', 'CEs Relacionadas', 'Beneficiarios']
+    ].merge(estadisticas_granja, on='Item', how='left', validate='many_to_one')
     
-    for _, granja in granjas_actualizadas.iterrows():
-        item = granja['Item']
-        ces_ids = granja['CEs Relacionadas']
-        stats_granja = estadisticas[estadisticas['Item'] == item].iloc[0]
-        
-        tabla_principal.append({
-            'Granja': f"Granja {item}",
-            'Ubicación': f"{granja['Municipio']}, {granja['Departamento']}",
-            'Potencia_kW': granja['Potencia  KW'],
-            'IDs_10_CEs_Mas_Cercanas': ces_ids,
-            'Distancia_Promedio_km': round(stats_granja['Distancia_Media'], 2),
-            'Distancia_Minima_km': round(stats_granja['Distancia_Min'], 2),
-            'Beneficiarios': granja['Beneficiarios']
-        })
-    
-    return pd.DataFrame(tabla_principal)
+    return pd.DataFrame({
+        'Granja': 'Granja ' + unida['Item'].astype(str),
+        'Ubicación': unida['Municipio'].astype(str) + ', ' + unida['Departamento'].astype(str),
+        'Potencia_kW': unida['Potencia  KW'],
+        'IDs_10_CEs_Mas_Cercanas': unida['CEs Relacionadas'],
+        'Distancia_Promedio_km': unida['Distancia_Media'].round(2),
+        'Distancia_Minima_km': unida['Distancia_Min'].round(2),
+        'Beneficiarios': unida['Beneficiarios']
+    })
+
+VERSION_TABLA_PRINCIPAL = ("granjas_actualizadas", "estadisticas")
+
+@cronometrar("cargar_tabla_principal")
+@st.cache_resource(max_entries=2)
+@marcar_ejecucion("cargar_tabla_principal")
+def cargar_tabla_principal(_granjas_actualizadas, _estadisticas, version):
+    """
+    Tabla principal construida una vez por versión de los datos
+    (`version_datos(VERSION_TABLA_PRINCIPAL)`). El resultado es compartido: no modificarlo.
+    """
+    return crear_tabla_principal(_granjas_actualizadas, _estadisticas)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Generador de datos sintéticos para pruebas de rendimiento.
+
+Produce granjas y comunidades con exactamente las mismas columnas que
+`Base granjas.csv` y `Base comunidades energéticas.csv`. Las coordenadas se
+agrupan alrededor de centros poblados aleatorios (como los datos reales) y
+siempre quedan dentro de LIMITES_COLOMBIA. Con la misma semilla el resultado
+es idéntico.
+
+Uso:
+    python datos_sinteticos.py --granjas 1000 --comunidades 200000 --salida sinteticos/
+"""
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from capas_mapa import LIMITES_COLOMBIA
+
+COLUMNAS_GRANJAS = [
+    'Item', 'CEs Relacionadas', 'Longitud', 'Latitud', 'Comunidad', 'Departamento',
+    'Municipio', 'Nombre del proyecto', 'Zona', 'Potencia  KW', 'Numero de comunidades',
+    'Beneficiarios', 'Fuente de financiamiento'
+]
+COLUMNAS_COMUNIDADES = [
+    'ID', 'Nombre de la comunidad', 'Priori_500', 'Justifi_Prio_500', 'Priori_1000',
+    'Priorizadas', 'Cod_DANE_Dep', 'Departamento', 'Cod_DANE_Mun', 'Municipio',
+    'Región geográfica', '18.¿Cúantas viviendas hay en su comunidad?',
+    'Inversión Estimada', 'Potencia Estimada kWp', 'x', 'y'
+]
+
+N_DEPARTAMENTOS = 33
+MUNICIPIOS_POR_DEPARTAMENTO = 34
+REGIONES = np.array(['ANDINA', 'CARIBE', 'PACÍFICA', 'ORINOQUÍA', 'AMAZONÍA', 'INSULAR'])
+
+
+def _coordenadas(rng, n, centros, dispersion_grados=0.25):
+    """Puntos alrededor de los centros, re-muestreando los que salen de Colombia"""
+    lat_min, lat_max, lon_min, lon_max = LIMITES_COLOMBIA
+    municipio = rng.integers(0, len(centros), n)
+    lat = np.empty(n)
+    lon = np.empty(n)
+    pendientes = np.arange(n)
+    while len(pendientes):
+        lat[pendientes] = centros[municipio[pendientes], 0] + rng.normal(0, dispersion_grados, len(pendientes))
+        lon[pendientes] = centros[municipio[pendientes], 1] + rng.normal(0, dispersion_grados, len(pendientes))
+        fuera = ((lat[pendientes] < lat_min) | (lat[pendientes] > lat_max)
+                 | (lon[pendientes] < lon_min) | (lon[pendientes] > lon_max))
+        pendientes = pendientes[fuera]
+    return lat, lon, municipio
+
+
+def _centros_municipios(semilla):
+    """Centros de municipios (lat, lon) fijos para una semilla"""
+    rng = np.random.default_rng(semilla)
+    lat_min, lat_max, lon_min, lon_max = LIMITES_COLOMBIA
+    n = N_DEPARTAMENTOS * MUNICIPIOS_POR_DEPARTAMENTO
+    # Margen de 1 grado para que la mayoría de los puntos caiga dentro de los límites
+    return np.column_stack((
+        rng.uniform(lat_min + 1, lat_max - 1, n),
+        rng.uniform(lon_min + 1, lon_max - 1, n)
+    ))
+
+
+def _etiquetas(prefijo, valores):
+    """Etiquetas de texto indexando un catálogo (no se formatea fila por fila)"""
+    catalogo = np.array([f"{prefijo} {v:03d}" for v in range(int(valores.max()) + 1)], dtype=object)
+    return catalogo[valores]
+
+
+def generar_comunidades(n, semilla=0):
+    """DataFrame con el esquema de la base de comunidades energéticas"""
+    rng = np.random.default_rng(semilla + 1)
+    lat, lon, municipio = _coordenadas(rng, n, _centros_municipios(semilla))
+    departamento = municipio // MUNICIPIOS_POR_DEPARTAMENTO
+    cod_dep = departamento + 5
+    cod_mun = cod_dep * 1000 + municipio % MUNICIPIOS_POR_DEPARTAMENTO + 1
+    priorizada = rng.random(n) < 0.1
+    potencia = rng.choice([10, 20, 30, 60, 90, 120, 130, 180], n,
+                          p=[0.03, 0.17, 0.54, 0.09, 0.09, 0.03, 0.03, 0.02])
+    viviendas = rng.integers(10, 500, n).astype(np.float64)
+    viviendas[rng.random(n) < 0.3] = np.nan
+    # Como en la base real, algunas filas traen potencia e inversión en blanco (' ')
+    sin_estimacion = rng.random(n) < 0.003
+    inversion = np.where(sin_estimacion, ' ', potencia * 18_000_000).astype(object)
+    potencia = np.where(sin_estimacion, ' ', potencia).astype(object)
+
+    return pd.DataFrame({
+        'ID': np.arange(1, n + 1),
+        'Nombre de la comunidad': np.char.add('COMUNIDAD SINTÉTICA ', np.arange(1, n + 1).astype(str)).astype(object),
+        'Priori_500': np.where(priorizada, 'SI', 'NO').astype(object),
+        'Justifi_Prio_500': np.full(n, 'N.A', dtype=object),
+        'Priori_1000': np.where(priorizada, 'SI', 'NO').astype(object),
+        'Priorizadas': np.where(priorizada, 'SI', 'NO').astype(object),
+        'Cod_DANE_Dep': cod_dep,
+        'Departamento': _etiquetas('DEPARTAMENTO', departamento),
+        'Cod_DANE_Mun': cod_mun,
+        'Municipio': _etiquetas('MUNICIPIO', municipio),
+        'Región geográfica': REGIONES[departamento % len(REGIONES)].astype(object),
+        '18.¿Cúantas viviendas hay en su comunidad?': viviendas,
+        'Inversión Estimada': inversion,
+        'Potencia Estimada kWp': potencia,
+        'x': lon,
+        'y': lat
+    }, columns=COLUMNAS_COMUNIDADES)
+
+
+def generar_granjas(n, semilla=0):
+    """DataFrame con el esquema de la base de granjas (sin resultados calculados)"""
+    rng = np.random.default_rng(semilla + 2)
+    lat, lon, municipio = _coordenadas(rng, n, _centros_municipios(semilla))
+    departamento = municipio // MUNICIPIOS_POR_DEPARTAMENTO
+    etiquetas_municipio = _etiquetas('MUNICIPIO', municipio)
+    potencia = rng.choice([500, 1000, 2000], n)
+
+    return pd.DataFrame({
+        'Item': np.arange(1, n + 1),
+        'CEs Relacionadas': np.full(n, np.nan),
+        'Longitud': lon,
+        'Latitud': lat,
+        'Comunidad': np.full(n, np.nan),
+        'Departamento': _etiquetas('DEPARTAMENTO', departamento),
+        'Municipio': etiquetas_municipio,
+        'Nombre del proyecto': 'SISTEMA FOTOVOLTAICO PARA EL ' + etiquetas_municipio,
+        'Zona': rng.choice(['SIN', 'ZNI'], n).astype(object),
+        'Potencia  KW': potencia,
+        'Numero de comunidades': np.full(n, 10),
+        'Beneficiarios': potencia // 2,
+        'Fuente de financiamiento': np.full(n, 'SINTÉTICO', dtype=object)
+    }, columns=COLUMNAS_GRANJAS)
+
+
+def parsear_argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="Genera CSV sintéticos con el esquema de las bases reales")
+    parser.add_argument('--granjas', type=int, default=1000)
+    parser.add_argument('--comunidades', type=int, default=200_000)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--salida', default='sinteticos')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parsear_argumentos(argv)
+    os.makedirs(args.salida, exist_ok=True)
+    granjas = generar_granjas(args.granjas, args.semilla)
+    comunidades = generar_comunidades(args.comunidades, args.semilla)
+    granjas.to_csv(os.path.join(args.salida, 'Base granjas.csv'), index=False)
+    comunidades.to_csv(os.path.join(args.salida, 'Base comunidades energéticas.csv'), index=False)
+    print(f"✅ {len(granjas)} granjas y {len(comunidades)} comunidades en {args.salida}/")
+
+
+if __name__ == "__main__":
+    main()
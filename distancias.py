@@ -0,0 +1,159 @@
+"""
+Motor vectorizado de distancias geográficas.
+Calcula bloques completos granjas × comunidades con NumPy en una sola llamada.
+
+Métodos disponibles:
+- 'haversine': esfera de radio medio (rápido, error relativo < 0.6% frente al elipsoide)
+- 'geodesico': fórmula inversa de Vincenty sobre el elipsoide WGS-84. Difiere de
+  `geopy.distance.geodesic` (Karney) en menos de TOLERANCIA_GEODESICO_KM.
+"""
+import numpy as np
+
+# Parámetros del elipsoide WGS-84
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = (1 - WGS84_F) * WGS84_A
+
+# Radio medio terrestre (IUGG) para la aproximación esférica
+RADIO_TIERRA_KM = 6371.0088
+
+# Diferencia máxima garantizada frente a geopy.distance.geodesic (1 mm)
+TOLERANCIA_GEODESICO_KM = 1e-6
+
+# Número máximo de pares por bloque para acotar la memoria temporal
+MAX_PARES_BLOQUE = 2_000_000
+
+# Pares por tramo en Vincenty: los temporales de cada iteración caben en caché,
+# lo que casi duplica la velocidad frente a iterar sobre arreglos de millones
+PARES_TRAMO_VINCENTY = 32_768
+
+
+def distancia_haversine_km(lat1, lon1, lat2, lon2):
+    """Distancia de gran círculo en km. Acepta escalares o arreglos (con broadcasting)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64))
+                              for v in (lat1, lon1, lat2, lon2))
+    sin_dlat = np.sin((lat2 - lat1) / 2)
+    sin_dlon = np.sin((lon2 - lon1) / 2)
+    h = sin_dlat ** 2 + np.cos(lat1) * np.cos(lat2) * sin_dlon ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def distancia_vincenty_km(lat1, lon1, lat2, lon2, max_iter=200, tol=1e-12):
+    """
+    Distancia geodésica en km sobre WGS-84 (Vincenty inverso vectorizado).
+    Los pares casi antipodales que no convergen se resuelven con geopy.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        *(np.asarray(v, dtype=np.float64) for v in (lat1, lon1, lat2, lon2))
+    )
+    if lat1.size <= PARES_TRAMO_VINCENTY:
+        return _vincenty_km(lat1, lon1, lat2, lon2, max_iter, tol)
+
+    planos = [np.ravel(v) for v in (lat1, lon1, lat2, lon2)]
+    distancia = np.empty(lat1.size, dtype=np.float64)
+    for inicio in range(0, lat1.size, PARES_TRAMO_VINCENTY):
+        tramo = slice(inicio, inicio + PARES_TRAMO_VINCENTY)
+        distancia[tramo] = _vincenty_km(*(v[tramo] for v in planos), max_iter, tol)
+    return distancia.reshape(lat1.shape)
+
+
+def _vincenty_km(lat1, lon1, lat2, lon2, max_iter, tol):
+    f = WGS84_F
+    L = np.radians(lon2 - lon1)
+    # Latitud reducida: sen/cos de U a partir de tan U, sin arctan + sin + cos
+    tanU1 = (1 - f) * np.tan(np.radians(lat1))
+    tanU2 = (1 - f) * np.tan(np.radians(lat2))
+    cosU1 = 1 / np.sqrt(1 + tanU1 ** 2)
+    cosU2 = 1 / np.sqrt(1 + tanU2 ** 2)
+    sinU1, sinU2 = tanU1 * cosU1, tanU2 * cosU2
+
+    lam = L.copy()
+    pendientes = np.ones(L.shape, dtype=bool)
+    sin_sigma = cos_sigma = sigma = cos2_alpha = cos_2sigma_m = None
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iter):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cosU2 * sin_lam, cosU1 * sinU2 - sinU1 * cosU2 * cos_lam)
+            cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cosU1 * cosU2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # Líneas ecuatoriales: cos2_alpha == 0
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0,
+                                    cos_sigma - 2 * sinU1 * sinU2 / cos2_alpha)
+            C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            lam_nuevo = L + (1 - C) * f * sin_alpha * (
+                sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+            )
+            pendientes = ~(np.abs(lam_nuevo - lam) < tol)
+            lam = lam_nuevo
+            if not pendientes.any():
+                break
+
+        u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+        A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+        B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+            - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+        ))
+        distancia = np.array(WGS84_B * A * (sigma - delta_sigma) / 1000.0)
+
+    # Respaldo exacto (Karney) para los pares que Vincenty no resuelve
+    pendientes |= ~np.isfinite(distancia)
+    if pendientes.any():
+        from geopy.distance import geodesic
+        for i in np.flatnonzero(pendientes):
+            distancia.flat[i] = geodesic(
+                (lat1.flat[i], lon1.flat[i]), (lat2.flat[i], lon2.flat[i])
+            ).kilometers
+
+    return distancia
+
+
+METODOS_DISTANCIA = {
+    'haversine': distancia_haversine_km,
+    'geodesico': distancia_vincenty_km,
+}
+
+
+def obtener_funcion_distancia(metodo):
+    """Retorna la función vectorizada asociada al método solicitado"""
+    try:
+        return METODOS_DISTANCIA[metodo]
+    except KeyError:
+        raise ValueError(
+            f"Método de distancia desconocido: {metodo!r}. "
+            f"Opciones: {', '.join(METODOS_DISTANCIA)}"
+        ) from None
+
+
+def matriz_distancias_km(lat_a, lon_a, lat_b, lon_b, metodo='geodesico'):
+    """
+    Calcula la matriz completa de distancias (len(a) × len(b)) en km.
+    `a` suele ser el conjunto de granjas y `b` el de comunidades.
+    """
+    funcion = obtener_funcion_distancia(metodo)
+    lat_a = np.asarray(lat_a, dtype=np.float64).reshape(-1, 1)
+    lon_a = np.asarray(lon_a, dtype=np.float64).reshape(-1, 1)
+    lat_b = np.asarray(lat_b, dtype=np.float64).reshape(1, -1)
+    lon_b = np.asarray(lon_b, dtype=np.float64).reshape(1, -1)
+    return funcion(lat_a, lon_a, lat_b, lon_b)
+
+
+def bloques_distancias_km(lat_a, lon_a, lat_b, lon_b, metodo='geodesico',
+                          max_pares=MAX_PARES_BLOQUE):
+    """
+    Genera la matriz de distancias por bloques de filas de `a`.
+    Produce tuplas (inicio, fin, bloque) con bloque de forma (fin - inicio, len(b)).
+    """
+    lat_a = np.asarray(lat_a, dtype=np.float64)
+    lon_a = np.asarray(lon_a, dtype=np.float64)
+    n_b = max(len(lat_b), 1)
+    filas_bloque = max(1, max_pares // n_b)
+    for inicio in range(0, len(lat_a), filas_bloque):
+        fin = min(inicio + filas_bloque, len(lat_a))
+        yield inicio, fin, matriz_distancias_km(
+            lat_a[inicio:fin], lon_a[inicio:fin], lat_b, lon_b, metodo
+        )
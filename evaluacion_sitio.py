@@ -0,0 +1,73 @@
+"""
+Evaluación de sitios candidatos ("what-if") sin editar la base de granjas.
+
+`EvaluadorSitios` se construye una vez por versión de las comunidades (índice
+espacial + columnas numéricas ya convertidas) y luego cada consulta es un k-NN y
+una consulta por radio sobre el índice: milisegundos por sitio, de modo que se
+pueden comparar decenas de ubicaciones en una sesión del dashboard.
+"""
+import numpy as np
+import pandas as pd
+from indice_espacial import RUTA_INDICE_COMUNIDADES, cargar_o_construir_indice
+
+K_SITIO = 10
+RADIO_SITIO_KM = 10.0
+
+
+class EvaluadorSitios:
+    """Consultas de proximidad para coordenadas arbitrarias"""
+
+    def __init__(self, comunidades_df, indice=None, ruta_indice=RUTA_INDICE_COMUNIDADES):
+        comunidades = comunidades_df.dropna(subset=['x', 'y'])
+        self.indice = cargar_o_construir_indice(comunidades, ruta_indice) if indice is None else indice
+        if len(self.indice) != len(comunidades):
+            raise ValueError("El índice espacial no corresponde a las comunidades recibidas")
+        self.ids = comunidades['ID'].to_numpy()
+        self.nombres = comunidades['Nombre de la comunidad'].to_numpy()
+        self.municipios = comunidades['Municipio'].to_numpy()
+        self.departamentos = comunidades['Departamento'].to_numpy()
+        self.potencia = pd.to_numeric(comunidades['Potencia Estimada kWp'], errors='coerce').fillna(0).to_numpy()
+        self.inversion = pd.to_numeric(comunidades['Inversión Estimada'], errors='coerce').fillna(0).to_numpy()
+
+    def _tabla(self, posiciones, distancias):
+        return pd.DataFrame({
+            'Ranking': np.arange(1, len(posiciones) + 1),
+            'Comunidad_ID': self.ids[posiciones],
+            'Comunidad_Nombre': self.nombres[posiciones],
+            'Comunidad_Municipio': self.municipios[posiciones],
+            'Comunidad_Departamento': self.departamentos[posiciones],
+            'Distancia_km': np.round(distancias, 2),
+            'Potencia_kWp': self.potencia[posiciones],
+        })
+
+    def evaluar(self, lat, lon, k=K_SITIO, radio_km=RADIO_SITIO_KM):
+        """
+        Retorna (cercanas_df, resumen): las k comunidades más cercanas (formato del
+        explorador por granja) y un dict con las estadísticas de distancia del
+        top-k y los totales de comunidades, kWp e inversión dentro de `radio_km`
+        """
+        posiciones, distancias = self.indice.k_vecinos(lat, lon, k)
+        posiciones, distancias = posiciones[0], distancias[0]
+        _, posiciones_radio, _ = self.indice.en_radio_csr(lat, lon, radio_km)
+        hay_cercanas = len(distancias) > 0
+        resumen = {
+            'Latitud': round(float(lat), 5),
+            'Longitud': round(float(lon), 5),
+            'Distancia_Min': float(distancias.min()) if hay_cercanas else np.nan,
+            'Distancia_Media': float(distancias.mean()) if hay_cercanas else np.nan,
+            'Distancia_Max': float(distancias.max()) if hay_cercanas else np.nan,
+            'Radio_km': radio_km,
+            'Comunidades_En_Radio': len(posiciones_radio),
+            'Potencia_kWp_En_Radio': float(self.potencia[posiciones_radio].sum()),
+            'Inversion_En_Radio': float(self.inversion[posiciones_radio].sum()),
+        }
+        return self._tabla(posiciones, distancias), resumen
+
+
+def coordenadas_clic(salida_mapa):
+    """(lat, lon) del último clic en el mapa (o en un marcador) devuelto por st_folium, o None"""
+    for clave in ('last_clicked', 'last_object_clicked'):
+        punto = (salida_mapa or {}).get(clave)
+        if punto and punto.get('lat') is not None and punto.get('lng') is not None:
+            return float(punto['lat']), float(punto['lng'])
+    return None
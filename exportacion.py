@@ -0,0 +1,79 @@
+"""
+Exportación de tablas a CSV y Excel bajo demanda.
+
+Los archivos se escriben por bloques de filas (CSV incremental y libro de
+openpyxl en modo write-only), de modo que la memoria no depende del tamaño de
+la tabla, y se guardan en la caché de artefactos compartida entre procesos
+(`cache_disco`) con una clave derivada de la versión de los datos: mientras los
+datos no cambien, cada exportación se genera una sola vez para todas las réplicas.
+"""
+import hashlib
+import os
+import pandas as pd
+from cache_disco import cache_artefactos
+
+FILAS_POR_BLOQUE = 50_000
+
+MIME_CSV = 'text/csv'
+MIME_EXCEL = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def _bloques(df, filas_por_bloque):
+    for inicio in range(0, len(df), filas_por_bloque):
+        yield df.iloc[inicio:inicio + filas_por_bloque]
+
+
+def escribir_csv(df, destino, filas_por_bloque=FILAS_POR_BLOQUE):
+    """Escribe el CSV bloque a bloque en una ruta o archivo de texto abierto"""
+    if isinstance(destino, (str, os.PathLike)):
+        with open(destino, 'w', encoding='utf-8', newline='') as archivo:
+            return escribir_csv(df, archivo, filas_por_bloque)
+
+    df.iloc[0:0].to_csv(destino, index=False)
+    for bloque in _bloques(df, filas_por_bloque):
+        bloque.to_csv(destino, index=False, header=False)
+
+
+def escribir_excel(df, destino, hoja='Datos', filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Escribe el libro con openpyxl en modo write-only: las filas se vuelcan al
+    archivo a medida que se agregan en lugar de mantener todas las celdas en memoria
+    """
+    from openpyxl import Workbook
+
+    libro = Workbook(write_only=True)
+    hoja_excel = libro.create_sheet(hoja)
+    hoja_excel.append([str(columna) for columna in df.columns])
+    for bloque in _bloques(df, filas_por_bloque):
+        # NaN no es un valor válido en Excel: se deja la celda vacía
+        valores = bloque.astype(object).where(bloque.notna(), None)
+        for fila in valores.itertuples(index=False, name=None):
+            hoja_excel.append(fila)
+    libro.save(destino)
+
+
+FORMATOS = {
+    'csv': (MIME_CSV, escribir_csv),
+    'xlsx': (MIME_EXCEL, escribir_excel),
+}
+
+
+def version_dataframe(df):
+    """Versión derivada del contenido, para tablas que no provienen de un archivo"""
+    huellas = pd.util.hash_pandas_object(df, index=False)
+    return hashlib.sha256(huellas.to_numpy().tobytes() + str(list(df.columns)).encode('utf-8')).hexdigest()
+
+
+def obtener_exportacion(df, nombre, formato, version=None, cache=None):
+    """
+    Retorna (archivo, mime): el archivo exportado abierto en modo binario
+    (el llamador lo cierra), generado solo si no está en la caché de artefactos
+    para esta versión. Las exportaciones que dejan de usarse se eliminan con el
+    desalojo LRU de la caché; un archivo ya abierto sigue siendo legible.
+    """
+    mime, escribir = FORMATOS[formato]
+    version = version_dataframe(df) if version is None else version
+    cache = cache or cache_artefactos()
+    archivo = cache.obtener_archivo('exportacion', version, {'nombre': nombre, 'formato': formato},
+                                    lambda destino: escribir(df, destino), formato)
+    return archivo, mime
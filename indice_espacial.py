@@ -0,0 +1,279 @@
+"""
+Índice espacial para consultas de vecinos sobre coordenadas geográficas.
+
+Construye un KD-tree (scipy) sobre las coordenadas proyectadas en la esfera
+unitaria (x, y, z). La distancia de cuerda es monótona con la distancia de gran
+círculo, por lo que el árbol entrega candidatos en tiempo sub-lineal; luego se
+re-ordenan con la distancia exacta del motor `distancias`.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import numpy as np
+from scipy.spatial import cKDTree
+from distancias import RADIO_TIERRA_KM, obtener_funcion_distancia
+
+# Diferencia relativa máxima entre la distancia esférica y la elipsoidal
+# (WGS-84 < 0.6%); se usa con holgura para garantizar resultados exactos
+MARGEN_ESFERA_ELIPSOIDE = 0.01
+
+# Con pocos puntos (p. ej. las granjas) los dos más cercanos se buscan con un
+# producto punto contra todos, que es más rápido que recorrer el árbol
+MAX_PUNTOS_FUERZA_BRUTA = 64
+FILAS_TRAMO_FUERZA_BRUTA = 4096
+
+# Archivo compartido entre el script de análisis y el dashboard
+RUTA_INDICE_COMUNIDADES = 'indice_comunidades.pkl'
+
+# Errores de un índice guardado ilegible o de otra versión del código: se reconstruye
+ERRORES_INDICE_GUARDADO = (OSError, pickle.UnpicklingError, EOFError, ImportError,
+                           AttributeError, TypeError, ValueError)
+
+registro = logging.getLogger(__name__)
+
+
+def a_cartesianas_unitarias(lat, lon):
+    """Convierte latitud/longitud (grados) a coordenadas 3D en la esfera unitaria"""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def cuerda_a_km(cuerda):
+    """Distancia de gran círculo (km) equivalente a una cuerda en la esfera unitaria"""
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.clip(np.asarray(cuerda) / 2, 0.0, 1.0))
+
+
+def km_a_cuerda(km):
+    """Cuerda en la esfera unitaria equivalente a una distancia de gran círculo (km)"""
+    angulo = np.minimum(np.asarray(km, dtype=np.float64) / RADIO_TIERRA_KM, np.pi)
+    return 2 * np.sin(angulo / 2)
+
+
+class IndiceEspacial:
+    """
+    Índice de puntos geográficos para consultas k-NN y por radio.
+    Las posiciones retornadas corresponden al orden de los puntos de construcción.
+    """
+
+    def __init__(self, lat, lon, ids=None, metodo='geodesico'):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.ids = np.arange(len(self.lat)) if ids is None else np.asarray(ids)
+        self.metodo = metodo
+        self._distancia = obtener_funcion_distancia(metodo)
+        self._arbol = cKDTree(a_cartesianas_unitarias(self.lat, self.lon))
+        self.firma = calcular_firma(self.lat, self.lon, self.ids)
+
+    @classmethod
+    def desde_comunidades(cls, comunidades_df, metodo='geodesico'):
+        """Construye el índice sobre las columnas x (longitud) / y (latitud)"""
+        return cls(comunidades_df['y'], comunidades_df['x'], comunidades_df['ID'], metodo)
+
+    def __len__(self):
+        return len(self.lat)
+
+    def __getstate__(self):
+        estado = self.__dict__.copy()
+        del estado['_distancia']
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._distancia = obtener_funcion_distancia(self.metodo)
+
+    def k_vecinos(self, lat, lon, k):
+        """
+        Retorna (posiciones, distancias_km), ambas de forma (n_consultas, k),
+        ordenadas por distancia exacta. Los empates se resuelven por posición,
+        igual que un ordenamiento estable del barrido completo.
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        k = min(int(k), len(self))
+        posiciones = np.empty((len(lat), k), dtype=np.int64)
+        distancias = np.empty((len(lat), k), dtype=np.float64)
+        if k == 0 or len(lat) == 0:
+            return posiciones, distancias
+
+        consultas = a_cartesianas_unitarias(lat, lon)
+        pendientes = np.arange(len(lat))
+        n_candidatos = min(len(self), max(2 * k, k + 8))
+
+        while len(pendientes):
+            cuerdas, candidatos = self._arbol.query(consultas[pendientes], k=n_candidatos)
+            cuerdas = np.reshape(cuerdas, (len(pendientes), n_candidatos))
+            candidatos = np.reshape(candidatos, (len(pendientes), n_candidatos))
+
+            exactas = self._distancia(
+                lat[pendientes, None], lon[pendientes, None],
+                self.lat[candidatos], self.lon[candidatos]
+            )
+            orden = np.lexsort((candidatos, exactas), axis=-1)[:, :k]
+            candidatos = np.take_along_axis(candidatos, orden, axis=1)
+            exactas = np.take_along_axis(exactas, orden, axis=1)
+
+            # Un punto fuera de los candidatos está al menos a la distancia esférica
+            # del último candidato; si esa cota supera al k-ésimo exacto, la fila es definitiva
+            if n_candidatos == len(self):
+                resueltas = np.ones(len(pendientes), dtype=bool)
+            else:
+                cota = cuerda_a_km(cuerdas[:, -1]) * (1 - MARGEN_ESFERA_ELIPSOIDE)
+                resueltas = cota > exactas[:, -1]
+
+            posiciones[pendientes[resueltas]] = candidatos[resueltas]
+            distancias[pendientes[resueltas]] = exactas[resueltas]
+            pendientes = pendientes[~resueltas]
+            n_candidatos = min(len(self), 2 * n_candidatos)
+
+        return posiciones, distancias
+
+    def vecino_mas_cercano(self, lat, lon):
+        """
+        Retorna (posiciones, distancias_km) del punto más cercano a cada consulta,
+        como arreglos 1-D; equivale a `k_vecinos(lat, lon, 1)` pero calcula la
+        distancia exacta solo para el primer candidato por cuerda (del árbol, o de
+        un producto punto contra todos si hay pocos puntos). Las consultas en
+        las que el segundo candidato podría ser más cercano (dentro del margen
+        esfera/elipsoide) se resuelven con `k_vecinos`.
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        if len(self) < 2 or len(lat) == 0:
+            posiciones, distancias = self.k_vecinos(lat, lon, 1)
+            return posiciones[:, 0], distancias[:, 0]
+
+        posiciones, cuerda_segundo = self._mas_cercano_por_cuerda(a_cartesianas_unitarias(lat, lon))
+        distancias = self._distancia(lat, lon, self.lat[posiciones], self.lon[posiciones])
+
+        dudosas = np.flatnonzero(cuerda_a_km(cuerda_segundo) * (1 - MARGEN_ESFERA_ELIPSOIDE) <= distancias)
+        if len(dudosas):
+            posiciones_dudosas, distancias_dudosas = self.k_vecinos(lat[dudosas], lon[dudosas], 1)
+            posiciones[dudosas] = posiciones_dudosas[:, 0]
+            distancias[dudosas] = distancias_dudosas[:, 0]
+        return posiciones, distancias
+
+    def _mas_cercano_por_cuerda(self, consultas):
+        """
+        (posiciones, cuerdas_segundo): el punto más cercano por cuerda a cada consulta
+        y la cuerda del segundo más cercano, que acota a todos los demás
+        """
+        if len(self) > MAX_PUNTOS_FUERZA_BRUTA:
+            cuerdas, candidatos = self._arbol.query(consultas, k=2)
+            return candidatos[:, 0].astype(np.int64), cuerdas[:, 1]
+
+        # Cuerda² = 2 - 2·(producto punto): el más cercano es el de mayor producto.
+        # Por tramos de consultas para que la matriz puntos × consultas quepa en caché
+        puntos = self._arbol.data
+        posiciones = np.empty(len(consultas), dtype=np.int64)
+        productos_segundo = np.empty(len(consultas), dtype=np.float64)
+        for inicio in range(0, len(consultas), FILAS_TRAMO_FUERZA_BRUTA):
+            tramo = slice(inicio, inicio + FILAS_TRAMO_FUERZA_BRUTA)
+            productos = puntos @ consultas[tramo].T
+            columnas = np.arange(productos.shape[1])
+            # argmax toma la primera posición en empates, como el barrido completo
+            mejor = productos.argmax(axis=0)
+            posiciones[tramo] = mejor
+            productos[mejor, columnas] = -np.inf
+            productos_segundo[tramo] = productos.max(axis=0)
+        return posiciones, np.sqrt(np.maximum(2 - 2 * productos_segundo, 0.0))
+
+    def en_radio_csr(self, lat, lon, radio_km):
+        """
+        Todos los puntos a distancia exacta <= radio_km de cada consulta, en formato
+        CSR: (desplazamientos, posiciones, distancias_km). Los vecinos de la consulta i
+        son posiciones[desplazamientos[i]:desplazamientos[i + 1]], ordenados por
+        distancia (empates por posición). Las distancias exactas se calculan en una
+        sola llamada vectorizada sobre todos los candidatos.
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lon = np.atleast_1d(np.asarray(lon, dtype=np.float64))
+        cuerda = km_a_cuerda(radio_km * (1 + MARGEN_ESFERA_ELIPSOIDE))
+        candidatos_por_consulta = self._arbol.query_ball_point(
+            a_cartesianas_unitarias(lat, lon), r=cuerda
+        )
+
+        conteos = np.fromiter(map(len, candidatos_por_consulta), dtype=np.int64, count=len(lat))
+        consultas = np.repeat(np.arange(len(lat)), conteos)
+        candidatos = (np.concatenate(candidatos_por_consulta).astype(np.int64)
+                      if conteos.sum() else np.empty(0, dtype=np.int64))
+        exactas = self._distancia(lat[consultas], lon[consultas], self.lat[candidatos], self.lon[candidatos])
+
+        dentro = exactas <= radio_km
+        consultas, candidatos, exactas = consultas[dentro], candidatos[dentro], exactas[dentro]
+        orden = np.lexsort((candidatos, exactas, consultas))
+        desplazamientos = np.zeros(len(lat) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(consultas, minlength=len(lat)), out=desplazamientos[1:])
+        return desplazamientos, candidatos[orden], exactas[orden]
+
+    def en_radio(self, lat, lon, radio_km):
+        """
+        Retorna, por cada consulta, una tupla (posiciones, distancias_km) con todos
+        los puntos a distancia exacta <= radio_km, ordenados por distancia.
+        """
+        desplazamientos, posiciones, distancias = self.en_radio_csr(lat, lon, radio_km)
+        return list(zip(np.split(posiciones, desplazamientos[1:-1]),
+                        np.split(distancias, desplazamientos[1:-1])))
+
+    def guardar(self, ruta=RUTA_INDICE_COMUNIDADES):
+        """Persiste el índice en disco (escritura atómica)"""
+        temporal = f"{ruta}.tmp"
+        with open(temporal, 'wb') as archivo:
+            pickle.dump(self, archivo, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def cargar(cls, ruta=RUTA_INDICE_COMUNIDADES):
+        """Carga un índice previamente guardado con `guardar`"""
+        with open(ruta, 'rb') as archivo:
+            indice = pickle.load(archivo)
+        if not isinstance(indice, cls):
+            raise TypeError(f"El archivo {ruta} no contiene un {cls.__name__}")
+        return indice
+
+
+def calcular_firma(lat, lon, ids):
+    """
+    Huella SHA-256 de las coordenadas e IDs usada para validar índices persistidos.
+    Los enteros se normalizan a int64: la base compacta del dashboard guarda los IDs
+    en int32 y el análisis los lee en int64, y ambos comparten el mismo índice.
+    """
+    h = hashlib.sha256()
+    for arreglo in (lat, lon, ids):
+        arreglo = np.asarray(arreglo)
+        if arreglo.dtype.kind in 'iu':
+            arreglo = arreglo.astype(np.int64)
+        if arreglo.dtype == object:
+            h.update('\x1f'.join(map(str, arreglo)).encode('utf-8'))
+        else:
+            h.update(np.ascontiguousarray(arreglo).tobytes())
+    return h.hexdigest()
+
+
+def cargar_o_construir_indice(comunidades_df, ruta=RUTA_INDICE_COMUNIDADES, metodo='geodesico'):
+    """
+    Reutiliza el índice guardado en `ruta` si corresponde a las mismas comunidades
+    (misma firma y método); en caso contrario lo reconstruye y lo guarda.
+    """
+    lat = comunidades_df['y'].to_numpy(dtype=np.float64)
+    lon = comunidades_df['x'].to_numpy(dtype=np.float64)
+    firma = calcular_firma(lat, lon, comunidades_df['ID'].to_numpy())
+
+    if os.path.exists(ruta):
+        try:
+            indice = IndiceEspacial.cargar(ruta)
+            if indice.firma == firma and indice.metodo == metodo:
+                return indice
+            registro.info("El índice de %s corresponde a otras comunidades o a otro método: se reconstruye", ruta)
+        except ERRORES_INDICE_GUARDADO as error:
+            registro.warning("No se pudo cargar el índice de %s (%s: %s): se reconstruye",
+                             ruta, type(error).__name__, error)
+
+    indice = IndiceEspacial.desde_comunidades(comunidades_df, metodo)
+    try:
+        indice.guardar(ruta)
+    except OSError as error:
+        registro.warning("No se pudo guardar el índice en %s: %s", ruta, error)
+    return indice
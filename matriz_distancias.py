@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Matriz dispersa de distancias granjas × comunidades, persistida por el análisis.
+
+El análisis calcula distancias y descarta todas salvo las 10 primeras por granja;
+aquí se guardan las `k` comunidades más cercanas de cada granja (y/o las que están
+dentro de `radio_km`) como una matriz CSR: fila = granja, columna = posición de la
+comunidad. Cada fila se guarda ordenada por distancia, así que el top-k de
+cualquier k <= k guardado es un prefijo de la fila.
+
+Los componentes se escriben como .npy sin comprimir en un directorio, para que el
+dashboard los abra con memory-map y consulte top-k o radio sin recalcular
+geometría. `meta.json` registra k, radio, método y las huellas de los datos.
+
+Uso como paso de construcción:
+    python matriz_distancias.py --k 100 --radio 50
+"""
+import argparse
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from config_original import DATA_FILES
+from indice_espacial import cargar_o_construir_indice, calcular_firma
+
+DIRECTORIO_MATRIZ = DATA_FILES['matriz_distancias']
+K_MATRIZ = 100
+VERSION_MATRIZ = 1
+
+COMPONENTES = ('desplazamientos', 'posiciones', 'distancias', 'items', 'ids_comunidades')
+
+
+class MatrizDistancias:
+    """
+    Vecinos por granja en formato CSR. Las posiciones de `posiciones` indexan
+    `ids_comunidades`; las filas siguen el orden de `items`.
+    """
+
+    def __init__(self, desplazamientos, posiciones, distancias, items, ids_comunidades,
+                 k=None, radio_km=None, metodo='geodesico', firma_granjas=None, firma_comunidades=None):
+        self.desplazamientos = desplazamientos
+        self.posiciones = posiciones
+        self.distancias = distancias
+        self.items = items
+        self.ids_comunidades = ids_comunidades
+        self.k = k
+        self.radio_km = radio_km
+        self.metodo = metodo
+        self.firma_granjas = firma_granjas
+        self.firma_comunidades = firma_comunidades
+        self._fila_por_item = {item: fila for fila, item in enumerate(np.asarray(items).tolist())}
+
+    @classmethod
+    def desde_datos(cls, granjas_df, comunidades_df, k=K_MATRIZ, radio_km=None, indice=None, metodo='geodesico'):
+        """
+        Construye la matriz con el índice espacial de las comunidades: k vecinos más
+        cercanos (recortados a `radio_km` si se indica) o, con k=None, todos los
+        vecinos dentro de `radio_km`
+        """
+        if k is None and radio_km is None:
+            raise ValueError("Se requiere k, radio_km o ambos")
+        indice = cargar_o_construir_indice(comunidades_df, metodo=metodo) if indice is None else indice
+        lat, lon = granjas_df['Latitud'], granjas_df['Longitud']
+
+        if k is None:
+            desplazamientos, posiciones, distancias = indice.en_radio_csr(lat, lon, radio_km)
+        else:
+            posiciones, distancias = indice.k_vecinos(lat, lon, k)
+            dentro = np.ones(posiciones.shape, dtype=bool) if radio_km is None else distancias <= radio_km
+            desplazamientos = np.zeros(len(posiciones) + 1, dtype=np.int64)
+            np.cumsum(dentro.sum(axis=1), out=desplazamientos[1:])
+            posiciones, distancias = posiciones[dentro], distancias[dentro]
+
+        return cls(
+            desplazamientos, posiciones.astype(np.int32), distancias.astype(np.float32),
+            granjas_df['Item'].to_numpy(), comunidades_df['ID'].to_numpy(),
+            k=k, radio_km=radio_km, metodo=metodo,
+            firma_granjas=calcular_firma(lat.to_numpy(dtype=np.float64), lon.to_numpy(dtype=np.float64),
+                                         granjas_df['Item'].to_numpy()),
+            firma_comunidades=indice.firma
+        )
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def nnz(self):
+        return len(self.posiciones)
+
+    def fila(self, item):
+        """(posiciones, distancias_km) de una granja, ordenadas por distancia"""
+        fila = self._fila_por_item.get(item)
+        if fila is None:
+            raise KeyError(f"La granja {item} no está en la matriz de distancias")
+        inicio, fin = self.desplazamientos[fila], self.desplazamientos[fila + 1]
+        return self.posiciones[inicio:fin], self.distancias[inicio:fin]
+
+    def vecinos(self, item, k=None, radio_km=None):
+        """
+        IDs de comunidad y distancias (km) de las k más cercanas y/o dentro de
+        radio_km. Se rechazan las consultas que la matriz guardada no puede
+        responder completas; en una matriz por radio, el top-k se limita a las
+        comunidades dentro del radio guardado.
+        """
+        if k is not None and self.k is not None and k > self.k:
+            raise ValueError(f"La matriz guarda solo las {self.k} comunidades más cercanas por granja")
+        if radio_km is not None and not self.radio_completo(item, radio_km):
+            raise ValueError(f"La matriz no contiene todas las comunidades a {radio_km} km de la granja {item}")
+
+        posiciones, distancias = self.fila(item)
+        fin = len(posiciones)
+        if radio_km is not None:
+            fin = int(np.searchsorted(distancias, radio_km, side='right'))
+        if k is not None:
+            fin = min(fin, k)
+        return self.ids_comunidades[posiciones[:fin]], np.asarray(distancias[:fin], dtype=np.float64)
+
+    def radio_completo(self, item, radio_km):
+        """Indica si todas las comunidades dentro de `radio_km` de la granja están en la matriz"""
+        _, distancias = self.fila(item)
+        if self.k is not None and len(distancias) >= self.k:
+            # Fila llena: el radio es completo si el k-ésimo vecino ya está más lejos
+            return bool(distancias[-1] > radio_km)
+        return self.radio_km is None or radio_km <= self.radio_km
+
+    def como_sparse(self):
+        """csr_array (granjas × comunidades) que comparte los arreglos, sin copiarlos"""
+        return sparse.csr_array(
+            (self.distancias, self.posiciones, self.desplazamientos),
+            shape=(len(self.items), len(self.ids_comunidades)), copy=False
+        )
+
+    def guardar(self, directorio=DIRECTORIO_MATRIZ):
+        """
+        Escribe los componentes en un directorio temporal y lo reemplaza al final,
+        de modo que un lector nunca mezcla componentes de dos versiones
+        """
+        temporal = f"{directorio}.tmp{os.getpid()}"
+        shutil.rmtree(temporal, ignore_errors=True)
+        os.makedirs(temporal)
+        for nombre in COMPONENTES:
+            np.save(os.path.join(temporal, f"{nombre}.npy"), np.asarray(getattr(self, nombre)), allow_pickle=False)
+        meta = {
+            'version': VERSION_MATRIZ, 'k': self.k, 'radio_km': self.radio_km, 'metodo': self.metodo,
+            'firma_granjas': self.firma_granjas, 'firma_comunidades': self.firma_comunidades,
+            'granjas': len(self.items), 'comunidades': len(self.ids_comunidades), 'nnz': self.nnz
+        }
+        with open(os.path.join(temporal, 'meta.json'), 'w', encoding='utf-8') as archivo:
+            json.dump(meta, archivo, indent=2)
+
+        anterior = f"{directorio}.anterior{os.getpid()}"
+        if os.path.isdir(directorio):
+            os.replace(directorio, anterior)
+        os.replace(temporal, directorio)
+        shutil.rmtree(anterior, ignore_errors=True)
+
+    @classmethod
+    def cargar(cls, directorio=DIRECTORIO_MATRIZ, mmap=True):
+        """Abre una matriz guardada; con `mmap` los arreglos se leen bajo demanda del disco"""
+        with open(os.path.join(directorio, 'meta.json'), encoding='utf-8') as archivo:
+            meta = json.load(archivo)
+        if meta.get('version') != VERSION_MATRIZ:
+            raise ValueError(f"Versión de matriz no soportada en {directorio}")
+        componentes = {
+            nombre: np.load(os.path.join(directorio, f"{nombre}.npy"), mmap_mode='r' if mmap else None,
+                            allow_pickle=False)
+            for nombre in COMPONENTES
+        }
+        return cls(**componentes, k=meta['k'], radio_km=meta['radio_km'], metodo=meta['metodo'],
+                   firma_granjas=meta['firma_granjas'], firma_comunidades=meta['firma_comunidades'])
+
+
+def guardar_matriz(granjas_df, comunidades_df, k=K_MATRIZ, radio_km=None, indice=None,
+                   directorio=DIRECTORIO_MATRIZ):
+    """Construye y persiste la matriz; retorna la matriz construida"""
+    matriz = MatrizDistancias.desde_datos(granjas_df, comunidades_df, k, radio_km, indice)
+    matriz.guardar(directorio)
+    return matriz
+
+
+def parsear_argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="Matriz dispersa de distancias granjas × comunidades")
+    parser.add_argument('--granjas', default='Base granjas.csv')
+    parser.add_argument('--comunidades', default='Base comunidades energéticas.csv')
+    parser.add_argument('--k', type=int, default=K_MATRIZ,
+                        help=f"Comunidades más cercanas por granja (por defecto {K_MATRIZ}; 0 = solo radio)")
+    parser.add_argument('--radio', type=float, default=None, help="Distancia máxima en km")
+    parser.add_argument('--salida', default=DIRECTORIO_MATRIZ)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parsear_argumentos(argv)
+    granjas_df = pd.read_csv(args.granjas).dropna(subset=['Latitud', 'Longitud'])
+    comunidades_df = pd.read_csv(args.comunidades).dropna(subset=['x', 'y'])
+    matriz = guardar_matriz(granjas_df, comunidades_df, args.k or None, args.radio, directorio=args.salida)
+    print(f"💾 Matriz de distancias: {args.salida}/ ({len(matriz)} granjas, {matriz.nnz} distancias)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Instrumentación opcional de las rutas críticas del dashboard.
+
+Se activa con la variable de entorno PERFILADO_DASHBOARD=1 o abriendo el
+dashboard con `?perf=1`. Cuando está inactiva los decoradores solo llaman a
+la función original. Por cada rerun se registran:
+- tiempos de las funciones y bloques instrumentados
+- llamadas y ejecuciones reales de las funciones en caché (aciertos = llamadas - ejecuciones)
+- tamaños en bytes de los archivos y figuras generados
+
+El registro se muestra en un panel del sidebar y, si PERFILADO_ARCHIVO apunta a
+un archivo, cada rerun se agrega como una línea JSON (JSON lines).
+
+Uso típico con una función en caché:
+
+    @cronometrar("cargar_datos")
+    @st.cache_data
+    @marcar_ejecucion("cargar_datos")
+    def cargar_datos(): ...
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+VARIABLE_ACTIVACION = 'PERFILADO_DASHBOARD'
+VARIABLE_ARCHIVO = 'PERFILADO_ARCHIVO'
+MAX_RERUNS_EN_SESION = 20
+
+_local = threading.local()
+# Funciones decoradas con marcar_ejecucion: se reportan en la tabla de caché
+_FUNCIONES_EN_CACHE = set()
+
+
+def activo():
+    """Indica si la instrumentación está habilitada para esta ejecución"""
+    if os.environ.get(VARIABLE_ACTIVACION) == '1':
+        return True
+    # Fuera de `streamlit run` (scripts, benchmark) no hay parámetros de consulta
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return False
+    return st.query_params.get('perf') == '1'
+
+
+def _registro_actual():
+    registro = getattr(_local, 'registro', None)
+    if registro is None:
+        registro = _nuevo_registro()
+        _local.registro = registro
+    return registro
+
+
+def _nuevo_registro():
+    return {
+        'inicio': time.time(),
+        'tiempos': [],
+        'llamadas': {},
+        'ejecuciones': {},
+        'bytes': {}
+    }
+
+
+def iniciar_rerun():
+    """Descarta las mediciones anteriores; se llama al comienzo de cada rerun"""
+    _local.registro = _nuevo_registro()
+
+
+def registrar_tiempo(nombre, segundos):
+    _registro_actual()['tiempos'].append({'nombre': nombre, 'segundos': segundos})
+
+
+def registrar_bytes(nombre, tamano):
+    """
+    Registra el tamaño de un resultado. `tamano` puede ser un entero o una función
+    sin argumentos; en ese caso solo se evalúa si la instrumentación está activa.
+    """
+    if not activo():
+        return
+    bytes_registro = _registro_actual()['bytes']
+    bytes_registro[nombre] = int(tamano() if callable(tamano) else tamano)
+
+
+@contextmanager
+def cronometro(nombre):
+    """Mide el bloque `with` si la instrumentación está activa"""
+    if not activo():
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_tiempo(nombre, time.perf_counter() - inicio)
+
+
+def cronometrar(nombre=None):
+    """Decorador: mide cada llamada y la cuenta como llamada (para aciertos de caché)"""
+    def decorador(funcion):
+        etiqueta = nombre or funcion.__name__
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not activo():
+                return funcion(*args, **kwargs)
+            llamadas = _registro_actual()['llamadas']
+            llamadas[etiqueta] = llamadas.get(etiqueta, 0) + 1
+            with cronometro(etiqueta):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def marcar_ejecucion(nombre=None):
+    """
+    Decorador para el cuerpo de una función en caché (debajo de st.cache_*):
+    solo se ejecuta en un fallo de caché, así que cuenta las ejecuciones reales
+    """
+    def decorador(funcion):
+        etiqueta = nombre or funcion.__name__
+        _FUNCIONES_EN_CACHE.add(etiqueta)
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if activo():
+                ejecuciones = _registro_actual()['ejecuciones']
+                ejecuciones[etiqueta] = ejecuciones.get(etiqueta, 0) + 1
+            return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def resumen_rerun():
+    """Registro del rerun actual en forma serializable"""
+    registro = _registro_actual()
+    cache = {
+        nombre: {
+            'llamadas': llamadas,
+            'aciertos': llamadas - registro['ejecuciones'].get(nombre, 0),
+            'fallos': registro['ejecuciones'].get(nombre, 0)
+        }
+        for nombre, llamadas in registro['llamadas'].items()
+        if nombre in _FUNCIONES_EN_CACHE
+    }
+    return {
+        'marca_tiempo': registro['inicio'],
+        'total_s': time.time() - registro['inicio'],
+        'tiempos': registro['tiempos'],
+        'cache': cache,
+        'bytes': registro['bytes']
+    }
+
+
+def finalizar_rerun(sesion=None):
+    """Guarda el resumen del rerun en la sesión y, si se configuró, en el archivo JSON lines"""
+    if not activo():
+        return None
+    resumen = resumen_rerun()
+    if sesion is not None:
+        resumen['sesion'] = sesion
+
+    historial = st.session_state.setdefault('_perfilado_historial', [])
+    historial.append(resumen)
+    del historial[:-MAX_RERUNS_EN_SESION]
+
+    ruta = os.environ.get(VARIABLE_ARCHIVO)
+    if ruta:
+        try:
+            with open(ruta, 'a', encoding='utf-8') as archivo:
+                archivo.write(json.dumps(resumen, ensure_ascii=False) + '\n')
+        except OSError:
+            pass
+    return resumen
+
+
+def render_panel_perfilado():
+    """Panel del sidebar con las mediciones (solo visible con la instrumentación activa)"""
+    if not activo():
+        return
+    resumen = finalizar_rerun()
+    historial = st.session_state.get('_perfilado_historial', [])
+
+    with st.sidebar.expander("⏱️ Rendimiento", expanded=False):
+        st.caption(f"Rerun: {resumen['total_s'] * 1000:.0f} ms")
+        if resumen['tiempos']:
+            st.dataframe(
+                [{'Paso': t['nombre'], 'ms': round(t['segundos'] * 1000, 1)} for t in resumen['tiempos']],
+                hide_index=True
+            )
+        if resumen['cache']:
+            st.markdown("**Caché** (aciertos / llamadas)")
+            for nombre, cache in resumen['cache'].items():
+                st.text(f"{nombre}: {cache['aciertos']} / {cache['llamadas']}")
+        if resumen['bytes']:
+            st.markdown("**Tamaños**")
+            for nombre, tamano in resumen['bytes'].items():
+                st.text(f"{nombre}: {tamano / 1024:.1f} KB")
+        st.download_button(
+            "📥 Exportar JSON lines",
+            data='\n'.join(json.dumps(r, ensure_ascii=False) for r in historial),
+            file_name="perfilado_dashboard.jsonl",
+            mime="application/x-ndjson",
+            key="_perfilado_exportar"
+        )
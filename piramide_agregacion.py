@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Pirámide de agregación de comunidades por nivel de zoom.
+
+Para cada zoom se agrupan las comunidades en celdas de una grilla regular
+(CELDAS_POR_TESELA celdas por tesela de 256 px) con conteo, potencia e
+inversión sumadas y el centroide de la celda. Los mapas dibujan una burbuja
+por celda en zoom bajo, así el costo depende del número de celdas en pantalla
+y no del tamaño del conjunto de datos; los puntos individuales solo se
+dibujan al acercarse (zoom > ZOOM_PUNTOS_INDIVIDUALES).
+
+Uso como paso de construcción:
+    python piramide_agregacion.py
+"""
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+from cache_columnar import DIRECTORIO_CACHE, leer_csv_cacheado
+from capas_mapa import comunidades_en_colombia
+from config_original import DATA_FILES, ESQUEMA_COMUNIDADES
+
+ZOOMS_PIRAMIDE = tuple(range(4, 9))
+ZOOM_PUNTOS_INDIVIDUALES = ZOOMS_PIRAMIDE[-1]
+CELDAS_POR_TESELA = 4
+
+COLUMNAS_PIRAMIDE = ['lat', 'lon', 'conteo', 'potencia_kwp', 'inversion']
+COLUMNAS_FIRMA = ['ID', 'x', 'y', 'Potencia Estimada kWp', 'Inversión Estimada']
+
+RUTA_PIRAMIDE_COMUNIDADES = os.path.join(DIRECTORIO_CACHE, 'piramide_comunidades.npz')
+
+
+def tamano_celda(zoom):
+    """Lado de la celda en grados para un nivel de zoom"""
+    return 360.0 / (2 ** zoom) / CELDAS_POR_TESELA
+
+
+def firma_comunidades(comunidades_df):
+    """Huella de las columnas que determinan la pirámide"""
+    huellas = pd.util.hash_pandas_object(comunidades_df[COLUMNAS_FIRMA], index=False)
+    return hashlib.sha256(huellas.to_numpy().tobytes()).hexdigest()
+
+
+def agregar_en_grilla(lat, lon, potencia, inversion, zoom):
+    """
+    Agrega los puntos en la grilla del zoom indicado.
+    Retorna un arreglo (n_celdas, 5) con las columnas COLUMNAS_PIRAMIDE.
+    """
+    tamano = tamano_celda(zoom)
+    fila = np.floor((lat + 90.0) / tamano).astype(np.int64)
+    columna = np.floor((lon + 180.0) / tamano).astype(np.int64)
+    clave = fila * (int(360.0 / tamano) + 1) + columna
+    _, celda, conteo = np.unique(clave, return_inverse=True, return_counts=True)
+    return np.column_stack((
+        np.bincount(celda, lat) / conteo,
+        np.bincount(celda, lon) / conteo,
+        conteo,
+        np.bincount(celda, potencia),
+        np.bincount(celda, inversion)
+    ))
+
+
+class PiramideAgregacion:
+    """Niveles de agregación por zoom de un conjunto de comunidades"""
+
+    def __init__(self, niveles, firma):
+        self.niveles = niveles
+        self.firma = firma
+
+    @classmethod
+    def desde_comunidades(cls, comunidades_df, zooms=ZOOMS_PIRAMIDE):
+        validas = comunidades_en_colombia(comunidades_df)
+        lat = validas['y'].to_numpy(dtype=np.float64)
+        lon = validas['x'].to_numpy(dtype=np.float64)
+        potencia = pd.to_numeric(validas['Potencia Estimada kWp'], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+        inversion = pd.to_numeric(validas['Inversión Estimada'], errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+        niveles = {zoom: agregar_en_grilla(lat, lon, potencia, inversion, zoom) for zoom in zooms}
+        return cls(niveles, firma_comunidades(comunidades_df))
+
+    @property
+    def zooms(self):
+        return sorted(self.niveles)
+
+    def nivel(self, zoom):
+        """Celdas del nivel más cercano a `zoom` como DataFrame"""
+        zoom = min(max(int(zoom), self.zooms[0]), self.zooms[-1])
+        return pd.DataFrame(self.niveles[zoom], columns=COLUMNAS_PIRAMIDE)
+
+    def guardar(self, ruta=RUTA_PIRAMIDE_COMUNIDADES):
+        """Persiste la pirámide como .npz (escritura atómica)"""
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        temporal = f"{ruta}.tmp{os.getpid()}"
+        with open(temporal, 'wb') as archivo:
+            np.savez_compressed(
+                archivo,
+                firma=np.array(self.firma),
+                **{f"z{zoom}": celdas for zoom, celdas in self.niveles.items()}
+            )
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def cargar(cls, ruta=RUTA_PIRAMIDE_COMUNIDADES):
+        """Carga una pirámide guardada con `guardar`"""
+        with np.load(ruta, allow_pickle=False) as datos:
+            niveles = {int(clave[1:]): datos[clave] for clave in datos.files if clave.startswith('z')}
+            return cls(niveles, str(datos['firma']))
+
+
+def cargar_o_construir_piramide(comunidades_df, ruta=RUTA_PIRAMIDE_COMUNIDADES):
+    """
+    Reutiliza la pirámide guardada si corresponde a las mismas comunidades;
+    en caso contrario la reconstruye y la guarda.
+    """
+    firma = firma_comunidades(comunidades_df)
+    if os.path.exists(ruta):
+        try:
+            piramide = PiramideAgregacion.cargar(ruta)
+            if piramide.firma == firma and piramide.zooms == list(ZOOMS_PIRAMIDE):
+                return piramide
+        except (OSError, ValueError, KeyError):
+            pass
+
+    piramide = PiramideAgregacion.desde_comunidades(comunidades_df)
+    try:
+        piramide.guardar(ruta)
+    except OSError:
+        pass
+    return piramide
+
+
+def main():
+    """Construye (o valida) la pirámide de la base de comunidades"""
+    # Mismos tipos que el dashboard, para que la firma coincida con la que calcula al cargar
+    comunidades = leer_csv_cacheado(DATA_FILES['comunidades'], esquema=ESQUEMA_COMUNIDADES)
+    piramide = cargar_o_construir_piramide(comunidades)
+    print(f"💾 Pirámide de agregación: {RUTA_PIRAMIDE_COMUNIDADES}")
+    for zoom in piramide.zooms:
+        print(f"   Zoom {zoom}: {len(piramide.niveles[zoom])} celdas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Recalculo incremental del análisis de proximidad.
+
+Cada ejecución guarda un manifiesto con la huella de cada granja (por Item) y de
+cada comunidad (por ID). La ejecución siguiente compara las entradas contra ese
+manifiesto y solo recalcula las granjas afectadas:
+- granjas nuevas o con coordenadas/atributos modificados
+- granjas cuyo top-k incluye una comunidad eliminada, movida o modificada
+- granjas con una comunidad nueva (o movida) a una distancia menor o igual a su
+  k-ésima comunidad actual, que actúa como radio de poda
+Las salidas CSV se parchean reemplazando únicamente las filas de esas granjas.
+"""
+import json
+import os
+import numpy as np
+import pandas as pd
+from config_original import DATA_FILES
+from distancias import bloques_distancias_km
+from versiones_resultados import ruta_resultado
+
+RUTA_MANIFIESTO = 'manifiesto_proximidad.json'
+RUTA_HUELLAS_COMUNIDADES = 'manifiesto_proximidad_comunidades.npz'
+VERSION_MANIFIESTO = 1
+
+# Salidas previas que se parchean (las demás salidas versionadas se recalculan completas)
+CLAVES_PARCHEADAS = ('granjas_actualizadas', 'estadisticas', 'resumen_detallado')
+
+# Columnas que definen cada huella
+COLUMNAS_HUELLA_GRANJA = ['Latitud', 'Longitud', 'Departamento', 'Municipio']
+COLUMNAS_COORDENADAS_COMUNIDAD = ['y', 'x']
+COLUMNAS_ATRIBUTOS_COMUNIDAD = [
+    'Nombre de la comunidad', 'Departamento', 'Municipio',
+    'Potencia Estimada kWp', 'Inversión Estimada'
+]
+
+
+def huellas_filas(df, columnas):
+    """Huella de 64 bits por fila (vectorizada) de las columnas indicadas"""
+    return pd.util.hash_pandas_object(df[columnas], index=False).to_numpy(dtype=np.uint64)
+
+
+def _a_json(valor):
+    return valor.item() if hasattr(valor, 'item') else valor
+
+
+def _escribir_atomico(ruta, escribir):
+    temporal = f"{ruta}.tmp{os.getpid()}"
+    escribir(temporal)
+    os.replace(temporal, ruta)
+
+
+def guardar_manifiesto(granjas_validas, comunidades_validas, resultados, n_cercanas, metodo,
+                       previo=None, ruta=RUTA_MANIFIESTO, ruta_huellas=RUTA_HUELLAS_COMUNIDADES):
+    """
+    Guarda el estado de la ejecución. Las granjas sin resultado nuevo conservan
+    su entrada del manifiesto `previo` (ejecuciones incrementales).
+    """
+    items = granjas_validas['Item'].astype(str).tolist()
+    huellas = dict(zip(items, huellas_filas(granjas_validas, COLUMNAS_HUELLA_GRANJA)))
+    entradas_previas = previo['granjas'] if previo else {}
+
+    entradas = {}
+    for resultado in resultados:
+        cercanas = resultado['Comunidades_Cercanas']
+        entradas[str(resultado['Item'])] = {
+            'huella': str(huellas[str(resultado['Item'])]),
+            'radio_km': cercanas[-1]['Distancia_km'] if cercanas else None,
+            'comunidades': [_a_json(com['ID_Comunidad']) for com in cercanas]
+        }
+    for item in items:
+        if item not in entradas and item in entradas_previas:
+            entradas[item] = entradas_previas[item]
+
+    manifiesto = {
+        'version': VERSION_MANIFIESTO,
+        'n_cercanas': n_cercanas,
+        'metodo': metodo,
+        'granjas': entradas
+    }
+    _escribir_atomico(ruta_huellas, lambda r: _guardar_huellas(comunidades_validas, r))
+    _escribir_atomico(ruta, lambda r: _guardar_json(manifiesto, r))
+
+
+def _guardar_json(datos, ruta):
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo, ensure_ascii=False)
+
+
+def _guardar_huellas(comunidades_df, ruta):
+    # np.savez agrega la extensión si falta; se escribe sobre un manejador abierto
+    with open(ruta, 'wb') as archivo:
+        np.savez(
+            archivo,
+            ids=comunidades_df['ID'].to_numpy(),
+            coordenadas=huellas_filas(comunidades_df, COLUMNAS_COORDENADAS_COMUNIDAD),
+            atributos=huellas_filas(comunidades_df, COLUMNAS_ATRIBUTOS_COMUNIDAD)
+        )
+
+
+def cargar_manifiesto(ruta=RUTA_MANIFIESTO, ruta_huellas=RUTA_HUELLAS_COMUNIDADES):
+    """Retorna (manifiesto, huellas_comunidades) o None si no existe o es ilegible"""
+    try:
+        with open(ruta, encoding='utf-8') as archivo:
+            manifiesto = json.load(archivo)
+        with np.load(ruta_huellas, allow_pickle=False) as datos:
+            huellas = pd.DataFrame(
+                {'coordenadas': datos['coordenadas'], 'atributos': datos['atributos']},
+                index=datos['ids']
+            )
+    except (OSError, ValueError, KeyError):
+        return None
+    if manifiesto.get('version') != VERSION_MANIFIESTO:
+        return None
+    return manifiesto, huellas
+
+
+def detectar_cambios(granjas_validas, comunidades_validas, n_cercanas, metodo):
+    """
+    Compara las entradas actuales con el manifiesto de la última ejecución.
+    Retorna None si se requiere un análisis completo; si no, un diccionario con
+    las granjas afectadas (Items como str) y el detalle de los cambios.
+    """
+    cargado = cargar_manifiesto()
+    if cargado is None:
+        return None
+    manifiesto, huellas_previas = cargado
+    if manifiesto.get('n_cercanas') != n_cercanas or manifiesto.get('metodo') != metodo:
+        return None
+    if not all(os.path.exists(ruta_resultado(clave)) for clave in CLAVES_PARCHEADAS):
+        return None
+
+    # Cambios en comunidades, por ID
+    actuales = pd.DataFrame({
+        'coordenadas': huellas_filas(comunidades_validas, COLUMNAS_COORDENADAS_COMUNIDAD),
+        'atributos': huellas_filas(comunidades_validas, COLUMNAS_ATRIBUTOS_COMUNIDAD),
+        'posicion': np.arange(len(comunidades_validas))
+    }, index=comunidades_validas['ID'].to_numpy())
+    comunes = actuales.index.intersection(huellas_previas.index)
+    agregadas = actuales.index.difference(huellas_previas.index)
+    eliminadas = huellas_previas.index.difference(actuales.index)
+    misma_posicion = (actuales.loc[comunes, 'coordenadas'].to_numpy()
+                      == huellas_previas.loc[comunes, 'coordenadas'].to_numpy())
+    mismos_atributos = (actuales.loc[comunes, 'atributos'].to_numpy()
+                        == huellas_previas.loc[comunes, 'atributos'].to_numpy())
+    movidas = comunes[~misma_posicion]
+    modificadas = comunes[misma_posicion & ~mismos_atributos]
+
+    # Granjas nuevas o modificadas
+    items = granjas_validas['Item'].astype(str).to_numpy()
+    huellas_granjas = huellas_filas(granjas_validas, COLUMNAS_HUELLA_GRANJA)
+    entradas = manifiesto['granjas']
+    afectadas = np.array([
+        item not in entradas or entradas[item]['huella'] != str(huella)
+        for item, huella in zip(items, huellas_granjas)
+    ], dtype=bool)
+    nuevas_o_modificadas = int(afectadas.sum())
+
+    # Granjas que pierden (o deben re-escribir) una de sus comunidades
+    salientes = set(map(_a_json, eliminadas)) | set(map(_a_json, movidas)) | set(map(_a_json, modificadas))
+    if salientes:
+        for i, item in enumerate(items):
+            if not afectadas[i] and salientes.intersection(entradas[item]['comunidades']):
+                afectadas[i] = True
+
+    # Granjas con una comunidad entrante dentro de su radio actual
+    entrantes = actuales.loc[agregadas.append(movidas), 'posicion'].to_numpy()
+    candidatas = np.flatnonzero(~afectadas)
+    if len(entrantes) and len(candidatas):
+        radios = np.array([
+            entradas[items[i]]['radio_km']
+            if len(entradas[items[i]]['comunidades']) >= n_cercanas else np.inf
+            for i in candidatas
+        ], dtype=np.float64)
+        lat_e = comunidades_validas['y'].to_numpy(dtype=np.float64)[entrantes]
+        lon_e = comunidades_validas['x'].to_numpy(dtype=np.float64)[entrantes]
+        for inicio, fin, bloque in bloques_distancias_km(
+            granjas_validas['Latitud'].to_numpy()[candidatas],
+            granjas_validas['Longitud'].to_numpy()[candidatas],
+            lat_e, lon_e, metodo
+        ):
+            invadidas = (bloque <= radios[inicio:fin, None]).any(axis=1)
+            afectadas[candidatas[inicio:fin][invadidas]] = True
+
+    return {
+        'manifiesto': manifiesto,
+        'afectadas': set(items[afectadas]),
+        'granjas_nuevas_o_modificadas': nuevas_o_modificadas,
+        'granjas_eliminadas': sorted(set(entradas) - set(items)),
+        'comunidades_agregadas': len(agregadas),
+        'comunidades_eliminadas': len(eliminadas),
+        'comunidades_movidas': len(movidas),
+        'comunidades_modificadas': len(modificadas)
+    }
+
+
+def _leer_salida(ruta):
+    # Con los mismos tipos que produce el análisis completo; 'round_trip' hace que
+    # los decimales de las filas conservadas se re-escriban exactamente igual
+    return pd.read_csv(ruta, float_precision='round_trip')
+
+
+def _combinar(previas, nuevas):
+    """Filas conservadas + recalculadas, con los tipos de las nuevas filas"""
+    if nuevas.empty:
+        return previas.reset_index(drop=True)
+    if previas.empty:
+        return nuevas.reset_index(drop=True)
+    previas = previas.astype({c: nuevas[c].dtype for c in nuevas.columns if c in previas.columns})
+    return pd.concat([previas, nuevas], ignore_index=True)
+
+
+def _ordenar_por_granja(df, columna_item, orden, columna_ranking=None):
+    claves = {'_orden': df[columna_item].astype(str).map(orden)}
+    if columna_ranking:
+        claves['_ranking'] = pd.to_numeric(df[columna_ranking])
+    df = df.assign(**claves).sort_values(list(claves), kind='stable')
+    return df.drop(columns=list(claves)).reset_index(drop=True)
+
+
+def parchear_salidas(granjas_df, granjas_validas, cambios, resultados, estadisticas_nuevas, resumen_nuevo,
+                     version_nueva=None):
+    """
+    Reemplaza en las salidas vigentes solo las filas de las granjas recalculadas y
+    elimina las granjas que ya no existen. Los tres CSV se escriben en
+    `version_nueva` (`versiones_resultados.NuevaVersion`, sin publicarla) o, sin
+    ella, en la raíz de forma atómica. Retorna (granjas_actualizadas, estadisticas).
+    """
+    items = granjas_validas['Item'].astype(str).tolist()
+    orden = {item: i for i, item in enumerate(items)}
+    conservar = set(items) - cambios['afectadas']
+
+    estadisticas_prev = _leer_salida(ruta_resultado('estadisticas'))
+    estadisticas = _combinar(
+        estadisticas_prev[estadisticas_prev['Item'].astype(str).isin(conservar)], estadisticas_nuevas
+    )
+    estadisticas = _ordenar_por_granja(estadisticas, 'Item', orden)
+
+    resumen_prev = _leer_salida(ruta_resultado('resumen_detallado'))
+    resumen = _combinar(resumen_prev[resumen_prev['Granja_Item'].astype(str).isin(conservar)], resumen_nuevo)
+    resumen = _ordenar_por_granja(resumen, 'Granja_Item', orden, 'Ranking')
+
+    entradas = cambios['manifiesto']['granjas']
+    ces_por_item = {item: ', '.join(str(i) for i in entradas[item]['comunidades']) for item in conservar}
+    ces_por_item.update({str(r['Item']): r['CEs_Relacionadas'] for r in resultados})
+    ces_actualizadas = granjas_df['Item'].astype(str).map(ces_por_item)
+    granjas_df = granjas_df.copy()
+    granjas_df['CEs Relacionadas'] = ces_actualizadas.where(
+        ces_actualizadas.notna(), granjas_df['CEs Relacionadas'].astype(object)
+    )
+
+    salidas = {'granjas_actualizadas': granjas_df, 'estadisticas': estadisticas, 'resumen_detallado': resumen}
+    for clave, df in salidas.items():
+        if version_nueva is not None:
+            version_nueva.escribir(clave, df)
+        else:
+            _escribir_atomico(DATA_FILES[clave], lambda r: df.to_csv(r, index=False))
+    return granjas_df, estadisticas
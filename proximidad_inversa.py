@@ -0,0 +1,50 @@
+"""
+Asignación inversa: la granja más cercana a cada comunidad energética.
+
+El análisis principal responde granja → comunidades; aquí se construye un índice
+espacial sobre las granjas (pocos puntos) y se consultan todas las comunidades en
+un solo lote con `IndiceEspacial.vecino_mas_cercano`. Las comunidades lejanas de
+toda granja son las que quedan sin atender.
+"""
+import numpy as np
+import pandas as pd
+from config_original import DATA_FILES
+from indice_espacial import IndiceEspacial
+
+RUTA_COMUNIDADES_ACTUALIZADA = DATA_FILES['comunidades_actualizadas']
+
+
+def granja_mas_cercana(comunidades_df, granjas_df, metodo='geodesico'):
+    """
+    Copia de `comunidades_df` con las columnas `Granja_Mas_Cercana` (Item) y
+    `Distancia_Granja_km`. Las comunidades sin coordenadas quedan vacías.
+    """
+    granjas = granjas_df.dropna(subset=['Latitud', 'Longitud'])
+    indice = IndiceEspacial(granjas['Latitud'], granjas['Longitud'], granjas['Item'], metodo)
+
+    lat = comunidades_df['y'].to_numpy(dtype=np.float64)
+    lon = comunidades_df['x'].to_numpy(dtype=np.float64)
+    validas = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+
+    posiciones = np.zeros(len(comunidades_df), dtype=np.int64)
+    distancias = np.full(len(comunidades_df), np.nan)
+    if len(indice) and len(validas):
+        posiciones[validas], distancias[validas] = indice.vecino_mas_cercano(lat[validas], lon[validas])
+
+    # Copia superficial: solo se agregan columnas, no se modifican las existentes
+    resultado = comunidades_df.copy(deep=False)
+    if len(indice):
+        items = pd.Series(indice.ids[posiciones], index=comunidades_df.index).convert_dtypes()
+        resultado['Granja_Mas_Cercana'] = items.mask(np.isnan(distancias))
+    else:
+        resultado['Granja_Mas_Cercana'] = pd.NA
+    resultado['Distancia_Granja_km'] = np.round(distancias, 2)
+    return resultado
+
+
+def guardar_comunidades_actualizadas(comunidades_df, granjas_df, ruta=RUTA_COMUNIDADES_ACTUALIZADA,
+                                     metodo='geodesico'):
+    """Calcula la granja más cercana de cada comunidad y guarda la base derivada"""
+    resultado = granja_mas_cercana(comunidades_df, granjas_df, metodo)
+    resultado.to_csv(ruta, index=False)
+    return resultado
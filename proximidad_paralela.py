@@ -0,0 +1,120 @@
+"""
+Cálculo paralelo de proximidades para conjuntos grandes de granjas.
+
+Las granjas se dividen en bloques que se procesan en un ProcessPoolExecutor.
+Las coordenadas de las comunidades se publican una sola vez en memoria
+compartida; cada proceso las adjunta sin copiarlas ni recibirlas por pickle.
+El índice espacial se construye una sola vez en el proceso principal y llega a
+cada trabajador en su inicializador: con `fork` se hereda sin copiarse y con
+`spawn` se serializa una vez por proceso (O(n) bytes, el árbol ya construido),
+en lugar de reconstruirlo en cada uno (O(n log n) por proceso).
+El resultado es determinista: los bloques se combinan en el orden original.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from distancias import matriz_distancias_km
+from indice_espacial import IndiceEspacial
+from seleccion_topk import k_menores
+
+# Estado de cada proceso trabajador (inicializado por _inicializar_trabajador)
+_MEMORIA = None
+_LAT = None
+_LON = None
+_INDICE = None
+
+
+def _inicializar_trabajador(nombre_memoria, n_comunidades, indice):
+    """Adjunta las coordenadas compartidas y guarda el índice recibido (o None)"""
+    global _MEMORIA, _LAT, _LON, _INDICE
+    _MEMORIA = shared_memory.SharedMemory(name=nombre_memoria)
+    coordenadas = np.ndarray((2, n_comunidades), dtype=np.float64, buffer=_MEMORIA.buf)
+    _LAT, _LON = coordenadas[0], coordenadas[1]
+    _INDICE = indice
+
+
+def _k_cercanas_por_bloques(lat, lon, lat_c, lon_c, n_cercanas, metodo, chunk_comunidades):
+    """
+    Top-k de comunidades recorriendo también las comunidades por bloques.
+    Los ganadores parciales se combinan en orden, así que los empates se
+    resuelven por posición igual que en el barrido completo.
+    """
+    n = min(n_cercanas, len(lat_c))
+    paso = chunk_comunidades or len(lat_c)
+    posiciones = np.empty((len(lat), 0), dtype=np.int64)
+    distancias = np.empty((len(lat), 0), dtype=np.float64)
+
+    for inicio in range(0, len(lat_c), paso):
+        fin = min(inicio + paso, len(lat_c))
+        bloque = matriz_distancias_km(lat, lon, lat_c[inicio:fin], lon_c[inicio:fin], metodo)
+        seleccion = k_menores(bloque, n)
+        distancias = np.concatenate(
+            (distancias, np.take_along_axis(bloque, seleccion, axis=1)), axis=1
+        )
+        posiciones = np.concatenate((posiciones, seleccion + inicio), axis=1)
+        ganadores = k_menores(distancias, n)
+        distancias = np.take_along_axis(distancias, ganadores, axis=1)
+        posiciones = np.take_along_axis(posiciones, ganadores, axis=1)
+
+    return posiciones, distancias
+
+
+def _procesar_bloque(lat, lon, n_cercanas, metodo, chunk_comunidades):
+    """Tarea ejecutada en cada proceso: retorna (posiciones, distancias) del bloque"""
+    if _INDICE is not None:
+        return _INDICE.k_vecinos(lat, lon, n_cercanas)
+    return _k_cercanas_por_bloques(lat, lon, _LAT, _LON, n_cercanas, metodo, chunk_comunidades)
+
+
+def calcular_proximidades_paralelo(granjas_df, comunidades_df, n_cercanas=10, metodo='geodesico',
+                                   workers=None, chunk_size=256, chunk_comunidades=None,
+                                   usar_indice=True, indice=None):
+    """
+    Calcula las n comunidades más cercanas a cada granja usando varios procesos.
+
+    Retorna (posiciones, distancias) de forma (n_granjas, n) con posiciones
+    relativas a `comunidades_df`. Con `usar_indice=False` cada bloque hace un
+    barrido completo, opcionalmente dividido en `chunk_comunidades` columnas.
+    `indice` (construido sobre `comunidades_df`) evita construirlo aquí.
+    """
+    workers = workers or os.cpu_count() or 1
+    lat_g = granjas_df['Latitud'].to_numpy(dtype=np.float64)
+    lon_g = granjas_df['Longitud'].to_numpy(dtype=np.float64)
+    n_comunidades = len(comunidades_df)
+    n = min(n_cercanas, n_comunidades)
+
+    if usar_indice and indice is None:
+        indice = IndiceEspacial.desde_comunidades(comunidades_df, metodo)
+
+    memoria = shared_memory.SharedMemory(create=True, size=max(1, 2 * n_comunidades * 8))
+    coordenadas = None
+    try:
+        coordenadas = np.ndarray((2, n_comunidades), dtype=np.float64, buffer=memoria.buf)
+        coordenadas[0] = comunidades_df['y'].to_numpy(dtype=np.float64)
+        coordenadas[1] = comunidades_df['x'].to_numpy(dtype=np.float64)
+
+        inicios = list(range(0, len(lat_g), chunk_size))
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_inicializar_trabajador,
+            initargs=(memoria.name, n_comunidades, indice if usar_indice else None)
+        ) as executor:
+            futuros = [
+                executor.submit(_procesar_bloque, lat_g[i:i + chunk_size], lon_g[i:i + chunk_size],
+                                n, metodo, chunk_comunidades)
+                for i in inicios
+            ]
+            # Se recogen en el orden de envío para que el resultado sea determinista
+            bloques = [futuro.result() for futuro in futuros]
+    finally:
+        # La vista debe soltarse antes de cerrar, o close() falla con BufferError
+        del coordenadas
+        memoria.close()
+        memoria.unlink()
+
+    if not bloques:
+        return np.empty((0, n), dtype=np.int64), np.empty((0, n), dtype=np.float64)
+    posiciones = np.concatenate([b[0] for b in bloques])
+    distancias = np.concatenate([b[1] for b in bloques])
+    return posiciones, distancias
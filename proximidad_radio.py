@@ -0,0 +1,114 @@
+"""
+Consultas por radio: todas las comunidades a R km o menos de cada granja.
+
+A diferencia del top-10, la cantidad de vecinos varía por granja, así que los
+resultados se manejan en formato CSR (desplazamientos + posiciones + distancias)
+sin materializar un registro por par. Para varios radios se consulta el índice
+una sola vez con el radio mayor: los vecinos de un radio menor son un prefijo de
+cada fila, porque las filas están ordenadas por distancia.
+
+Salidas (en la versión de `resultados/` que se está construyendo, ver
+`versiones_resultados`; se registran en su manifiesto):
+- vecinos_por_radio.csv: una fila por par granja-comunidad dentro del radio mayor,
+  con el radio más pequeño que la incluye
+- cobertura_por_radio.csv: por granja y radio, cantidad de comunidades y kWp/inversión
+- vecinos_por_radio.npz: la estructura CSR (IDs de comunidad y distancias)
+"""
+import numpy as np
+import pandas as pd
+from versiones_resultados import ruta_resultado
+
+RADIOS_POR_DEFECTO = (5, 10, 25)
+
+
+def vecinos_en_radio(granjas_df, indice, radio_km):
+    """
+    Comunidades a distancia <= radio_km de cada granja, en formato CSR:
+    (desplazamientos, posiciones, distancias_km). Las posiciones son relativas
+    a las comunidades con las que se construyó `indice`.
+    """
+    return indice.en_radio_csr(granjas_df['Latitud'], granjas_df['Longitud'], radio_km)
+
+
+def radio_minimo(distancias, radios):
+    """Radio más pequeño de `radios` (ordenados) que contiene cada distancia"""
+    radios = np.asarray(radios, dtype=np.float64)
+    return radios[np.searchsorted(radios, distancias, side='left')]
+
+
+def crear_vecinos_por_radio(granjas_df, comunidades_df, desplazamientos, posiciones, distancias, radios):
+    """Detalle granja-comunidad armado por columnas a partir de la estructura CSR"""
+    conteos = np.diff(desplazamientos)
+    return pd.DataFrame({
+        'Granja_Item': np.repeat(granjas_df['Item'].to_numpy(), conteos),
+        'Radio_km': radio_minimo(distancias, radios),
+        'Comunidad_ID': comunidades_df['ID'].to_numpy()[posiciones],
+        'Comunidad_Nombre': comunidades_df['Nombre de la comunidad'].to_numpy()[posiciones],
+        'Comunidad_Municipio': comunidades_df['Municipio'].to_numpy()[posiciones],
+        'Distancia_km': np.round(distancias, 2),
+    })
+
+
+def crear_cobertura_por_radio(granjas_df, comunidades_df, desplazamientos, posiciones, distancias, radios):
+    """
+    Cantidad de comunidades, kWp e inversión estimada dentro de cada radio por granja.
+    Las sumas se hacen con `np.bincount` (ponderado) sobre la fila CSR de cada par.
+    """
+    potencia = pd.to_numeric(comunidades_df['Potencia Estimada kWp'], errors='coerce').fillna(0).to_numpy()
+    inversion = pd.to_numeric(comunidades_df['Inversión Estimada'], errors='coerce').fillna(0).to_numpy()
+    n_granjas = len(granjas_df)
+    filas = np.repeat(np.arange(n_granjas), np.diff(desplazamientos))
+
+    coberturas = []
+    for radio in radios:
+        dentro = distancias <= radio
+        coberturas.append(pd.DataFrame({
+            'Item': granjas_df['Item'].to_numpy(),
+            'Departamento': granjas_df['Departamento'].to_numpy(),
+            'Municipio': granjas_df['Municipio'].to_numpy(),
+            'Radio_km': radio,
+            'Comunidades': np.bincount(filas[dentro], minlength=n_granjas),
+            'Potencia_kWp': np.bincount(filas[dentro], weights=potencia[posiciones[dentro]], minlength=n_granjas),
+            'Inversion_Estimada': np.bincount(filas[dentro], weights=inversion[posiciones[dentro]], minlength=n_granjas),
+        }))
+    return pd.concat(coberturas, ignore_index=True).sort_values(['Item', 'Radio_km'], kind='stable')
+
+
+def guardar_vecinos_csr(ruta, granjas_df, comunidades_df, desplazamientos, posiciones, distancias, radio_km):
+    """Guarda la estructura CSR con IDs de granja y de comunidad (no posiciones)"""
+    np.savez_compressed(
+        ruta,
+        items=granjas_df['Item'].to_numpy(),
+        desplazamientos=desplazamientos,
+        ids_comunidades=comunidades_df['ID'].to_numpy()[posiciones],
+        distancias=distancias.astype(np.float32),
+        radio_km=np.float64(radio_km)
+    )
+
+
+def cargar_vecinos_csr(ruta=None):
+    """
+    Retorna (items, desplazamientos, ids_comunidades, distancias, radio_km);
+    por defecto de la versión vigente
+    """
+    with np.load(ruta or ruta_resultado('vecinos_radio_csr'), allow_pickle=False) as datos:
+        return (datos['items'], datos['desplazamientos'], datos['ids_comunidades'],
+                datos['distancias'], float(datos['radio_km']))
+
+
+def analizar_radios(granjas_df, comunidades_df, indice, version, radios=RADIOS_POR_DEFECTO):
+    """
+    Consulta el índice con el radio mayor y escribe las tres salidas en `version`
+    (una `versiones_resultados.NuevaVersion`). Retorna (vecinos_df, cobertura_df).
+    """
+    radios = sorted(float(radio) for radio in radios)
+    desplazamientos, posiciones, distancias = vecinos_en_radio(granjas_df, indice, radios[-1])
+
+    vecinos_df = crear_vecinos_por_radio(granjas_df, comunidades_df, desplazamientos, posiciones, distancias, radios)
+    cobertura_df = crear_cobertura_por_radio(granjas_df, comunidades_df, desplazamientos, posiciones, distancias, radios)
+    version.escribir('vecinos_radio', vecinos_df)
+    version.escribir('cobertura_radio', cobertura_df)
+    version.escribir_archivo('vecinos_radio_csr', lambda ruta: guardar_vecinos_csr(
+        ruta, granjas_df, comunidades_df, desplazamientos, posiciones, distancias, radios[-1]
+    ))
+    return vecinos_df, cobertura_df
@@ -0,0 +1,67 @@
+"""
+Selección parcial de los k menores/mayores valores.
+
+Usa `np.argpartition` (O(n)) en lugar de ordenar todo el arreglo y solo ordena
+los k ganadores. Los empates se resuelven por posición, igual que un
+ordenamiento estable o `nsmallest`/`nlargest` de pandas con keep='first'.
+"""
+import numpy as np
+
+
+def k_menores(valores, k):
+    """
+    Posiciones de los k menores valores sobre el último eje, ordenadas.
+    Los NaN se consideran mayores que cualquier número.
+    """
+    valores = np.asarray(valores)
+    n = valores.shape[-1]
+    k = max(0, min(int(k), n))
+    if k == 0:
+        return np.empty(valores.shape[:-1] + (0,), dtype=np.int64)
+
+    if k == n:
+        return np.argsort(valores, axis=-1, kind='stable')
+
+    particion = np.argpartition(valores, k - 1, axis=-1)[..., :k]
+    seleccion = np.take_along_axis(valores, particion, axis=-1)
+
+    # Ordenar solo los k ganadores por (valor, posición)
+    orden = np.lexsort((particion, seleccion), axis=-1)
+    resultado = np.take_along_axis(particion, orden, axis=-1)
+
+    # Si hay empates con el k-ésimo fuera de la partición (o NaN dentro de ella),
+    # la partición no garantiza la menor posición: se resuelve con orden estable
+    umbral = np.take_along_axis(valores, resultado[..., -1:], axis=-1)
+    ambiguas = ((valores <= umbral).sum(axis=-1) > k) | np.isnan(umbral[..., 0])
+    if ambiguas.any():
+        resultado[ambiguas] = np.argsort(valores[ambiguas], axis=-1, kind='stable')[..., :k]
+    return resultado
+
+
+def k_mayores(valores, k):
+    """Posiciones de los k mayores valores sobre el último eje, ordenadas de mayor a menor"""
+    return k_menores(-np.asarray(valores, dtype=np.float64), k)
+
+
+class AcumuladorTopK:
+    """
+    Mantiene los k menores valores vistos a lo largo de varios lotes.
+    La memoria es O(k + tamaño del lote) sin importar cuántos candidatos se recorran.
+    """
+
+    def __init__(self, k):
+        self.k = int(k)
+        self.valores = np.empty(0, dtype=np.float64)
+        self.claves = np.empty(0, dtype=np.int64)
+
+    def agregar_lote(self, valores, claves):
+        """Incorpora un lote; ante empates se conservan los que llegaron primero"""
+        valores = np.concatenate((self.valores, np.asarray(valores, dtype=np.float64)))
+        claves = np.concatenate((self.claves, np.asarray(claves, dtype=np.int64)))
+        seleccion = k_menores(valores, self.k)
+        self.valores = valores[seleccion]
+        self.claves = claves[seleccion]
+
+    def resultado(self):
+        """Retorna (valores, claves) ordenados de menor a mayor"""
+        return self.valores.copy(), self.claves.copy()
@@ -0,0 +1,60 @@
+"""
+Configuración común de las pruebas.
+
+Los módulos del proyecto están en la raíz del repositorio (sin paquete), así
+que se agrega al path para poder importarlos con `pytest` desde cualquier lugar.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+
+@pytest.fixture
+def en_directorio_temporal(tmp_path, monkeypatch):
+    """Ejecuta la prueba con un directorio de trabajo vacío (las rutas por defecto son relativas)"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def comunidades():
+    """Comunidades sintéticas con las columnas de la base real, agrupadas como en Colombia"""
+    generador = np.random.default_rng(7)
+    n = 600
+    centros = generador.uniform([-4.0, -79.0], [12.0, -67.0], size=(12, 2))
+    grupo = generador.integers(0, len(centros), n)
+    coordenadas = centros[grupo] + generador.normal(0, 0.4, size=(n, 2))
+    return pd.DataFrame({
+        'ID': np.arange(1, n + 1),
+        'Nombre de la comunidad': [f"Comunidad {i}" for i in range(1, n + 1)],
+        'Departamento': [f"Dep {g}" for g in grupo],
+        'Municipio': [f"Mun {g}" for g in grupo],
+        'Potencia Estimada kWp': generador.integers(5, 60, n).astype(float),
+        'Inversión Estimada': generador.integers(10, 500, n) * 1e6,
+        'x': coordenadas[:, 1],
+        'y': coordenadas[:, 0],
+    })
+
+
+@pytest.fixture
+def granjas():
+    """Granjas sintéticas con las columnas de `Base granjas.csv` usadas por el análisis"""
+    generador = np.random.default_rng(11)
+    n = 25
+    return pd.DataFrame({
+        'Item': np.arange(1, n + 1),
+        'CEs Relacionadas': np.nan,
+        'Longitud': generador.uniform(-78.5, -67.5, n),
+        'Latitud': generador.uniform(-3.5, 11.5, n),
+        'Departamento': [f"Dep {i % 5}" for i in range(n)],
+        'Municipio': [f"Mun {i % 7}" for i in range(n)],
+        'Potencia  KW': generador.integers(50, 500, n).astype(float),
+        'Numero de comunidades': generador.integers(1, 10, n),
+    })
@@ -0,0 +1,161 @@
+import itertools
+import os
+
+import pytest
+
+import cache_disco
+from cache_disco import CacheArtefactos, artefacto_en_disco, cache_artefactos, clave_artefacto
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    """Accesos con marcas de tiempo estrictamente crecientes: el orden LRU no depende de la resolución del reloj"""
+    marcas = itertools.count(1_000_000)
+    monkeypatch.setattr(cache_disco.time, 'time', lambda: float(next(marcas)))
+
+
+@pytest.fixture
+def cache(tmp_path, reloj):
+    return CacheArtefactos(str(tmp_path / 'artefactos'), tamano_maximo=1000)
+
+
+def _bloque(letra, tamano=300):
+    return letra.encode('ascii') * tamano
+
+
+def _blobs(cache):
+    raiz = os.path.join(cache.directorio, 'blobs')
+    return sorted(nombre for _, _, nombres in os.walk(raiz) for nombre in nombres)
+
+
+def test_desalojo_lru_respeta_el_tamano_maximo(cache):
+    for letra in 'abc':
+        cache.guardar_bytes(letra, _bloque(letra), 'bin')
+    assert cache.estadisticas()['bytes'] == 900
+
+    # Leer 'a' la vuelve la más reciente: al agregar 'd' se desaloja 'b'
+    assert cache.leer('a') == _bloque('a')
+    cache.guardar_bytes('d', _bloque('d'), 'bin')
+    assert cache.leer('b') is None
+    assert [cache.leer(clave) for clave in 'acd'] == [_bloque(letra) for letra in 'acd']
+    assert cache.estadisticas()['bytes'] == 900
+    assert len(_blobs(cache)) == 3
+
+
+def test_desalojo_conserva_la_entrada_recien_guardada(cache):
+    cache.guardar_bytes('pequeno', _bloque('a'), 'bin')
+    cache.guardar_bytes('grande', _bloque('b', 1500), 'bin')
+    # Más grande que el límite: se desaloja todo lo demás pero no la recién guardada
+    assert cache.leer('pequeno') is None
+    assert cache.leer('grande') == _bloque('b', 1500)
+
+
+def test_blob_compartido_se_elimina_solo_sin_referencias(cache):
+    cache.guardar_bytes('x', _bloque('a'), 'bin')
+    cache.guardar_bytes('y', _bloque('a'), 'bin')
+    assert len(_blobs(cache)) == 1
+    assert cache.estadisticas()['bytes'] == 300  # el contenido compartido cuenta una vez
+
+    cache.guardar_bytes('z', _bloque('z', 600), 'bin')
+    assert cache.leer('y') == _bloque('a')
+    cache.guardar_bytes('w', _bloque('w', 150), 'bin')
+    # Orden LRU: x, z, y, w. Quitar 'x' no libera nada (su blob lo usa 'y'), quitar 'z' sí
+    assert cache.leer('x') is None and cache.leer('z') is None
+    assert cache.leer('y') == _bloque('a')
+    assert cache.estadisticas()['bytes'] == 450
+    assert len(_blobs(cache)) == 2
+
+
+def test_blob_borrado_cuenta_como_fallo(cache):
+    cache.guardar_bytes('a', _bloque('a'), 'bin')
+    for nombre in _blobs(cache):
+        huella = nombre.split('.')[0]
+        os.remove(os.path.join(cache.directorio, 'blobs', huella[:2], nombre))
+    assert cache.leer('a') is None
+    assert cache.estadisticas()['bytes'] == 0
+
+
+def test_archivo_abierto_sobrevive_al_desalojo(cache):
+    cache.guardar_bytes('a', _bloque('a'), 'bin')
+    archivo = cache.abrir('a')
+    cache.guardar_bytes('b', _bloque('b', 900), 'bin')
+    with archivo:
+        assert archivo.read() == _bloque('a')
+    assert cache.leer('a') is None
+
+
+def test_obtener_bytes_genera_una_sola_vez(cache):
+    llamadas = []
+
+    def crear():
+        llamadas.append(1)
+        return b'contenido'
+
+    for _ in range(3):
+        assert cache.obtener_bytes('espacio', 'v1', {'n': 1}, crear) == b'contenido'
+    assert cache.obtener_bytes('espacio', 'v2', {'n': 1}, crear) == b'contenido'
+    assert len(llamadas) == 2
+    assert cache.estadisticas()['espacios']['espacio'] == {'entradas': 2, 'blobs': 1, 'bytes': 18}
+
+    cache.vaciar()
+    assert _blobs(cache) == [] and cache.estadisticas()['bytes'] == 0
+
+
+def test_clave_depende_de_espacio_version_y_parametros():
+    base = clave_artefacto('mapa', 'v1', {'k': 10, 'radios': [5, 10]})
+    assert base == clave_artefacto('mapa', 'v1', {'radios': [5, 10], 'k': 10})
+    assert base != clave_artefacto('mapa', 'v2', {'k': 10, 'radios': [5, 10]})
+    assert base != clave_artefacto('figura', 'v1', {'k': 10, 'radios': [5, 10]})
+    assert base != clave_artefacto('mapa', 'v1', {'k': 11, 'radios': [5, 10]})
+
+
+@pytest.fixture
+def cache_compartida(en_directorio_temporal, reloj):
+    cache_artefactos.cache_clear()
+    yield cache_artefactos()
+    cache_artefactos.cache_clear()
+
+
+def test_decorador_reutiliza_por_version_y_parametros(cache_compartida):
+    llamadas = []
+
+    @artefacto_en_disco('prueba_html', 'html')
+    def generar(version, titulo, n=3):
+        llamadas.append((version, titulo, n))
+        return f"<h1>{titulo}</h1>" * n
+
+    assert generar('v1', 'a') == generar('v1', 'a') == generar(version='v1', titulo='a', n=3)
+    assert generar('v1', 'a', n=2) == '<h1>a</h1>' * 2
+    generar('v2', 'a')
+    assert llamadas == [('v1', 'a', 3), ('v1', 'a', 2), ('v2', 'a', 3)]
+    assert cache_compartida.estadisticas()['espacios']['prueba_html']['entradas'] == 3
+
+
+def test_pickle_solo_desde_directorio_privado(cache_compartida):
+    llamadas = []
+
+    @artefacto_en_disco('prueba_pickle', 'folium')
+    def generar(version):
+        llamadas.append(version)
+        return {'mapa': version}
+
+    assert generar('v1') == generar('v1') == {'mapa': 'v1'}
+    assert len(llamadas) == 1
+    assert oct(os.stat(cache_compartida.directorio).st_mode & 0o777) == oct(0o700)
+
+    # Un blob que el grupo puede escribir no se deserializa: se regenera
+    for raiz, _, nombres in os.walk(os.path.join(cache_compartida.directorio, 'blobs')):
+        for nombre in nombres:
+            os.chmod(os.path.join(raiz, nombre), 0o664)
+    assert generar('v1') == {'mapa': 'v1'}
+    assert len(llamadas) == 2
+
+    # Directorio escribible por otros: ni se lee ni se escribe la caché
+    os.chmod(cache_compartida.directorio, 0o777)
+    try:
+        entradas = cache_compartida.estadisticas()['espacios']['prueba_pickle']['entradas']
+        assert generar('v1') == generar('v1') == {'mapa': 'v1'}
+        assert len(llamadas) == 4
+        assert cache_compartida.estadisticas()['espacios']['prueba_pickle']['entradas'] == entradas
+    finally:
+        os.chmod(cache_compartida.directorio, 0o700)
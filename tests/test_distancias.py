@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from geopy.distance import geodesic, great_circle
+
+from distancias import (PARES_TRAMO_VINCENTY, TOLERANCIA_GEODESICO_KM, RADIO_TIERRA_KM,
+                        bloques_distancias_km, distancia_haversine_km, distancia_vincenty_km,
+                        matriz_distancias_km, obtener_funcion_distancia)
+
+
+def _pares_aleatorios(n, semilla=0):
+    generador = np.random.default_rng(semilla)
+    lat = generador.uniform(-89.9, 89.9, (2, n))
+    lon = generador.uniform(-180, 180, (2, n))
+    return lat[0], lon[0], lat[1], lon[1]
+
+
+def _geopy(lat1, lon1, lat2, lon2):
+    return np.array([geodesic((a, b), (c, d)).kilometers for a, b, c, d in zip(lat1, lon1, lat2, lon2)])
+
+
+def test_vincenty_coincide_con_geopy_en_pares_aleatorios():
+    lat1, lon1, lat2, lon2 = _pares_aleatorios(2000)
+    np.testing.assert_allclose(distancia_vincenty_km(lat1, lon1, lat2, lon2),
+                               _geopy(lat1, lon1, lat2, lon2), rtol=0, atol=TOLERANCIA_GEODESICO_KM)
+
+
+@pytest.mark.parametrize("lat1, lon1, lat2, lon2", [
+    (0.0, 0.0, 0.5, 179.7),         # casi antipodal sobre el ecuador: Vincenty no converge
+    (0.0, 0.0, 0.0, 179.9),
+    (10.0, 20.0, -10.0, -160.0),    # antipodal exacto
+    (-45.0, 30.0, 45.0, -150.2),
+    (0.0, 0.0, 0.0, 90.0),          # línea ecuatorial (cos²α = 0)
+    (90.0, 0.0, -90.0, 0.0),        # polo a polo
+    (4.6, -74.1, 4.6, -74.1),       # mismo punto
+])
+def test_vincenty_casos_limite_coinciden_con_geopy(lat1, lon1, lat2, lon2):
+    esperado = geodesic((lat1, lon1), (lat2, lon2)).kilometers
+    assert distancia_vincenty_km(lat1, lon1, lat2, lon2) == pytest.approx(esperado, abs=TOLERANCIA_GEODESICO_KM)
+
+
+def test_vincenty_por_tramos_igual_que_de_una_vez():
+    n = PARES_TRAMO_VINCENTY + 1000
+    lat1, lon1, lat2, lon2 = _pares_aleatorios(n, semilla=3)
+    completo = distancia_vincenty_km(lat1, lon1, lat2, lon2)
+    for inicio in (0, PARES_TRAMO_VINCENTY - 5, n - 10):
+        tramo = slice(inicio, inicio + 10)
+        # Mismo resultado salvo redondeo de la vectorización (menos de un micrómetro)
+        np.testing.assert_allclose(completo[tramo],
+                                   distancia_vincenty_km(lat1[tramo], lon1[tramo], lat2[tramo], lon2[tramo]),
+                                   rtol=0, atol=1e-9)
+
+
+def test_vincenty_conserva_la_forma_con_broadcasting():
+    lat_a, lon_a = np.array([[4.0], [6.0]]), np.array([[-74.0], [-75.0]])
+    lat_b, lon_b = np.array([[1.0, 2.0, 3.0]]), np.array([[-70.0, -71.0, -72.0]])
+    distancias = distancia_vincenty_km(lat_a, lon_a, lat_b, lon_b)
+    assert distancias.shape == (2, 3)
+    assert distancias[1, 2] == pytest.approx(geodesic((6.0, -75.0), (3.0, -72.0)).kilometers,
+                                             abs=TOLERANCIA_GEODESICO_KM)
+
+
+def test_haversine_coincide_con_gran_circulo_de_geopy():
+    lat1, lon1, lat2, lon2 = _pares_aleatorios(500, semilla=1)
+    esperado = [great_circle((a, b), (c, d), radius=RADIO_TIERRA_KM).kilometers
+                for a, b, c, d in zip(lat1, lon1, lat2, lon2)]
+    np.testing.assert_allclose(distancia_haversine_km(lat1, lon1, lat2, lon2), esperado, rtol=1e-9)
+
+
+def test_matriz_y_bloques_coinciden_con_pares_individuales():
+    lat_a, lon_a, lat_b, lon_b = _pares_aleatorios(7, semilla=2)
+    matriz = matriz_distancias_km(lat_a, lon_a, lat_b[:5], lon_b[:5])
+    assert matriz.shape == (7, 5)
+    for i in range(7):
+        for j in range(5):
+            assert matriz[i, j] == pytest.approx(
+                geodesic((lat_a[i], lon_a[i]), (lat_b[j], lon_b[j])).kilometers, abs=TOLERANCIA_GEODESICO_KM)
+
+    bloques = list(bloques_distancias_km(lat_a, lon_a, lat_b[:5], lon_b[:5], max_pares=10))
+    assert [(inicio, fin) for inicio, fin, _ in bloques] == [(0, 2), (2, 4), (4, 6), (6, 7)]
+    np.testing.assert_allclose(np.vstack([bloque for _, _, bloque in bloques]), matriz, rtol=0, atol=1e-9)
+
+
+def test_metodo_desconocido():
+    with pytest.raises(ValueError, match="desconocido"):
+        obtener_funcion_distancia('manhattan')
@@ -0,0 +1,123 @@
+import logging
+import pickle
+
+import numpy as np
+import pytest
+
+from distancias import TOLERANCIA_GEODESICO_KM, matriz_distancias_km
+from indice_espacial import (MAX_PUNTOS_FUERZA_BRUTA, IndiceEspacial, calcular_firma,
+                             cargar_o_construir_indice)
+
+
+def _barrido_completo(lat, lon, lat_c, lon_c, metodo='geodesico'):
+    """Oráculo: matriz completa y orden estable (empates por posición)"""
+    matriz = matriz_distancias_km(lat, lon, lat_c, lon_c, metodo)
+    return np.argsort(matriz, axis=1, kind='stable'), matriz
+
+
+def _assert_distancias(actual, esperado):
+    # Vincenty itera hasta que converge todo el lote: el resultado varía con el lote
+    # por debajo de su tolerancia
+    np.testing.assert_allclose(actual, esperado, rtol=0, atol=TOLERANCIA_GEODESICO_KM)
+
+
+def _consultas(n, semilla=5):
+    generador = np.random.default_rng(semilla)
+    return generador.uniform(-4.5, 12.5, n), generador.uniform(-79.5, -66.5, n)
+
+
+@pytest.mark.parametrize("metodo", ['geodesico', 'haversine'])
+@pytest.mark.parametrize("k", [1, 10, 37])
+def test_k_vecinos_coincide_con_barrido_completo(comunidades, metodo, k):
+    indice = IndiceEspacial.desde_comunidades(comunidades, metodo)
+    lat, lon = _consultas(40)
+    orden, matriz = _barrido_completo(lat, lon, comunidades['y'], comunidades['x'], metodo)
+
+    posiciones, distancias = indice.k_vecinos(lat, lon, k)
+    np.testing.assert_array_equal(posiciones, orden[:, :k])
+    _assert_distancias(distancias, np.take_along_axis(matriz, orden[:, :k], axis=1))
+
+
+def test_k_vecinos_empates_por_posicion():
+    # Puntos duplicados: a igual distancia gana la posición menor, como el orden estable
+    lat = np.array([5.0, 5.0, 5.1, 5.0, 5.1, 6.0])
+    lon = np.array([-74.0, -74.0, -74.0, -74.0, -74.0, -74.0])
+    indice = IndiceEspacial(lat, lon)
+    posiciones, _ = indice.k_vecinos([5.0], [-74.0], 5)
+    np.testing.assert_array_equal(posiciones[0], [0, 1, 3, 2, 4])
+
+
+def test_k_mayor_que_los_puntos_y_sin_consultas(comunidades):
+    indice = IndiceEspacial.desde_comunidades(comunidades.head(5))
+    posiciones, distancias = indice.k_vecinos([4.0], [-74.0], 50)
+    assert posiciones.shape == distancias.shape == (1, 5)
+    assert sorted(posiciones[0]) == list(range(5))
+
+    posiciones, distancias = indice.k_vecinos([], [], 3)
+    assert posiciones.shape == (0, 3)
+
+
+@pytest.mark.parametrize("n_puntos", [3, MAX_PUNTOS_FUERZA_BRUTA, MAX_PUNTOS_FUERZA_BRUTA + 1, 600])
+def test_vecino_mas_cercano_coincide_con_barrido_completo(comunidades, n_puntos):
+    # Con pocos puntos se usa el producto punto, con muchos el árbol
+    puntos = comunidades.head(n_puntos)
+    indice = IndiceEspacial.desde_comunidades(puntos)
+    lat, lon = _consultas(300, semilla=9)
+    orden, matriz = _barrido_completo(lat, lon, puntos['y'], puntos['x'])
+
+    posiciones, distancias = indice.vecino_mas_cercano(lat, lon)
+    np.testing.assert_array_equal(posiciones, orden[:, 0])
+    _assert_distancias(distancias, matriz[np.arange(len(lat)), orden[:, 0]])
+
+
+@pytest.mark.parametrize("radio_km", [0.0, 5.0, 40.0, 250.0])
+def test_en_radio_coincide_con_barrido_completo(comunidades, radio_km):
+    indice = IndiceEspacial.desde_comunidades(comunidades)
+    lat, lon = _consultas(30, semilla=13)
+    orden, matriz = _barrido_completo(lat, lon, comunidades['y'], comunidades['x'])
+
+    desplazamientos, posiciones_csr, distancias_csr = indice.en_radio_csr(lat, lon, radio_km)
+    por_consulta = indice.en_radio(lat, lon, radio_km)
+    assert desplazamientos[0] == 0 and desplazamientos[-1] == len(posiciones_csr)
+    for i in range(len(lat)):
+        esperadas = orden[i][matriz[i, orden[i]] <= radio_km]
+        fila = slice(desplazamientos[i], desplazamientos[i + 1])
+        np.testing.assert_array_equal(posiciones_csr[fila], esperadas)
+        _assert_distancias(distancias_csr[fila], matriz[i, esperadas])
+        np.testing.assert_array_equal(por_consulta[i][0], esperadas)
+
+
+def test_firma_independiente_del_ancho_de_los_ids(comunidades):
+    lat, lon = comunidades['y'].to_numpy(), comunidades['x'].to_numpy()
+    ids = comunidades['ID'].to_numpy()
+    assert calcular_firma(lat, lon, ids.astype(np.int32)) == calcular_firma(lat, lon, ids.astype(np.int64))
+    assert calcular_firma(lat, lon, ids) != calcular_firma(lat, lon, ids[::-1])
+
+
+def test_indice_persistido_se_reutiliza_y_se_reconstruye(comunidades, tmp_path, caplog):
+    ruta = str(tmp_path / 'indice.pkl')
+    indice = cargar_o_construir_indice(comunidades, ruta)
+    reutilizado = cargar_o_construir_indice(comunidades, ruta)
+    assert reutilizado.firma == indice.firma and reutilizado is not indice
+
+    # Comunidades distintas: se reconstruye y se informa
+    with caplog.at_level(logging.INFO, logger='indice_espacial'):
+        otro = cargar_o_construir_indice(comunidades.head(100), ruta)
+    assert len(otro) == 100
+    assert "se reconstruye" in caplog.text
+
+    # Archivo corrupto: se reconstruye en lugar de fallar
+    with open(ruta, 'wb') as archivo:
+        archivo.write(b'no es un pickle')
+    caplog.clear()
+    with caplog.at_level(logging.WARNING, logger='indice_espacial'):
+        indice = cargar_o_construir_indice(comunidades, ruta)
+    assert len(indice) == len(comunidades)
+    assert "UnpicklingError" in caplog.text
+
+
+def test_indice_sobrevive_pickle(comunidades):
+    indice = IndiceEspacial.desde_comunidades(comunidades)
+    copia = pickle.loads(pickle.dumps(indice))
+    lat, lon = _consultas(10)
+    np.testing.assert_array_equal(copia.k_vecinos(lat, lon, 5)[0], indice.k_vecinos(lat, lon, 5)[0])
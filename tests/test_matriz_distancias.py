@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+import pytest
+
+from distancias import matriz_distancias_km
+from indice_espacial import IndiceEspacial
+from matriz_distancias import MatrizDistancias, guardar_matriz
+
+# Las distancias se guardan en float32 (< 0.1 m de error a escala de Colombia)
+TOLERANCIA_FLOAT32_KM = 1e-4
+
+
+@pytest.fixture
+def indice(comunidades):
+    """Índice en memoria: sin él `desde_datos` persiste uno en el directorio actual"""
+    return IndiceEspacial.desde_comunidades(comunidades)
+
+
+@pytest.fixture
+def oraculo(granjas, comunidades):
+    """Matriz completa granjas × comunidades y su orden estable por fila"""
+    matriz = matriz_distancias_km(granjas['Latitud'], granjas['Longitud'], comunidades['y'], comunidades['x'])
+    return matriz, np.argsort(matriz, axis=1, kind='stable')
+
+
+def test_vecinos_top_k_coinciden_con_barrido_completo(granjas, comunidades, oraculo, indice):
+    matriz, orden = oraculo
+    guardada = MatrizDistancias.desde_datos(granjas, comunidades, k=30, indice=indice)
+    ids = comunidades['ID'].to_numpy()
+    for fila, item in enumerate(granjas['Item']):
+        for k in (1, 10, 30):
+            ids_vecinos, distancias = guardada.vecinos(item, k=k)
+            np.testing.assert_array_equal(ids_vecinos, ids[orden[fila, :k]])
+            np.testing.assert_allclose(distancias, matriz[fila, orden[fila, :k]], atol=TOLERANCIA_FLOAT32_KM)
+
+    with pytest.raises(ValueError, match="solo las 30"):
+        guardada.vecinos(granjas['Item'].iloc[0], k=31)
+    with pytest.raises(KeyError):
+        guardada.fila(-1)
+
+
+@pytest.mark.parametrize("radio_km", [1.0, 10.0, 25.0, 60.0, 150.0, 400.0])
+def test_radio_completo_solo_si_la_fila_contiene_todo_el_radio(granjas, comunidades, oraculo, indice, radio_km):
+    matriz, _ = oraculo
+    k = 20
+    guardada = MatrizDistancias.desde_datos(granjas, comunidades, k=k, indice=indice)
+    ids = comunidades['ID'].to_numpy()
+    for fila, item in enumerate(granjas['Item']):
+        dentro = np.flatnonzero(matriz[fila] <= radio_km)
+        if guardada.radio_completo(item, radio_km):
+            ids_vecinos, _ = guardada.vecinos(item, radio_km=radio_km)
+            assert sorted(ids_vecinos) == sorted(ids[dentro])
+        else:
+            # Solo se declara incompleto si de verdad puede faltar algo: el k-ésimo cae en el radio
+            assert len(dentro) >= k
+            with pytest.raises(ValueError, match="no contiene todas"):
+                guardada.vecinos(item, radio_km=radio_km)
+
+
+def test_matriz_por_radio_coincide_con_barrido_completo(granjas, comunidades, oraculo, indice):
+    matriz, orden = oraculo
+    guardada = MatrizDistancias.desde_datos(granjas, comunidades, k=None, radio_km=50.0, indice=indice)
+    ids = comunidades['ID'].to_numpy()
+    for fila, item in enumerate(granjas['Item']):
+        esperadas = orden[fila][matriz[fila, orden[fila]] <= 50.0]
+        ids_vecinos, distancias = guardada.vecinos(item)
+        np.testing.assert_array_equal(ids_vecinos, ids[esperadas])
+        np.testing.assert_allclose(distancias, matriz[fila, esperadas], atol=TOLERANCIA_FLOAT32_KM)
+        assert guardada.radio_completo(item, 50.0) and guardada.radio_completo(item, 20.0)
+        assert not guardada.radio_completo(item, 50.5)
+
+
+def test_k_y_radio_recorta_cada_fila(granjas, comunidades, oraculo, indice):
+    matriz, orden = oraculo
+    guardada = MatrizDistancias.desde_datos(granjas, comunidades, k=15, radio_km=30.0, indice=indice)
+    for fila, item in enumerate(granjas['Item']):
+        esperadas = [p for p in orden[fila, :15] if matriz[fila, p] <= 30.0]
+        posiciones, _ = guardada.fila(item)
+        np.testing.assert_array_equal(posiciones, esperadas)
+
+
+def test_como_sparse_coincide_con_la_matriz_densa(granjas, comunidades, oraculo, indice):
+    matriz, orden = oraculo
+    dispersa = MatrizDistancias.desde_datos(granjas, comunidades, k=5, indice=indice).como_sparse().toarray()
+    for fila in range(len(granjas)):
+        columnas = orden[fila, :5]
+        np.testing.assert_allclose(dispersa[fila, columnas], matriz[fila, columnas], atol=TOLERANCIA_FLOAT32_KM)
+        assert np.count_nonzero(dispersa[fila]) == 5
+
+
+def test_guardar_y_cargar_con_memory_map(en_directorio_temporal, granjas, comunidades, indice):
+    construida = guardar_matriz(granjas, comunidades, k=12, indice=indice, directorio='matriz')
+    cargada = MatrizDistancias.cargar('matriz')
+    assert isinstance(cargada.distancias, np.memmap)
+    assert (cargada.k, cargada.radio_km, cargada.firma_comunidades) == (12, None, construida.firma_comunidades)
+    for item in granjas['Item']:
+        np.testing.assert_array_equal(cargada.vecinos(item)[0], construida.vecinos(item)[0])
+
+    # Reemplazar la matriz no deja temporales ni la versión anterior
+    guardar_matriz(granjas.head(3), comunidades, k=4, indice=indice, directorio='matriz')
+    assert len(MatrizDistancias.cargar('matriz', mmap=False)) == 3
+    assert sorted(os.listdir('.')) == ['matriz']
+
+
+def test_requiere_k_o_radio(granjas, comunidades):
+    with pytest.raises(ValueError, match="Se requiere"):
+        MatrizDistancias.desde_datos(granjas, comunidades, k=None, radio_km=None)
@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analisis_proximidad_simple import (calcular_estadisticas, crear_resumen_detallado,
+                                        encontrar_comunidades_cercanas)
+from config_original import DATA_FILES
+from proximidad_incremental import detectar_cambios, guardar_manifiesto, parchear_salidas
+
+N_CERCANAS = 10
+
+
+def _granjas_con_ces(granjas, resultados):
+    """Base de granjas con la columna 'CEs Relacionadas', como en el análisis completo"""
+    ces_por_item = {resultado['Item']: resultado['CEs_Relacionadas'] for resultado in resultados}
+    ces = granjas['Item'].map(ces_por_item)
+    granjas = granjas.copy()
+    granjas['CEs Relacionadas'] = ces.where(ces.notna(), granjas['CEs Relacionadas'].astype(object))
+    return granjas
+
+
+def _salidas_completas(granjas, comunidades):
+    """Oráculo: los tres CSV de un análisis completo, como texto"""
+    resultados = encontrar_comunidades_cercanas(granjas, comunidades, N_CERCANAS)
+    salidas = {
+        'granjas_actualizadas': _granjas_con_ces(granjas, resultados),
+        'estadisticas': calcular_estadisticas(resultados),
+        'resumen_detallado': crear_resumen_detallado(resultados),
+    }
+    return resultados, {clave: df.to_csv(index=False) for clave, df in salidas.items()}
+
+
+def _ejecutar_completo(granjas, comunidades):
+    resultados, textos = _salidas_completas(granjas, comunidades)
+    for clave, texto in textos.items():
+        with open(DATA_FILES[clave], 'w', encoding='utf-8', newline='') as archivo:
+            archivo.write(texto)
+    guardar_manifiesto(granjas, comunidades, resultados, N_CERCANAS, 'geodesico')
+    return resultados
+
+
+def _ejecutar_incremental(granjas, comunidades):
+    cambios = detectar_cambios(granjas, comunidades, N_CERCANAS, 'geodesico')
+    assert cambios is not None
+    afectadas = granjas[granjas['Item'].astype(str).isin(cambios['afectadas'])]
+    resultados = encontrar_comunidades_cercanas(afectadas, comunidades, N_CERCANAS)
+    parchear_salidas(granjas, granjas, cambios, resultados,
+                     calcular_estadisticas(resultados), crear_resumen_detallado(resultados))
+    guardar_manifiesto(granjas, comunidades, resultados, N_CERCANAS, 'geodesico', previo=cambios['manifiesto'])
+    return cambios
+
+
+def _top_k(resultados):
+    return {str(r['Item']): [c['ID_Comunidad'] for c in r['Comunidades_Cercanas']] for r in resultados}
+
+
+def _id_mas_cercana(granjas, posicion, comunidades):
+    resultado = encontrar_comunidades_cercanas(granjas.iloc[[posicion]], comunidades, 1)[0]
+    return resultado['Comunidades_Cercanas'][0]['ID_Comunidad']
+
+
+def _comunidad_nueva(comunidades, lat, lon, id_nuevo=10_000):
+    fila = comunidades.iloc[[0]].assign(ID=id_nuevo, y=lat, x=lon)
+    return pd.concat([comunidades, fila], ignore_index=True)
+
+
+def _agregar_junto_a_granja(granjas, comunidades):
+    granja = granjas.iloc[3]
+    return granjas, _comunidad_nueva(comunidades, granja['Latitud'] + 0.001, granja['Longitud'])
+
+
+def _agregar_lejos(granjas, comunidades):
+    # En el Pacífico sur: fuera del radio de cualquier granja
+    return granjas, _comunidad_nueva(comunidades, -40.0, -100.0)
+
+
+def _mover_comunidad_cercana(granjas, comunidades):
+    id_cercana = _id_mas_cercana(granjas, 5, comunidades)
+    comunidades = comunidades.copy()
+    comunidades.loc[comunidades['ID'] == id_cercana, ['y', 'x']] = [-40.0, -100.0]
+    return granjas, comunidades
+
+
+def _eliminar_comunidad_cercana(granjas, comunidades):
+    id_cercana = _id_mas_cercana(granjas, 8, comunidades)
+    return granjas, comunidades[comunidades['ID'] != id_cercana].reset_index(drop=True)
+
+
+def _modificar_atributos_comunidad(granjas, comunidades):
+    comunidades = comunidades.copy()
+    comunidades['Potencia Estimada kWp'] = comunidades['Potencia Estimada kWp'].astype(float)
+    id_cercana = _id_mas_cercana(granjas, 2, comunidades)
+    comunidades.loc[comunidades['ID'] == id_cercana, 'Potencia Estimada kWp'] = 999.5
+    return granjas, comunidades
+
+
+def _mover_y_eliminar_granjas(granjas, comunidades):
+    granjas = granjas.copy()
+    granjas.loc[0, ['Latitud', 'Longitud']] = [7.0, -73.0]
+    return granjas.drop(index=10).reset_index(drop=True), comunidades
+
+
+@pytest.mark.parametrize("cambiar", [
+    _agregar_junto_a_granja, _agregar_lejos, _mover_comunidad_cercana, _eliminar_comunidad_cercana,
+    _modificar_atributos_comunidad, _mover_y_eliminar_granjas,
+])
+def test_incremental_igual_que_analisis_completo(en_directorio_temporal, granjas, comunidades, cambiar):
+    previos = _ejecutar_completo(granjas, comunidades)
+    granjas_nuevas, comunidades_nuevas = cambiar(granjas, comunidades)
+
+    cambios = _ejecutar_incremental(granjas_nuevas, comunidades_nuevas)
+
+    resultados, esperados = _salidas_completas(granjas_nuevas, comunidades_nuevas)
+    for clave, esperado in esperados.items():
+        with open(DATA_FILES[clave], encoding='utf-8', newline='') as archivo:
+            assert archivo.read() == esperado, clave
+
+    # Toda granja cuyo top-k cambió tiene que estar entre las recalculadas
+    antes, despues = _top_k(previos), _top_k(resultados)
+    cambiadas = {item for item, ids in despues.items() if antes.get(item) != ids}
+    assert cambiadas <= cambios['afectadas']
+
+
+def test_sin_cambios_no_recalcula(en_directorio_temporal, granjas, comunidades):
+    _ejecutar_completo(granjas, comunidades)
+    cambios = detectar_cambios(granjas, comunidades, N_CERCANAS, 'geodesico')
+    assert cambios['afectadas'] == set()
+    assert cambios['comunidades_agregadas'] == cambios['comunidades_eliminadas'] == 0
+
+
+def test_detecta_cada_tipo_de_cambio(en_directorio_temporal, granjas, comunidades):
+    _ejecutar_completo(granjas, comunidades)
+
+    _, lejana = _agregar_lejos(granjas, comunidades)
+    cambios = detectar_cambios(granjas, lejana, N_CERCANAS, 'geodesico')
+    assert cambios['comunidades_agregadas'] == 1
+    assert cambios['afectadas'] == set()  # fuera del radio de poda de todas las granjas
+
+    _, cercana = _agregar_junto_a_granja(granjas, comunidades)
+    cambios = detectar_cambios(granjas, cercana, N_CERCANAS, 'geodesico')
+    assert cambios['comunidades_agregadas'] == 1
+    assert str(granjas['Item'].iloc[3]) in cambios['afectadas']
+
+    _, movidas = _mover_comunidad_cercana(granjas, comunidades)
+    cambios = detectar_cambios(granjas, movidas, N_CERCANAS, 'geodesico')
+    assert cambios['comunidades_movidas'] == 1
+    assert str(granjas['Item'].iloc[5]) in cambios['afectadas']
+
+    _, reducidas = _eliminar_comunidad_cercana(granjas, comunidades)
+    cambios = detectar_cambios(granjas, reducidas, N_CERCANAS, 'geodesico')
+    assert cambios['comunidades_eliminadas'] == 1
+    assert str(granjas['Item'].iloc[8]) in cambios['afectadas']
+
+
+def test_parametros_distintos_requieren_analisis_completo(en_directorio_temporal, granjas, comunidades):
+    assert detectar_cambios(granjas, comunidades, N_CERCANAS, 'geodesico') is None
+    _ejecutar_completo(granjas, comunidades)
+    assert detectar_cambios(granjas, comunidades, N_CERCANAS + 1, 'geodesico') is None
+    assert detectar_cambios(granjas, comunidades, N_CERCANAS, 'haversine') is None
+
+
+def test_parchear_conserva_tipos_numericos(en_directorio_temporal, granjas, comunidades):
+    _ejecutar_completo(granjas, comunidades)
+    _, cercana = _agregar_junto_a_granja(granjas, comunidades)
+    _ejecutar_incremental(granjas, cercana)
+    resumen = pd.read_csv(DATA_FILES['resumen_detallado'])
+    for columna in ('Ranking', 'Comunidad_ID', 'Distancia_km', 'Potencia_kWp'):
+        assert np.issubdtype(resumen[columna].dtype, np.number), columna
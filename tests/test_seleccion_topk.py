@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from seleccion_topk import AcumuladorTopK, k_mayores, k_menores
+
+
+def _oraculo_menores(valores, k):
+    """Orden estable completo: NaN al final y empates por posición"""
+    return np.argsort(valores, axis=-1, kind='stable')[..., :k]
+
+
+@pytest.mark.parametrize("k", [0, 1, 3, 10, 49, 50, 80])
+def test_k_menores_coincide_con_orden_estable(k):
+    valores = np.random.default_rng(0).normal(size=(20, 50))
+    np.testing.assert_array_equal(k_menores(valores, k), _oraculo_menores(valores, min(k, 50)))
+
+
+@pytest.mark.parametrize("k", [1, 2, 4, 5, 7])
+def test_k_menores_empates_por_posicion(k):
+    # Valores discretos: muchos empates en la frontera del k-ésimo
+    valores = np.random.default_rng(1).integers(0, 4, size=(200, 12)).astype(float)
+    np.testing.assert_array_equal(k_menores(valores, k), _oraculo_menores(valores, k))
+
+
+def test_k_menores_empates_en_la_frontera():
+    valores = np.array([3.0, 1.0, 2.0, 1.0, 2.0, 2.0, 0.0])
+    np.testing.assert_array_equal(k_menores(valores, 4), [6, 1, 3, 2])
+
+
+@pytest.mark.parametrize("k", [1, 3, 6, 9])
+def test_k_menores_nan_al_final(k):
+    valores = np.array([np.nan, 2.0, np.nan, 1.0, 2.0, np.nan, 0.5, np.inf, 1.0])
+    np.testing.assert_array_equal(k_menores(valores, k), _oraculo_menores(valores, k))
+
+
+def test_k_menores_igual_que_nsmallest_de_pandas():
+    valores = np.random.default_rng(2).integers(0, 20, 300).astype(float)
+    serie = pd.Series(valores)
+    np.testing.assert_array_equal(k_menores(valores, 25), serie.nsmallest(25, keep='first').index)
+
+
+def test_k_mayores_igual_que_nlargest_de_pandas():
+    valores = np.random.default_rng(3).integers(0, 20, 300)
+    serie = pd.Series(valores)
+    np.testing.assert_array_equal(k_mayores(valores, 25), serie.nlargest(25, keep='first').index)
+
+
+def test_acumulador_por_lotes_igual_que_de_una_vez():
+    generador = np.random.default_rng(4)
+    valores = generador.integers(0, 50, 1000).astype(float)
+    claves = np.arange(1000) * 10
+    acumulador = AcumuladorTopK(15)
+    for inicio in range(0, len(valores), 64):
+        acumulador.agregar_lote(valores[inicio:inicio + 64], claves[inicio:inicio + 64])
+
+    obtenidos, claves_obtenidas = acumulador.resultado()
+    esperadas = _oraculo_menores(valores, 15)
+    np.testing.assert_array_equal(obtenidos, valores[esperadas])
+    np.testing.assert_array_equal(claves_obtenidas, claves[esperadas])
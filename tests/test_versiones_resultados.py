@@ -0,0 +1,127 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import versiones_resultados
+from config_original import DATA_FILES
+from versiones_resultados import (ARCHIVO_ACTUAL, CLAVES_VERSIONADAS, NuevaVersion, activar_version,
+                                  copiar_version_actual, importar_version, leer_manifiesto,
+                                  podar_versiones, ruta_resultado, version_actual, versiones)
+
+
+def _publicar(directorio='resultados', valor=0, conservar=5, **extras):
+    """Publica una versión con todas las salidas obligatorias (CSV de una fila)"""
+    version = NuevaVersion({'valor': valor}, directorio=directorio)
+    for clave in CLAVES_VERSIONADAS:
+        if clave == 'matriz_distancias':
+            version.escribir_directorio(clave, lambda ruta: _escribir_directorio(ruta, valor))
+        else:
+            version.escribir(clave, pd.DataFrame({'valor': [valor]}))
+    for clave, df in extras.items():
+        version.escribir(clave, df)
+    return version.publicar(conservar)
+
+
+def _escribir_directorio(ruta, valor):
+    os.makedirs(ruta)
+    with open(os.path.join(ruta, 'meta.json'), 'w') as archivo:
+        json.dump({'valor': valor}, archivo)
+
+
+@pytest.fixture
+def versiones_distintas(monkeypatch):
+    """Nombres de versión distintos aunque se publiquen en el mismo segundo"""
+    contador = iter(range(10_000))
+    monkeypatch.setattr(versiones_resultados.time, 'strftime',
+                        lambda formato, *args: f"2026{next(contador):06d}" if formato.startswith('%Y%m%d') else '')
+
+
+def test_publicar_mueve_el_puntero_y_registra_el_manifiesto(en_directorio_temporal):
+    assert version_actual() is None
+    assert ruta_resultado('estadisticas') == DATA_FILES['estadisticas']  # sin versiones: la raíz
+
+    manifiesto = _publicar(valor=1, vecinos_radio=pd.DataFrame({'a': [1, 2]}))
+    assert version_actual() == manifiesto['version']
+    assert leer_manifiesto() == manifiesto
+    assert set(manifiesto['salidas']) == set(CLAVES_VERSIONADAS) | {'vecinos_radio'}
+    assert manifiesto['salidas']['vecinos_radio']['filas'] == 2
+    ruta = ruta_resultado('estadisticas')
+    assert ruta == os.path.join('resultados', manifiesto['version'], DATA_FILES['estadisticas'])
+    assert pd.read_csv(ruta)['valor'].tolist() == [1]
+    # Sin temporales visibles después de publicar
+    assert not [nombre for nombre in os.listdir('resultados') if nombre.startswith('.')]
+
+
+def test_version_incompleta_no_se_publica(en_directorio_temporal):
+    anterior = _publicar(valor=1)['version']
+    version = NuevaVersion({'valor': 2})
+    version.escribir('estadisticas', pd.DataFrame({'valor': [2]}))
+    with pytest.raises(ValueError, match="Faltan salidas"):
+        version.publicar()
+    version.descartar()
+    assert version_actual() == anterior
+    assert versiones() == [anterior]
+    assert not os.path.exists(version.temporal)
+
+
+def test_puntero_actual_es_atomico(en_directorio_temporal, versiones_distintas, monkeypatch):
+    anterior = _publicar(valor=1)['version']
+
+    # Si el reemplazo del puntero falla, ACTUAL sigue completo y apuntando a la versión anterior
+    reemplazar = os.replace
+
+    def fallar_en_actual(origen, destino):
+        if os.path.basename(destino) == ARCHIVO_ACTUAL:
+            raise OSError("disco lleno")
+        reemplazar(origen, destino)
+
+    monkeypatch.setattr(versiones_resultados.os, 'replace', fallar_en_actual)
+    with pytest.raises(OSError):
+        _publicar(valor=2)
+    assert version_actual() == anterior
+    with open(os.path.join('resultados', ARCHIVO_ACTUAL)) as archivo:
+        assert archivo.read() == anterior + '\n'
+
+
+def test_podar_conserva_la_version_vigente(en_directorio_temporal, versiones_distintas):
+    publicadas = [_publicar(valor=i, conservar=100)['version'] for i in range(6)]
+    assert versiones() == publicadas
+
+    # Se reactiva la más antigua (p. ej. un rollback) y se poda a 2
+    activar_version(publicadas[0], conservar=2)
+    assert version_actual() == publicadas[0]
+    assert versiones() == [publicadas[0]] + publicadas[-2:]
+
+    podar_versiones(conservar=1)
+    assert versiones() == [publicadas[0], publicadas[-1]]
+    assert version_actual() == publicadas[0]
+
+
+def test_publicar_poda_las_antiguas(en_directorio_temporal, versiones_distintas):
+    publicadas = [_publicar(valor=i, conservar=3)['version'] for i in range(5)]
+    assert versiones() == publicadas[-3:]
+    assert version_actual() == publicadas[-1]
+
+
+def test_importar_y_copiar_entre_directorios(en_directorio_temporal, versiones_distintas):
+    _publicar(valor=1)
+    trabajo = _publicar(directorio='trabajo', valor=2)['version']
+
+    assert importar_version('trabajo') == trabajo
+    assert version_actual() == trabajo
+    assert pd.read_csv(ruta_resultado('estadisticas'))['valor'].tolist() == [2]
+
+    assert copiar_version_actual('copia') == trabajo
+    assert version_actual('copia') == trabajo
+    with pytest.raises(ValueError, match="No hay una versión"):
+        importar_version('vacio')
+
+
+def test_puntero_a_version_inexistente(en_directorio_temporal):
+    os.makedirs('resultados')
+    with open(os.path.join('resultados', ARCHIVO_ACTUAL), 'w') as archivo:
+        archivo.write('20260101T000000-abcdef12\n')
+    assert version_actual() is None
+    assert leer_manifiesto() is None
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Recálculo del análisis de proximidad en segundo plano.
+
+`GestorTrabajos` recibe solicitudes de recálculo (desde el dashboard o desde la
+línea de comandos) y las ejecuta de a una en un hilo de trabajo con su propia
+cola. Cada trabajo corre `analisis_proximidad_simple.py` como subproceso en un
+directorio de preparación con copia de las entradas, de modo que:
+- el dashboard sigue leyendo los archivos actuales mientras se calcula
+- el avance se toma de los pasos que imprime el análisis ("1. Cargando datos...")
+- cancelar termina el subproceso (y sus procesos trabajadores con `--workers`,
+  que comparten su grupo de procesos) y descarta el directorio sin tocar las salidas
+- al terminar bien, las salidas auxiliares se mueven a su lugar con
+  `os.replace` y la versión publicada en `resultados/` se activa al final
+  (`versiones_resultados.importar_version`); se incrementa `generacion` y
+  `consumir_actualizacion()` lo informa una sola vez, para que el dashboard
+  invalide `st.cache_data` exactamente una vez
+
+Uso desde la línea de comandos (mismo flujo, en primer plano):
+    python trabajos.py --incremental --radios 5 10 25
+"""
+import argparse
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from config_original import DATA_FILES
+from indice_espacial import RUTA_INDICE_COMUNIDADES
+from proximidad_incremental import RUTA_MANIFIESTO, RUTA_HUELLAS_COMUNIDADES
+from versiones_resultados import (CLAVES_VERSIONADAS, DIRECTORIO_RESULTADOS, copiar_version_actual,
+                                  importar_version, version_actual)
+
+DIRECTORIO_TRABAJOS = '.trabajos'
+SCRIPT_ANALISIS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analisis_proximidad_simple.py')
+
+# Pasos numerados que imprime el análisis completo (el incremental termina en el 4)
+PASOS_ANALISIS = 6
+PATRON_PASO = re.compile(r'^(\d+)\.\s')
+LINEAS_REGISTRO = 200
+
+# Estado del modo incremental (además de la versión vigente de los resultados)
+SALIDAS_PREVIAS = [RUTA_MANIFIESTO, RUTA_HUELLAS_COMUNIDADES]
+
+# Salidas fuera de `resultados/`; la versión nueva se activa después de moverlas
+SALIDAS_ANALISIS = [
+    RUTA_INDICE_COMUNIDADES, RUTA_MANIFIESTO, RUTA_HUELLAS_COMUNIDADES,
+    'mapa_granjas_comunidades.html', 'analisis_distancias_barras.html', 'distribucion_distancias.html',
+]
+
+ESTADOS_FINALES = ('completado', 'cancelado', 'fallido')
+
+# El análisis corre en su propio grupo (POSIX) para poder terminar también los
+# procesos del ProcessPoolExecutor; en Windows solo se termina el subproceso
+GRUPO_PROPIO = {'start_new_session': True} if os.name == 'posix' else {}
+
+
+def argumentos_analisis(ruta_granjas='Base granjas.csv', incremental=False, radios=None, workers=1):
+    """Argumentos de línea de comandos de `analisis_proximidad_simple.py`"""
+    argumentos = ['--granjas', os.path.basename(ruta_granjas), '--workers', str(workers)]
+    if incremental:
+        argumentos.append('--incremental')
+    if radios:
+        argumentos += ['--radios', *[f"{radio:g}" for radio in radios]]
+    return argumentos
+
+
+def _terminar_grupo(proceso):
+    """SIGTERM al grupo del subproceso (creado con `GRUPO_PROPIO`), no solo al hijo directo"""
+    if not GRUPO_PROPIO:
+        proceso.terminate()
+        return
+    try:
+        os.killpg(proceso.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+
+
+def _reemplazar(origen, destino):
+    """Mueve `origen` sobre `destino`; los directorios se intercambian por renombre"""
+    if not os.path.isdir(origen):
+        os.replace(origen, destino)
+        return
+    anterior = f"{destino}.anterior{os.getpid()}"
+    if os.path.isdir(destino):
+        os.replace(destino, anterior)
+    os.replace(origen, destino)
+    shutil.rmtree(anterior, ignore_errors=True)
+
+
+class Trabajo:
+    """Estado de un recálculo: avance, últimas líneas de la salida y resultado"""
+
+    def __init__(self, argumentos, ruta_granjas, incremental):
+        self.id = uuid.uuid4().hex[:8]
+        self.argumentos = argumentos
+        self.ruta_granjas = ruta_granjas
+        self.incremental = incremental
+        self.estado = 'en_cola'
+        self.progreso = 0.0
+        self.mensaje = 'En cola'
+        self.registro = deque(maxlen=LINEAS_REGISTRO)
+        self.creado = time.time()
+        self.inicio = None
+        self.fin = None
+        self.error = None
+        self._proceso = None
+        self.version_previa = None
+        self.version = None
+        self._cancelado = threading.Event()
+
+    @property
+    def terminado(self):
+        return self.estado in ESTADOS_FINALES
+
+    @property
+    def duracion_s(self):
+        if self.inicio is None:
+            return 0.0
+        return (self.fin or time.time()) - self.inicio
+
+    def cancelar(self):
+        """Pide la cancelación; si ya está corriendo se termina el subproceso"""
+        self._cancelado.set()
+        proceso = self._proceso
+        if proceso is not None and proceso.poll() is None:
+            _terminar_grupo(proceso)
+
+    def _registrar_linea(self, linea):
+        linea = linea.rstrip()
+        if not linea:
+            return
+        self.registro.append(linea)
+        coincidencia = PATRON_PASO.match(linea)
+        if coincidencia:
+            self.progreso = min(int(coincidencia.group(1)) / (PASOS_ANALISIS + 1), 0.95)
+            self.mensaje = linea
+
+
+class GestorTrabajos:
+    """Cola local de recálculos, ejecutados de a uno en un hilo de trabajo"""
+
+    def __init__(self, directorio=DIRECTORIO_TRABAJOS, destino='.'):
+        self.directorio = directorio
+        self.destino = destino
+        self.trabajos = []
+        self.generacion = 0
+        self._pendiente_invalidar = False
+        self._bloqueo = threading.Lock()
+        self._ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='recalculo')
+
+    def enviar(self, ruta_granjas='Base granjas.csv', incremental=False, radios=None, workers=1):
+        """Encola un recálculo y retorna su `Trabajo`"""
+        trabajo = Trabajo(argumentos_analisis(ruta_granjas, incremental, radios, workers),
+                          ruta_granjas, incremental)
+        with self._bloqueo:
+            self.trabajos.append(trabajo)
+        self._ejecutor.submit(self._ejecutar, trabajo)
+        return trabajo
+
+    def actual(self):
+        """Último trabajo enviado (o None)"""
+        with self._bloqueo:
+            return self.trabajos[-1] if self.trabajos else None
+
+    def en_curso(self):
+        """Hay algún trabajo en cola o ejecutándose"""
+        with self._bloqueo:
+            return any(not trabajo.terminado for trabajo in self.trabajos)
+
+    def consumir_actualizacion(self):
+        """True una sola vez después de cada reemplazo de salidas"""
+        with self._bloqueo:
+            pendiente, self._pendiente_invalidar = self._pendiente_invalidar, False
+            return pendiente
+
+    def _preparar(self, trabajo):
+        preparacion = os.path.join(self.directorio, trabajo.id)
+        shutil.rmtree(preparacion, ignore_errors=True)
+        os.makedirs(preparacion)
+        entradas = [trabajo.ruta_granjas, DATA_FILES['comunidades'], RUTA_INDICE_COMUNIDADES]
+        resultados = os.path.join(self.destino, DIRECTORIO_RESULTADOS)
+        trabajo.version_previa = version_actual(resultados)
+        if trabajo.incremental:
+            entradas += SALIDAS_PREVIAS
+            if trabajo.version_previa is not None:
+                copiar_version_actual(os.path.join(preparacion, DIRECTORIO_RESULTADOS), resultados)
+            else:
+                entradas += [DATA_FILES[clave] for clave in CLAVES_VERSIONADAS]
+        for ruta in entradas:
+            origen = os.path.join(self.destino, ruta)
+            if os.path.isfile(origen):
+                # Copia (no enlace): el análisis reescribe algunos de estos archivos
+                shutil.copy2(origen, os.path.join(preparacion, os.path.basename(ruta)))
+        return preparacion
+
+    def _ejecutar(self, trabajo):
+        if trabajo._cancelado.is_set():
+            trabajo.estado, trabajo.mensaje = 'cancelado', 'Cancelado antes de iniciar'
+            return
+        trabajo.estado, trabajo.inicio, trabajo.mensaje = 'ejecutando', time.time(), 'Preparando entradas'
+        preparacion = None
+        try:
+            preparacion = self._preparar(trabajo)
+            trabajo._proceso = subprocess.Popen(
+                [sys.executable, '-u', SCRIPT_ANALISIS, *trabajo.argumentos],
+                cwd=preparacion, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                text=True, encoding='utf-8', errors='replace', **GRUPO_PROPIO
+            )
+            if trabajo._cancelado.is_set():
+                _terminar_grupo(trabajo._proceso)
+            for linea in trabajo._proceso.stdout:
+                trabajo._registrar_linea(linea)
+            codigo = trabajo._proceso.wait()
+
+            if trabajo._cancelado.is_set():
+                trabajo.estado, trabajo.mensaje = 'cancelado', 'Cancelado: se conservan los resultados actuales'
+            elif codigo != 0:
+                raise RuntimeError(f"El análisis terminó con código {codigo}")
+            elif version_actual(os.path.join(preparacion, DIRECTORIO_RESULTADOS)) in (None, trabajo.version_previa):
+                raise RuntimeError("El análisis no publicó una versión nueva (ver registro)")
+            else:
+                trabajo.mensaje = 'Reemplazando resultados'
+                trabajo.version = self._publicar(preparacion)
+                trabajo.estado, trabajo.progreso = 'completado', 1.0
+                trabajo.mensaje = f"Resultados actualizados (versión {trabajo.version})"
+        except Exception as e:
+            trabajo.estado, trabajo.error, trabajo.mensaje = 'fallido', str(e), f"Error: {e}"
+        finally:
+            trabajo.fin = time.time()
+            if preparacion is not None:
+                shutil.rmtree(preparacion, ignore_errors=True)
+
+    def _publicar(self, preparacion):
+        """
+        Mueve las salidas generadas a su lugar, activa la versión nueva de los
+        resultados y marca la caché para invalidar. Retorna la versión activada.
+        """
+        with self._bloqueo:
+            for ruta in SALIDAS_ANALISIS:
+                origen = os.path.join(preparacion, ruta)
+                if os.path.exists(origen):
+                    _reemplazar(origen, os.path.join(self.destino, ruta))
+            version = importar_version(os.path.join(preparacion, DIRECTORIO_RESULTADOS),
+                                       os.path.join(self.destino, DIRECTORIO_RESULTADOS))
+            self.generacion += 1
+            self._pendiente_invalidar = True
+            return version
+
+    def cerrar(self, cancelar=False):
+        """Detiene el hilo de trabajo (opcionalmente cancelando lo pendiente)"""
+        if cancelar:
+            for trabajo in list(self.trabajos):
+                trabajo.cancelar()
+        self._ejecutor.shutdown(wait=True)
+
+
+def parsear_argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="Recálculo del análisis con reemplazo atómico de salidas")
+    parser.add_argument('--granjas', default='Base granjas.csv')
+    parser.add_argument('--incremental', action='store_true')
+    parser.add_argument('--radios', type=float, nargs='+', default=None, metavar='KM')
+    parser.add_argument('--workers', type=int, default=1)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parsear_argumentos(argv)
+    gestor = GestorTrabajos()
+    trabajo = gestor.enviar(args.granjas, args.incremental, args.radios, args.workers)
+    mensaje = None
+    try:
+        while not trabajo.terminado:
+            if trabajo.mensaje != mensaje:
+                mensaje = trabajo.mensaje
+                print(f"[{trabajo.progreso:4.0%}] {mensaje}")
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        trabajo.cancelar()
+    gestor.cerrar()
+    print(f"Trabajo {trabajo.id}: {trabajo.mensaje} ({trabajo.duracion_s:.1f} s)")
+    if trabajo.estado == 'fallido':
+        print('\n'.join(list(trabajo.registro)[-20:]))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
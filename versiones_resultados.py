@@ -0,0 +1,202 @@
+"""
+Salidas del análisis en versiones inmutables con manifiesto y puntero atómico.
+
+Cada ejecución escribe sus salidas (los CSV principales, la base de comunidades
+con su granja más cercana, la matriz de distancias y, con `--radios`, las
+salidas por radio) en un directorio temporal y
+al publicarlas lo renombra a `resultados/<fecha>-<huella>/`, con `manifiesto.json`
+(huellas de las entradas, parámetros, fecha, filas y huella de cada salida).
+Después se reemplaza `resultados/ACTUAL`, un archivo de texto con el nombre de
+la versión, con `os.replace`: un lector ve la versión anterior completa o la
+nueva completa, nunca una mezcla de archivos.
+
+Las versiones publicadas no se modifican, así que su nombre sirve como clave de
+caché estable entre reinicios. Sin versiones publicadas (un checkout con los CSV
+en la raíz) se usan los archivos de `DATA_FILES`.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from cache_columnar import huella_archivo
+from config_original import DATA_FILES
+
+DIRECTORIO_RESULTADOS = 'resultados'
+ARCHIVO_ACTUAL = 'ACTUAL'
+ARCHIVO_MANIFIESTO = 'manifiesto.json'
+CLAVES_VERSIONADAS = ('granjas_actualizadas', 'estadisticas', 'resumen_detallado',
+                      'comunidades_actualizadas', 'matriz_distancias')
+# Salidas que solo se generan con ciertas opciones (no se exigen al publicar)
+CLAVES_OPCIONALES = ('vecinos_radio', 'cobertura_radio', 'vecinos_radio_csr')
+CONSERVAR_VERSIONES = 5
+FORMATO_MANIFIESTO = 1
+
+
+def _escribir_atomico(ruta, contenido):
+    temporal = f"{ruta}.tmp{os.getpid()}"
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, ruta)
+
+
+def version_actual(directorio=DIRECTORIO_RESULTADOS):
+    """Nombre de la versión publicada vigente (None si no hay ninguna)"""
+    try:
+        with open(os.path.join(directorio, ARCHIVO_ACTUAL), encoding='utf-8') as archivo:
+            version = archivo.read().strip()
+    except OSError:
+        return None
+    return version if version and os.path.isdir(os.path.join(directorio, version)) else None
+
+
+def leer_manifiesto(version=None, directorio=DIRECTORIO_RESULTADOS):
+    """Manifiesto de `version` (por defecto la vigente) o None"""
+    version = version or version_actual(directorio)
+    if version is None:
+        return None
+    try:
+        with open(os.path.join(directorio, version, ARCHIVO_MANIFIESTO), encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError):
+        return None
+
+
+def ruta_resultado(clave, version=None, directorio=DIRECTORIO_RESULTADOS):
+    """
+    Ruta del archivo `clave` de DATA_FILES: dentro de la versión indicada (o la
+    vigente) si es una salida versionada, o la ruta de la raíz en otro caso
+    """
+    if clave in CLAVES_VERSIONADAS or clave in CLAVES_OPCIONALES:
+        version = version or version_actual(directorio)
+        if version is not None:
+            return os.path.join(directorio, version, DATA_FILES[clave])
+    return DATA_FILES[clave]
+
+
+def describir_archivo(ruta):
+    estado = os.stat(ruta)
+    return {'sha256': huella_archivo(ruta), 'tamano': estado.st_size}
+
+
+class NuevaVersion:
+    """
+    Versión en construcción: las salidas se escriben con `escribir` y solo quedan
+    visibles al llamar a `publicar`. `descartar` elimina lo escrito.
+    """
+
+    def __init__(self, parametros, entradas=(), directorio=DIRECTORIO_RESULTADOS):
+        self.directorio = directorio
+        self.parametros = dict(parametros)
+        self.entradas = {ruta: describir_archivo(ruta) for ruta in entradas if os.path.isfile(ruta)}
+        self.salidas = {}
+        self.temporal = os.path.join(directorio, f".nueva-{uuid.uuid4().hex[:8]}")
+        os.makedirs(self.temporal)
+
+    def ruta(self, clave):
+        return os.path.join(self.temporal, DATA_FILES[clave])
+
+    def escribir(self, clave, df):
+        """Escribe la salida `clave` (CSV sin índice) y la registra en el manifiesto"""
+        ruta = self.ruta(clave)
+        df.to_csv(ruta, index=False)
+        self.salidas[clave] = {'archivo': DATA_FILES[clave], 'filas': len(df), **describir_archivo(ruta)}
+        return ruta
+
+    def escribir_archivo(self, clave, escribir):
+        """Escribe la salida `clave` con `escribir(ruta)` y la registra en el manifiesto"""
+        ruta = self.ruta(clave)
+        resultado = escribir(ruta)
+        self.salidas[clave] = {'archivo': DATA_FILES[clave], **describir_archivo(ruta)}
+        return resultado
+
+    def escribir_directorio(self, clave, escribir):
+        """
+        Escribe la salida `clave` como directorio con `escribir(ruta)` y registra la
+        huella de cada archivo en el manifiesto. Retorna lo que retorne `escribir`.
+        """
+        ruta = self.ruta(clave)
+        resultado = escribir(ruta)
+        self.salidas[clave] = {
+            'directorio': DATA_FILES[clave],
+            'archivos': {nombre: describir_archivo(os.path.join(ruta, nombre))
+                         for nombre in sorted(os.listdir(ruta))},
+        }
+        return resultado
+
+    def publicar(self, conservar=CONSERVAR_VERSIONES):
+        """Renombra la versión a su nombre definitivo, mueve ACTUAL y poda las antiguas"""
+        faltantes = set(CLAVES_VERSIONADAS) - set(self.salidas)
+        if faltantes:
+            raise ValueError(f"Faltan salidas para publicar la versión: {sorted(faltantes)}")
+
+        huella = hashlib.sha256(json.dumps(
+            [self.entradas, self.parametros, self.salidas], sort_keys=True
+        ).encode('utf-8')).hexdigest()[:8]
+        version = f"{time.strftime('%Y%m%dT%H%M%S')}-{huella}"
+        manifiesto = {
+            'formato': FORMATO_MANIFIESTO,
+            'version': version,
+            'creado': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'version_anterior': version_actual(self.directorio),
+            'parametros': self.parametros,
+            'entradas': self.entradas,
+            'salidas': self.salidas,
+        }
+        _escribir_atomico(os.path.join(self.temporal, ARCHIVO_MANIFIESTO),
+                          json.dumps(manifiesto, ensure_ascii=False, indent=2))
+        os.replace(self.temporal, os.path.join(self.directorio, version))
+        activar_version(version, self.directorio, conservar)
+        return manifiesto
+
+    def descartar(self):
+        shutil.rmtree(self.temporal, ignore_errors=True)
+
+
+def activar_version(version, directorio=DIRECTORIO_RESULTADOS, conservar=CONSERVAR_VERSIONES):
+    """Apunta ACTUAL a `version` (reemplazo atómico) y poda las versiones antiguas"""
+    _escribir_atomico(os.path.join(directorio, ARCHIVO_ACTUAL), version + '\n')
+    podar_versiones(conservar, directorio)
+
+
+def versiones(directorio=DIRECTORIO_RESULTADOS):
+    """Versiones publicadas, de la más antigua a la más reciente"""
+    if not os.path.isdir(directorio):
+        return []
+    return sorted(nombre for nombre in os.listdir(directorio)
+                  if not nombre.startswith('.') and os.path.isdir(os.path.join(directorio, nombre)))
+
+
+def podar_versiones(conservar=CONSERVAR_VERSIONES, directorio=DIRECTORIO_RESULTADOS):
+    """Elimina las versiones más antiguas, conservando `conservar` y siempre la vigente"""
+    vigente = version_actual(directorio)
+    for version in versiones(directorio)[:-conservar or None]:
+        if version != vigente:
+            shutil.rmtree(os.path.join(directorio, version), ignore_errors=True)
+
+
+def importar_version(origen, directorio=DIRECTORIO_RESULTADOS, conservar=CONSERVAR_VERSIONES):
+    """
+    Mueve la versión vigente de otro directorio de resultados (p. ej. el de un
+    trabajo en segundo plano) a `directorio` y la activa. Retorna su nombre.
+    """
+    version = version_actual(origen)
+    if version is None:
+        raise ValueError(f"No hay una versión publicada en {origen}")
+    os.makedirs(directorio, exist_ok=True)
+    destino = os.path.join(directorio, version)
+    if not os.path.isdir(destino):
+        os.replace(os.path.join(origen, version), destino)
+    activar_version(version, directorio, conservar)
+    return version
+
+
+def copiar_version_actual(destino, directorio=DIRECTORIO_RESULTADOS):
+    """Copia la versión vigente y su puntero a otro directorio de resultados"""
+    version = version_actual(directorio)
+    if version is None:
+        return None
+    shutil.copytree(os.path.join(directorio, version), os.path.join(destino, version))
+    _escribir_atomico(os.path.join(destino, ARCHIVO_ACTUAL), version + '\n')
+    return version
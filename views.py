@@ -4,12 +4,34 @@ Vistas del dashboard
 import streamlit as st
 import pandas as pd
 from streamlit_folium import st_folium
-from components import render_main_metrics, render_granja_info, render_download_buttons
+from components import render_main_metrics, render_granja_info, render_download_buttons, render_estadisticas_regionales
 from charts import crear_grafico_distancias, crear_histograma_distancias, crear_mapa_principal_estable, crear_mapa_scatter
-from data_loader import crear_tabla_principal
+from data_loader import (DatosVista, cargar_tabla_principal, cargar_cubo_agregacion, cargar_indice_granjas,
+                         version_datos, VERSION_CUBO, VERSION_TABLA_PRINCIPAL)
+from capas_mapa import COLUMNAS_COMUNIDADES_MAPA
+from cubo_agregacion import COLUMNAS_CUBO
+from perfilado import cronometrar
 
-def vista_explorar_granja(granjas_actualizadas, estadisticas, resumen_detallado, comunidades):
-    """Vista para explorar por granja"""
+# Datasets que lee cada vista (columnas; None = todas). Cada vista recibe un
+# DatosVista con esta declaración y los carga al primer acceso.
+DATOS_VISTAS = {
+    'vista_explorar_granja': {'granjas_actualizadas': None, 'estadisticas': None, 'resumen_detallado': None},
+    'vista_mapas': {'granjas_actualizadas': None, 'comunidades': COLUMNAS_COMUNIDADES_MAPA},
+    'vista_estadisticas': {'granjas_actualizadas': None, 'estadisticas': None, 'resumen_detallado': None,
+                           'comunidades': COLUMNAS_CUBO},
+    'vista_datos_tablas': {'granjas_actualizadas': None, 'comunidades': None, 'estadisticas': None,
+                           'resumen_detallado': None},
+}
+
+def datos_vista(nombre, version=None):
+    """DatosVista con la declaración de la vista `nombre` (p. ej. 'vista_mapas')"""
+    return DatosVista(DATOS_VISTAS[nombre], version)
+
+@cronometrar()
+def vista_explorar_granja(datos):
+    """Vista para explorar por granja (`datos`: datos_vista('vista_explorar_granja'))"""
+    granjas_actualizadas, estadisticas = datos['granjas_actualizadas'], datos['estadisticas']
+    version = datos.version
     st.markdown("## 🔍 Explorador por Granja")
     
     # Mensaje explicativo principal
@@ -24,27 +46,28 @@ def vista_explorar_granja(granjas_actualizadas, estadisticas, resumen_detallado,
     st.markdown("---")
     
     # Selector de granja
+    indice = cargar_indice_granjas(granjas_actualizadas, estadisticas, datos['resumen_detallado'],
+                                   version_datos(version=version))
     granja_detalle = st.selectbox(
         "Selecciona una granja para ver el detalle completo de sus 10 CEs más cercanas:",
-        options=granjas_actualizadas['Item'].tolist(),
-        format_func=lambda x: f"Granja {x} - {granjas_actualizadas[granjas_actualizadas['Item']==x]['Municipio'].iloc[0]}, {granjas_actualizadas[granjas_actualizadas['Item']==x]['Departamento'].iloc[0]}"
+        options=indice.items,
+        format_func=indice.etiquetas_con_departamento.__getitem__
     )
     
     if granja_detalle:
         # Mostrar información detallada
-        granja_info = granjas_actualizadas[granjas_actualizadas['Item'] == granja_detalle].iloc[0]
-        stats_granja = estadisticas[estadisticas['Item'] == granja_detalle].iloc[0]
+        granja_info = indice.info[granja_detalle]
+        stats_granja = indice.estadisticas[granja_detalle]
         
         render_granja_info(granja_info, stats_granja)
         
         # Tabla detallada de las 10 comunidades
         st.markdown(f"#### 🎯 Las 10 Comunidades Energéticas Más Cercanas a Granja {granja_detalle}")
         
-        comunidades_detalle = resumen_detallado[
-            resumen_detallado['Granja_Item'] == granja_detalle
-        ].sort_values('Ranking')[['Ranking', 'Comunidad_ID', 'Comunidad_Nombre', 
-                                 'Comunidad_Municipio', 'Comunidad_Departamento', 
-                                 'Distancia_km', 'Potencia_kWp']]
+        comunidades_detalle = indice.comunidades_cercanas(granja_detalle)[
+            ['Ranking', 'Comunidad_ID', 'Comunidad_Nombre', 
+             'Comunidad_Municipio', 'Comunidad_Departamento', 
+             'Distancia_km', 'Potencia_kWp']]
         
         st.dataframe(
             comunidades_detalle,
@@ -61,8 +84,11 @@ def vista_explorar_granja(granjas_actualizadas, estadisticas, resumen_detallado,
             use_container_width=True
         )
 
-def vista_mapas(granjas_actualizadas, comunidades):
-    """Vista de mapas interactivos"""
+@cronometrar()
+def vista_mapas(datos):
+    """Vista de mapas interactivos (`datos`: datos_vista('vista_mapas'))"""
+    granjas_actualizadas, comunidades = datos['granjas_actualizadas'], datos['comunidades']
+    version = datos.version
     st.markdown("## 🗺️ Mapas Interactivos")
     
     tab1, tab2 = st.tabs(["🗺️ Mapa Folium", "📍 Mapa Plotly"])
@@ -71,16 +97,24 @@ def vista_mapas(granjas_actualizadas, comunidades):
         st.markdown("### Mapa Interactivo con Folium")
         st.markdown("🔴 **Granjas Solares** | 🔵 **Comunidades Energéticas (muestra)**")
         
-        mapa = crear_mapa_principal_estable(granjas_actualizadas, comunidades)
+        version_mapa = version_datos(("granjas_actualizadas", "comunidades"), version)
+        mapa = crear_mapa_principal_estable(granjas_actualizadas, comunidades, version=version_mapa)
         st_folium(mapa, width=700, height=500)
     
     with tab2:
         st.markdown("### Mapa de Dispersión con Plotly")
-        fig_scatter = crear_mapa_scatter(granjas_actualizadas, comunidades)
+        fig_scatter = crear_mapa_scatter(
+            granjas_actualizadas, comunidades,
+            version=version_datos(("granjas_actualizadas", "comunidades"), version)
+        )
         st.plotly_chart(fig_scatter, use_container_width=True)
 
-def vista_estadisticas(granjas_actualizadas, estadisticas, resumen_detallado, comunidades):
-    """Vista de estadísticas detalladas"""
+@cronometrar()
+def vista_estadisticas(datos):
+    """Vista de estadísticas detalladas (`datos`: datos_vista('vista_estadisticas'))"""
+    granjas_actualizadas, estadisticas = datos['granjas_actualizadas'], datos['estadisticas']
+    resumen_detallado, comunidades = datos['resumen_detallado'], datos['comunidades']
+    version = datos.version
     st.markdown("## 📈 Estadísticas Detalladas")
     
     # Métricas principales
@@ -88,25 +122,35 @@ def vista_estadisticas(granjas_actualizadas, estadisticas, resumen_detallado, co
     
     st.markdown("---")
     
+    cubo = cargar_cubo_agregacion(granjas_actualizadas, comunidades, estadisticas, version_datos(VERSION_CUBO, version))
+    
     # Top y bottom granjas
     col1, col2 = st.columns(2)
     
     with col1:
         st.markdown("### 🏆 Top 5 Mejores Ubicaciones")
-        top_5 = estadisticas.nsmallest(5, 'Distancia_Media')[['Item', 'Municipio', 'Departamento', 'Distancia_Media']]
+        top_5 = cubo.mejores_granjas(5)[['Item', 'Municipio', 'Departamento', 'Distancia_Media']]
         st.dataframe(top_5, hide_index=True)
     
     with col2:
         st.markdown("### ⚠️ Top 5 Mayores Desafíos")
-        bottom_5 = estadisticas.nlargest(5, 'Distancia_Media')[['Item', 'Municipio', 'Departamento', 'Distancia_Media']]
+        bottom_5 = cubo.peores_granjas(5)[['Item', 'Municipio', 'Departamento', 'Distancia_Media']]
         st.dataframe(bottom_5, hide_index=True)
     
     # Gráficos
-    st.plotly_chart(crear_grafico_distancias(estadisticas), use_container_width=True)
-    st.plotly_chart(crear_histograma_distancias(resumen_detallado), use_container_width=True)
+    st.plotly_chart(crear_grafico_distancias(estadisticas, version=version_datos(("estadisticas",), version)),
+                    use_container_width=True)
+    st.plotly_chart(crear_histograma_distancias(resumen_detallado, version=version_datos(("resumen_detallado",), version)),
+                    use_container_width=True)
+    
+    render_estadisticas_regionales(cubo)
 
-def vista_datos_tablas(granjas_actualizadas, comunidades, estadisticas, resumen_detallado):
-    """Vista de datos y tablas"""
+@cronometrar()
+def vista_datos_tablas(datos):
+    """Vista de datos y tablas (`datos`: datos_vista('vista_datos_tablas'))"""
+    granjas_actualizadas, comunidades = datos['granjas_actualizadas'], datos['comunidades']
+    estadisticas, resumen_detallado = datos['estadisticas'], datos['resumen_detallado']
+    version = datos.version
     st.markdown("## 📋 Bases de Datos y Exportación")
     
     tab1, tab2, tab3, tab4, tab5 = st.tabs([
@@ -118,7 +162,7 @@ def vista_datos_tablas(granjas_actualizadas, comunidades, estadisticas, resumen_
         st.markdown("### 🎯 Tabla Principal: Granjas y sus 10 Comunidades Energéticas Más Cercanas")
         st.markdown("Esta es la tabla principal del análisis con los resultados solicitados por el Ministerio de Energías.")
         
-        df_principal = crear_tabla_principal(granjas_actualizadas, estadisticas)
+        df_principal = cargar_tabla_principal(granjas_actualizadas, estadisticas, version_datos(VERSION_TABLA_PRINCIPAL, version))
         
         st.dataframe(
             df_principal,
@@ -135,25 +179,26 @@ def vista_datos_tablas(granjas_actualizadas, comunidades, estadisticas, resumen_
             use_container_width=True
         )
         
-        render_download_buttons(df_principal, "Tabla_Principal_Granjas_10_CEs_Cercanas", "Descargar Tabla Principal")
+        render_download_buttons(df_principal, "Tabla_Principal_Granjas_10_CEs_Cercanas", "Descargar Tabla Principal",
+                                version=version_datos(version=version))
     
     with tab2:
         st.markdown("### 🏗️ Base de Granjas Actualizada")
         st.dataframe(granjas_actualizadas)
-        render_download_buttons(granjas_actualizadas, "granjas_actualizadas")
+        render_download_buttons(granjas_actualizadas, "granjas_actualizadas", version=version_datos(("granjas_actualizadas",), version))
     
     with tab3:
         st.markdown("### ⚡ Comunidades Energéticas")
         st.dataframe(comunidades.head(100))
         st.info(f"Mostrando 100 de {len(comunidades)} comunidades energéticas")
-        render_download_buttons(comunidades, "comunidades_energeticas")
+        render_download_buttons(comunidades, "comunidades_energeticas", version=version_datos(("comunidades",), version))
     
     with tab4:
         st.markdown("### 📊 Estadísticas por Granja")
         st.dataframe(estadisticas)
-        render_download_buttons(estadisticas, "estadisticas_distancias")
+        render_download_buttons(estadisticas, "estadisticas_distancias", version=version_datos(("estadisticas",), version))
     
     with tab5:
         st.markdown("### 🔗 Resumen Detallado de Relaciones")
         st.dataframe(resumen_detallado)
-        render_download_buttons(resumen_detallado, "resumen_detallado_proximidades")
+        render_download_buttons(resumen_detallado, "resumen_detallado_proximidades", version=version_datos(("resumen_detallado",), version))